@@ -1,15 +1,15 @@
 import os
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from app.config import config
+from app.services.replica_router import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-migrate = Migrate()
 csrf = CSRFProtect()
 
 def create_app(config_name='default'):
@@ -23,9 +23,29 @@ def create_app(config_name='default'):
     # Initialize extensions with app
     db.init_app(app)
     login_manager.init_app(app)
-    migrate.init_app(app, db)
     csrf.init_app(app)
 
+    # Flask-Migrate imports Alembic, so only load it when running under the flask CLI
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # Initialize user identity cache
+    from app.services.user_cache import UserCache
+    UserCache.init_app(app)
+
+    # Initialize live viewer presence
+    from app.services.presence import PresenceTracker
+    PresenceTracker.init_app(app)
+
+    # Initialize request and database instrumentation
+    from app.services.metrics import Metrics
+    Metrics.init_app(app)
+
+    # Initialize opt-in request profiling
+    from app.services.profiler import RequestProfiler
+    RequestProfiler.init_app(app)
+
     # Configure Flask-Login
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -39,20 +59,25 @@ def create_app(config_name='default'):
     # User loader for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models.user import User
-        return User.query.get(int(user_id))
+        user = UserCache.load(int(user_id))
+        if user and not user.is_active:
+            return None
+        return user
 
     # Register blueprints
-    with app.app_context():
-        from app.routes import auth, documents, links, viewer, analytics
+    from app.routes import auth, documents, links, bundles, viewer, bundle_viewer, analytics, metrics
 
-        app.register_blueprint(auth.bp)
-        app.register_blueprint(documents.bp)
-        app.register_blueprint(links.bp)
-        app.register_blueprint(viewer.bp)
-        app.register_blueprint(analytics.bp)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(documents.bp)
+    app.register_blueprint(links.bp)
+    app.register_blueprint(bundles.bp)
+    app.register_blueprint(viewer.bp)
+    app.register_blueprint(bundle_viewer.bp)
+    app.register_blueprint(analytics.bp)
+    app.register_blueprint(metrics.bp)
 
-        # Create database tables if they don't exist
-        db.create_all()
+    # Register CLI commands (schema is created by `flask docone init-db` or migrations)
+    from app.cli import docone_cli
+    app.cli.add_command(docone_cli)
 
     return app
@@ -0,0 +1,293 @@
+import os
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+docone_cli = AppGroup('docone', help='DocOne maintenance commands.')
+partitions_cli = AppGroup('partitions', help='Manage monthly document_views partitions.')
+archive_cli = AppGroup('archive', help='Manage the columnar archive of old view sessions.')
+docone_cli.add_command(partitions_cli)
+profiling_cli = AppGroup('profiling', help='Toggle the request profiler at runtime.')
+docone_cli.add_command(archive_cli)
+docone_cli.add_command(profiling_cli)
+search_cli = AppGroup('search', help='Manage the full-text search index.')
+docone_cli.add_command(search_cli)
+maintenance_cli = AppGroup('maintenance', help='Run resumable batch jobs over documents and stored files.')
+docone_cli.add_command(maintenance_cli)
+storage_cli = AppGroup('storage', help='Reconcile stored files with the database.')
+docone_cli.add_command(storage_cli)
+purge_cli = AppGroup('purge', help='Purge deleted documents and links.')
+docone_cli.add_command(purge_cli)
+sessions_cli = AppGroup('sessions', help='Maintain viewer sessions.')
+docone_cli.add_command(sessions_cli)
+geoip_cli = AppGroup('geoip', help='Offline GeoIP table and session enrichment.')
+docone_cli.add_command(geoip_cli)
+
+@docone_cli.command('init-db')
+def init_db():
+    """Create all tables for a fresh database and mark migrations as applied."""
+    from app import db
+
+    db.create_all()
+    click.echo('Database tables created.')
+
+    versions_dir = os.path.join(os.path.dirname(current_app.root_path), 'migrations', 'versions')
+    if os.path.isdir(versions_dir) and any(name.endswith('.py') for name in os.listdir(versions_dir)):
+        from flask_migrate import stamp
+        stamp()
+        click.echo('Migrations stamped at head.')
+
+@partitions_cli.command('create')
+@click.option('--months-ahead', type=int, default=None,
+              help='Months to create beyond the current one (default: VIEW_PARTITION_MONTHS_AHEAD).')
+def create_partitions(months_ahead):
+    """Convert document_views to a partitioned table if needed and create future partitions."""
+    from app.services.view_partitions import ViewPartitionManager
+
+    if not ViewPartitionManager.is_postgres():
+        click.echo('Native partitioning requires PostgreSQL; nothing to do.')
+        return
+
+    if ViewPartitionManager.convert_to_partitioned():
+        click.echo('Converted document_views to a partitioned table.')
+
+    created = ViewPartitionManager.create_future_partitions(months_ahead)
+    for name in created:
+        click.echo(f'Created partition {name}')
+    click.echo(f'{len(created)} partition(s) created.')
+
+@partitions_cli.command('retain')
+@click.option('--keep-months', type=int, default=None,
+              help='Months of raw sessions to keep (default: VIEW_RETENTION_MONTHS).')
+def apply_retention(keep_months):
+    """Compact sessions older than the retention window into monthly rollups."""
+    from app.services.view_partitions import ViewPartitionManager
+
+    results = ViewPartitionManager.apply_retention(keep_months)
+    for period, compacted in sorted(results.items()):
+        click.echo(f'{period:%Y-%m}: compacted {compacted} session(s)')
+    click.echo(f'{len(results)} month(s) compacted.')
+
+@archive_cli.command('views')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive sessions started before this many days ago (default: VIEW_ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+def archive_views(older_than_days, batch_size):
+    """Move old view sessions out of document_views into compressed columnar files."""
+    from app.services.view_archive import ViewArchive
+
+    archived = ViewArchive.archive_older_than(older_than_days, batch_size=batch_size)
+    click.echo(f'Archived {archived} session(s).')
+
+@profiling_cli.command('on')
+@click.option('--sample-rate', type=float, default=None, help='Fraction of requests to sample.')
+@click.option('--slow-request-ms', type=float, default=None, help='Always sample requests slower than this.')
+@click.option('--slow-query-ms', type=float, default=None, help='Log SQL slower than this with its EXPLAIN plan.')
+@click.option('--interval-ms', type=float, default=None, help='Stack sampling interval.')
+def profiling_on(sample_rate, slow_request_ms, slow_query_ms, interval_ms):
+    """Enable profiling in every worker without a restart."""
+    from app.services.profiler import RequestProfiler
+
+    settings = RequestProfiler.write_control(enabled=True, sample_rate=sample_rate, slow_request_ms=slow_request_ms,
+                                             slow_query_ms=slow_query_ms, interval_ms=interval_ms)
+    click.echo(f'Profiling enabled: {settings}')
+
+@profiling_cli.command('off')
+def profiling_off():
+    """Disable profiling in every worker without a restart."""
+    from app.services.profiler import RequestProfiler
+
+    RequestProfiler.write_control(enabled=False)
+    click.echo('Profiling disabled.')
+
+@profiling_cli.command('status')
+def profiling_status():
+    """Show the effective profiling settings."""
+    from app.services.profiler import RequestProfiler
+
+    for key, value in sorted(RequestProfiler.settings().items()):
+        click.echo(f'{key}: {value}')
+
+@search_cli.command('index')
+@click.option('--all', 'reindex', is_flag=True, help='Re-extract every document, not only unindexed ones.')
+@click.option('--limit', type=int, default=None, help='Index at most this many documents.')
+def search_index(reindex, limit):
+    """Extract page text for documents missing from the search index."""
+    from app.services.search_index import SearchIndex
+
+    indexed = SearchIndex.index_pending(limit=limit, reindex=reindex)
+    click.echo(f'Indexed {indexed} document(s).')
+
+@maintenance_cli.command('list')
+def maintenance_list():
+    """List the available maintenance jobs."""
+    from app.services.maintenance import JOBS
+
+    for name, job in sorted(JOBS.items()):
+        click.echo(f'{name:16} {job.description}')
+
+@maintenance_cli.command('run')
+@click.argument('job')
+@click.option('--workers', type=int, default=None,
+              help='Worker processes; 0 runs inline (default: MAINTENANCE_WORKERS).')
+@click.option('--batch-size', type=int, default=None, help='Items per batch (default: MAINTENANCE_BATCH_SIZE).')
+@click.option('--max-in-flight', type=int, default=None, help='Batches queued or awaiting apply (default: 2 x workers).')
+@click.option('--sleep', type=float, default=None, help='Pause between batch reads (default: MAINTENANCE_BATCH_SLEEP).')
+@click.option('--max-rate', type=float, default=None, help='Upper bound on items read per second.')
+@click.option('--limit', type=int, default=None, help='Stop after this many items; the next run resumes.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the beginning.')
+@click.option('--dry-run', is_flag=True, help='Process items but write nothing back and keep the checkpoint.')
+@click.option('--report', 'report_file', type=click.Path(dir_okay=False), default=None,
+              help='Write the job report here (orphan-files); a dry run writes one only with this option.')
+def maintenance_run(job, workers, batch_size, max_in_flight, sleep, max_rate, limit, restart, dry_run, report_file):
+    """Run JOB over all documents, resuming from its last checkpoint."""
+    import time
+    from app.services.maintenance import JOBS, MaintenanceRunner
+
+    if job not in JOBS:
+        raise click.BadParameter(f"Unknown job '{job}'. Choose from: {', '.join(sorted(JOBS))}", param_hint='JOB')
+
+    last_report = [0.0]
+
+    def report(progress):
+        now = time.monotonic()
+        if now - last_report[0] >= 2.0:
+            last_report[0] = now
+            click.echo(f"{progress['processed']} item(s), {progress['rate']}/s, last key {progress['last_key']}")
+
+    result = MaintenanceRunner.run(job, workers=workers, batch_size=batch_size, max_in_flight=max_in_flight,
+                                   sleep=sleep, max_rate=max_rate, limit=limit, restart=restart,
+                                   dry_run=dry_run, report=report, report_file=report_file)
+
+    status = 'completed' if result['completed'] else 'paused (run again to resume)'
+    click.echo(f"{job} {status}: {result['run_processed']} item(s) in {result['elapsed']} s "
+               f"({result['rate']}/s), {result['processed']} in total")
+    for name, value in sorted(result['counters'].items()):
+        click.echo(f'  {name}: {value}')
+
+@maintenance_cli.command('status')
+@click.argument('job', required=False)
+def maintenance_status(job):
+    """Show checkpoints of maintenance jobs."""
+    from app.services.maintenance import JOBS, MaintenanceRunner
+
+    for name in [job] if job else sorted(JOBS):
+        state = MaintenanceRunner.load_checkpoint(name)
+        if state is None:
+            click.echo(f'{name}: never run')
+            continue
+        status = 'completed' if state.get('completed') else f"in progress after key {state['last_key']}"
+        click.echo(f"{name}: {status}, {state['processed']} item(s), updated {state.get('updated_at', '-')}")
+        for counter, value in sorted(state['counters'].items()):
+            click.echo(f'  {counter}: {value}')
+
+@storage_cli.command('gc')
+@click.option('--delete', is_flag=True, help='Delete orphaned files (default: report only).')
+@click.option('--grace-hours', type=float, default=None,
+              help='Keep orphans modified more recently than this (default: STORAGE_GC_GRACE_HOURS).')
+@click.option('--report', 'report_path', default=None,
+              help='TSV report path (default: MAINTENANCE_DIR/storage-gc-<timestamp>.tsv).')
+def storage_gc(delete, grace_hours, report_path):
+    """Find files no document references and documents whose files are missing."""
+    from datetime import datetime
+    from app.services.storage_gc import StorageReconciler
+
+    if report_path is None:
+        os.makedirs(current_app.config['MAINTENANCE_DIR'], exist_ok=True)
+        report_path = os.path.join(current_app.config['MAINTENANCE_DIR'],
+                                   f'storage-gc-{datetime.utcnow():%Y%m%dT%H%M%S}.tsv')
+
+    counters = StorageReconciler.reconcile(grace_hours=grace_hours, delete=delete, report_path=report_path)
+    for name, value in counters.items():
+        click.echo(f'{name}: {value}')
+    click.echo(f'Report written to {report_path}')
+
+@purge_cli.command('status')
+def purge_status():
+    """List deleted documents and links that still have rows to purge."""
+    from app.services.purge import DocumentPurger
+
+    items = DocumentPurger.pending()
+    for item in items:
+        click.echo(f"{item['kind']} {item['id']}: deleted {item['deleted_at']:%Y-%m-%d %H:%M:%S}, "
+                   f"{item['views']} view row(s) left")
+    click.echo(f'{len(items)} item(s) pending.')
+
+@purge_cli.command('run')
+@click.option('--document', 'document_id', type=int, default=None, help='Purge only this deleted document.')
+def purge_run(document_id):
+    """Purge deleted documents and links in batches (resumes what a restart interrupted)."""
+    import time
+    from app.services.purge import DocumentPurger
+
+    last_report = [0.0]
+
+    def report(counters):
+        now = time.monotonic()
+        if now - last_report[0] >= 2.0:
+            last_report[0] = now
+            click.echo(', '.join(f'{name}: {value}' for name, value in sorted(counters.items())))
+
+    if document_id is not None:
+        counters = DocumentPurger.purge_document(document_id, report=report)
+        if counters is None:
+            raise click.BadParameter(f'Document {document_id} does not exist or is not deleted.',
+                                     param_hint='--document')
+    else:
+        counters = DocumentPurger.purge_pending(report=report)
+
+    for name, value in sorted(counters.items()):
+        click.echo(f'{name}: {value}')
+    click.echo('Purge complete.')
+
+@sessions_cli.command('sweep')
+@click.option('--idle-seconds', type=int, default=None,
+              help='Close sessions with no heartbeat for this long (default: VIEW_SESSION_IDLE_SECONDS).')
+@click.option('--batch-size', type=int, default=None,
+              help='Sessions closed per UPDATE (default: VIEW_SESSION_SWEEP_BATCH_SIZE).')
+def sessions_sweep(idle_seconds, batch_size):
+    """Close sessions whose final beacon was lost, ending them at their last heartbeat."""
+    from app.services.analytics_tracker import AnalyticsTracker
+
+    closed = AnalyticsTracker.close_idle_sessions(idle_seconds, batch_size)
+    click.echo(f'{closed} idle session(s) closed.')
+
+@geoip_cli.command('build')
+@click.argument('sources', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--locations', 'locations_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='GeoLite2 Locations CSV, when SOURCES are GeoLite2 Blocks CSVs.')
+def geoip_build(sources, locations_path):
+    """Compile a GeoIP database (.mmdb, GeoLite2 CSV or start,end,country[,city] CSV) into GEOIP_DIR."""
+    from app.services.geoip import GeoIP
+
+    try:
+        manifest = GeoIP.build(list(sources), locations_path=locations_path)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(f"{manifest['ipv4_ranges']} IPv4 and {manifest['ipv6_ranges']} IPv6 range(s), "
+               f"{manifest['locations']} location(s) written to {current_app.config['GEOIP_DIR']}.")
+
+@geoip_cli.command('enrich')
+@click.option('--batch-size', type=int, default=None,
+              help='Sessions per transaction (default: GEOIP_ENRICH_BATCH_SIZE).')
+@click.option('--limit', type=int, default=None, help='Stop after this many sessions.')
+def geoip_enrich(batch_size, limit):
+    """Fill in country and city for sessions that have none yet."""
+    from app.services.geoip import GeoIP
+
+    counters = GeoIP.enrich_pending(batch_size, limit)
+    if counters is None:
+        raise click.ClickException('No GeoIP table built; run `flask docone geoip build` first.')
+    click.echo(f"{counters['enriched']} session(s) located, {counters['unknown']} unknown.")
+
+@geoip_cli.command('lookup')
+@click.argument('addresses', nargs=-1, required=True)
+def geoip_lookup(addresses):
+    """Look up addresses in the compiled table."""
+    from app.services.geoip import GeoIP
+
+    if GeoIP.table() is None:
+        raise click.ClickException('No GeoIP table built; run `flask docone geoip build` first.')
+    for address in addresses:
+        location = GeoIP.lookup(address)
+        click.echo(f"{address}: {' / '.join(part for part in location if part) if location else 'not found'}")
@@ -18,6 +18,56 @@ class Config:
         'pool_pre_ping': True,  # Verify connections before using
     }
 
+    # Optional read replica for analytics and dashboard reads
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))  # Staleness tolerance
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 10))
+
+    # document_views partitioning and retention
+    VIEW_PARTITION_MONTHS_AHEAD = int(os.environ.get('VIEW_PARTITION_MONTHS_AHEAD', 3))
+    VIEW_RETENTION_MONTHS = int(os.environ.get('VIEW_RETENTION_MONTHS', 24))  # Older sessions become rollups
+
+    # Keep link unfurlers, mail scanners and crawlers out of view counts
+    BOT_FILTER_ENABLED = os.environ.get('BOT_FILTER_ENABLED', 'True') == 'True'
+    BOT_IP_RANGES_FILE = os.environ.get('BOT_IP_RANGES_FILE')  # One CIDR per line
+    BOT_JS_CONFIRMATION = os.environ.get('BOT_JS_CONFIRMATION', 'True') == 'True'  # Start sessions from the page script
+
+    # Offline GeoIP (`flask docone geoip build` compiles a database into GEOIP_DIR)
+    GEOIP_DIR = os.environ.get('GEOIP_DIR', 'geoip')
+    GEOIP_ENRICH_BATCH_SIZE = int(os.environ.get('GEOIP_ENRICH_BATCH_SIZE', 5000))  # Sessions per transaction
+
+    # Sessions whose final beacon was lost (`flask docone sessions sweep`)
+    VIEW_SESSION_IDLE_SECONDS = int(os.environ.get('VIEW_SESSION_IDLE_SECONDS', 1800))  # Since the last heartbeat
+    VIEW_SESSION_SWEEP_BATCH_SIZE = int(os.environ.get('VIEW_SESSION_SWEEP_BATCH_SIZE', 5000))  # Rows per UPDATE
+
+    # Columnar archive of old view sessions
+    ARCHIVE_FOLDER = os.environ.get('ARCHIVE_FOLDER', 'archive')
+    VIEW_ARCHIVE_AFTER_DAYS = int(os.environ.get('VIEW_ARCHIVE_AFTER_DAYS', 180))
+
+    # In-process background tasks (post-upload processing)
+    BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 2))
+
+    # `flask docone maintenance` batch jobs
+    MAINTENANCE_DIR = os.environ.get('MAINTENANCE_DIR', 'maintenance')  # Checkpoints and reports
+    MAINTENANCE_WORKERS = int(os.environ.get('MAINTENANCE_WORKERS', 4))  # Worker processes
+    MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', 200))
+    MAINTENANCE_BATCH_SLEEP = float(os.environ.get('MAINTENANCE_BATCH_SLEEP', 0.05))  # Seconds between batch reads
+
+    # Background purge of deleted documents and links
+    PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))  # Rows deleted per transaction
+    PURGE_BATCH_SLEEP = float(os.environ.get('PURGE_BATCH_SLEEP', 0.01))  # Seconds between batches
+
+    # Storage garbage collection (`flask docone storage gc`)
+    STORAGE_GC_GRACE_HOURS = float(os.environ.get('STORAGE_GC_GRACE_HOURS', 24))  # Never touch newer orphans
+
+    # Per-viewer PDF watermarks (stamped copies are cached and evicted least recently used first)
+    WATERMARK_CACHE_DIR = os.environ.get('WATERMARK_CACHE_DIR', 'watermarks')
+    WATERMARK_CACHE_MAX_BYTES = int(os.environ.get('WATERMARK_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+    # Data room bundles (several documents under one link, downloadable as one ZIP)
+    BUNDLE_MAX_DOCUMENTS = int(os.environ.get('BUNDLE_MAX_DOCUMENTS', 50))
+
     # File upload configuration
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_SIZE', 52428800))  # 50MB default
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
@@ -29,6 +79,44 @@ class Config:
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = int(os.environ.get('PERMANENT_SESSION_LIFETIME', 86400))
 
+    # User identity cache (set USER_CACHE_URL to a redis:// or rediss:// URL to share across workers)
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL')
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # Seconds
+
+    # Worker processes serving the app; gunicorn reads the same variable as its default -w
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+    # Live viewer presence (in-memory is single-process only: with several workers, where it falls back
+    # to 'database', or the ASGI tracking app, set PRESENCE_URL to a redis:// or rediss:// URL or 'database')
+    PRESENCE_URL = os.environ.get('PRESENCE_URL')
+    PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', 20))  # Seconds without a heartbeat before a viewer drops off
+    PRESENCE_POLL_INTERVAL = float(os.environ.get('PRESENCE_POLL_INTERVAL', 1.0))  # Seconds between change checks
+    PRESENCE_STREAM_SECONDS = int(os.environ.get('PRESENCE_STREAM_SECONDS', 300))  # Clients reconnect after this
+
+    # ASGI tracking endpoints (asgi.py)
+    TRACKING_BATCH_MAX = int(os.environ.get('TRACKING_BATCH_MAX', 500))  # Sessions written per transaction
+    TRACKING_FLUSH_INTERVAL = float(os.environ.get('TRACKING_FLUSH_INTERVAL', 0.05))  # Seconds between flushes
+    TRACKING_MAX_PENDING = int(os.environ.get('TRACKING_MAX_PENDING', 20000))  # Queued sessions before 503s
+    TRACKING_DB_POOL_SIZE = int(os.environ.get('TRACKING_DB_POOL_SIZE', 5))  # Per uvicorn worker
+    TRACKING_START_TOKEN_MAX_AGE = int(os.environ.get('TRACKING_START_TOKEN_MAX_AGE', 3600))  # Seconds
+
+    # Instrumentation (set METRICS_DIR to a shared directory to aggregate gunicorn workers)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # Seconds
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token for /metrics
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', 'False') == 'True'  # Refuse scrapes without one
+
+    # Sampling profiler (toggle at runtime with `flask docone profiling`)
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))  # Fraction of requests
+    PROFILING_SLOW_REQUEST_MS = float(os.environ.get('PROFILING_SLOW_REQUEST_MS', 1000))
+    PROFILING_SLOW_QUERY_MS = float(os.environ.get('PROFILING_SLOW_QUERY_MS', 200))
+    PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', 5))
+    PROFILING_DIR = os.environ.get('PROFILING_DIR', 'profiles')
+    PROFILING_CONTROL_FILE = os.environ.get('PROFILING_CONTROL_FILE')  # Default: PROFILING_DIR/control.json
+    PROFILING_LOG_PARAMETERS = os.environ.get('PROFILING_LOG_PARAMETERS', 'False') == 'True'  # Raw values, else types
+
     # Application settings
     APP_NAME = os.environ.get('APP_NAME', 'DocOne')
     APP_URL = os.environ.get('APP_URL', 'http://localhost:5000')
@@ -44,9 +132,24 @@ class ProductionConfig(Config):
     DEBUG = False
     SESSION_COOKIE_SECURE = True  # Require HTTPS
     SQLALCHEMY_ECHO = False
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', 'True') == 'True'  # /metrics fails closed
+
+class TestingConfig(Config):
+    """Test suite configuration (in-memory SQLite unless TEST_DATABASE_URL is set)"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    WTF_CSRF_ENABLED = False
+    BOT_JS_CONFIRMATION = False
+    METRICS_TOKEN = None
+    USER_CACHE_URL = None
+    PRESENCE_URL = None
+    WEB_CONCURRENCY = 1
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
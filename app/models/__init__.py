@@ -1,7 +1,11 @@
 from app.models.user import User
 from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.models.document_page import DocumentPage
 from app.models.link import ShareableLink
-from app.models.analytics import DocumentView
+from app.models.bundle import Bundle
+from app.models.analytics import DocumentView, DocumentViewRollup
 from app.models.email_capture import CapturedEmail
+from app.models.viewer import Viewer
 
-__all__ = ['User', 'Document', 'ShareableLink', 'DocumentView', 'CapturedEmail']
+__all__ = ['User', 'Document', 'DocumentVersion', 'DocumentPage', 'ShareableLink', 'Bundle', 'DocumentView', 'DocumentViewRollup', 'CapturedEmail', 'Viewer']
@@ -5,32 +5,77 @@ class DocumentView(db.Model):
     """Track individual document viewing sessions"""
 
     __tablename__ = 'document_views'
+    __table_args__ = (
+        # Document and link stats: link_id IN (...), a started_at window, newest first.
+        # No index covers a column that heartbeats update (last_heartbeat_at included),
+        # which keeps heartbeat UPDATEs heap-only (HOT) on PostgreSQL.
+        db.Index('ix_document_views_link_started', 'link_id', 'started_at'),
+        # Unique viewers: index-only count of distinct viewer ids per link
+        db.Index('ix_document_views_link_viewer', 'link_id', 'viewer_id', 'started_at',
+                 postgresql_where=db.text('viewer_id IS NOT NULL'),
+                 sqlite_where=db.text('viewer_id IS NOT NULL')),
+        # Idle-session sweep: only sessions still open are in the index. ended_at
+        # changes once per session, so heartbeats stay HOT.
+        db.Index('ix_document_views_open', 'started_at',
+                 postgresql_where=db.text('ended_at IS NULL'),
+                 sqlite_where=db.text('ended_at IS NULL')),
+        # GeoIP enrichment: sessions not geolocated yet, in id order
+        db.Index('ix_document_views_geo_pending', 'id',
+                 postgresql_where=db.text('country IS NULL'),
+                 sqlite_where=db.text('country IS NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    link_id = db.Column(db.Integer, db.ForeignKey('shareable_links.id'), nullable=False, index=True)
+    link_id = db.Column(db.Integer, db.ForeignKey('shareable_links.id', ondelete='CASCADE'), nullable=False)
 
     # Viewer information
     viewer_email = db.Column(db.String(120), index=True)  # Captured email
+    viewer_id = db.Column(db.Integer, db.ForeignKey('viewers.id', ondelete='SET NULL'))  # Set with viewer_email
     viewer_ip = db.Column(db.String(45))  # IPv4 or IPv6
     viewer_user_agent = db.Column(db.String(500))
 
     # Session tracking
+    document_version = db.Column(db.Integer, server_default='1', nullable=False)  # Version open when the session began
     session_id = db.Column(db.String(64), unique=True, nullable=False, index=True)  # Unique session identifier
 
     # Timing data
     started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
-    ended_at = db.Column(db.DateTime)
+    ended_at = db.Column(db.DateTime)  # Final beacon, or the last heartbeat once the session went idle
+    last_heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
     duration_seconds = db.Column(db.Integer, default=0)  # Total viewing time
 
     # Engagement metrics
-    pages_viewed = db.Column(db.JSON)  # Array of page numbers viewed
+    pages_bitmap = db.Column(db.LargeBinary)  # Pages viewed: bit p - 1 set for page p (see AnalyticsTracker.page_bitmap)
     max_page_reached = db.Column(db.Integer, default=1)
     total_page_views = db.Column(db.Integer, default=0)
     current_page = db.Column(db.Integer, default=1)
+    last_seq = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Highest heartbeat sequence applied
 
-    # Geographic data (optional, for future)
+    # Geographic data, filled in by `flask docone geoip enrich` (country 'ZZ' when unknown)
     country = db.Column(db.String(2))
     city = db.Column(db.String(100))
 
     def __repr__(self):
         return f'<DocumentView {self.session_id}>'
+
+class DocumentViewRollup(db.Model):
+    """Monthly per-link aggregates kept after raw view sessions are purged"""
+
+    __tablename__ = 'document_view_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('link_id', 'period_start', name='uq_document_view_rollups_link_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    link_id = db.Column(db.Integer, db.ForeignKey('shareable_links.id', ondelete='CASCADE'), nullable=False, index=True)
+    period_start = db.Column(db.DateTime, nullable=False)  # First instant of the month
+
+    # Aggregates over the month's sessions
+    view_count = db.Column(db.Integer, default=0, nullable=False)
+    unique_viewers = db.Column(db.Integer, default=0, nullable=False)  # Distinct viewers within the month
+    viewer_hashes = db.Column(db.LargeBinary)  # Sorted distinct viewer hashes (uint64 LE); NULL if compacted before them
+    duration_total = db.Column(db.BigInteger, default=0, nullable=False)  # Sum of non-zero durations
+    duration_samples = db.Column(db.Integer, default=0, nullable=False)  # Sessions counted in duration_total
+
+    def __repr__(self):
+        return f'<DocumentViewRollup {self.link_id} {self.period_start:%Y-%m}>'
@@ -0,0 +1,47 @@
+from datetime import datetime
+from app import db
+from app.models.link import LinkAccessMixin
+
+class Bundle(LinkAccessMixin, db.Model):
+    """A data room: several documents shared under one link code
+
+    Each document in the bundle has its own ShareableLink (bundle_id set),
+    which carries its view sessions, so bundle views show up in the
+    document's analytics. Access is gated by the bundle's settings only.
+    """
+
+    __tablename__ = 'bundles'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # Bundle details
+    link_code = db.Column(db.String(32), unique=True, nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+
+    # Security settings, as on ShareableLink
+    password_hash = db.Column(db.String(255))
+    require_email = db.Column(db.Boolean, default=True, nullable=False)
+
+    # Access control
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    expires_at = db.Column(db.DateTime)
+    max_views = db.Column(db.Integer)
+    view_count = db.Column(db.Integer, default=0, nullable=False)
+    download_count = db.Column(db.Integer, default=0, nullable=False)  # ZIP downloads (resumed ones count once)
+
+    # Customization
+    custom_message = db.Column(db.Text)
+    allow_download = db.Column(db.Boolean, default=False, nullable=False)
+
+    # Tracking
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_viewed_at = db.Column(db.DateTime)
+    deleted_at = db.Column(db.DateTime)
+
+    # Relationships
+    items = db.relationship('ShareableLink', backref='bundle', lazy='dynamic', passive_deletes=True,
+                            order_by='ShareableLink.id')
+
+    def __repr__(self):
+        return f'<Bundle {self.link_code}>'
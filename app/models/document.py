@@ -5,9 +5,13 @@ class Document(db.Model):
     """Document model for uploaded files"""
 
     __tablename__ = 'documents'
+    __table_args__ = (
+        # Dashboard: a user's live documents, newest first
+        db.Index('ix_documents_user_deleted_created', 'user_id', 'is_deleted', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
     # File information
     title = db.Column(db.String(255), nullable=False)
@@ -17,15 +21,24 @@ class Document(db.Model):
     pdf_path = db.Column(db.String(500))  # Path to converted PDF (if different from file_path)
     file_size = db.Column(db.BigInteger)  # Size in bytes
     page_count = db.Column(db.Integer)
+    pdf_crc32 = db.Column(db.BigInteger)  # CRC-32 of the PDF, for bundle ZIPs
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # Latest DocumentVersion.version
 
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_deleted = db.Column(db.Boolean, default=False, nullable=False)
     deleted_at = db.Column(db.DateTime)
+    text_indexed_at = db.Column(db.DateTime)  # Set once page text is in the search index
 
     # Relationships
-    shareable_links = db.relationship('ShareableLink', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    # passive_deletes: never load dependent rows to delete them (see DocumentPurger)
+    shareable_links = db.relationship('ShareableLink', backref='document', lazy='dynamic', cascade='all, delete-orphan',
+                                      passive_deletes=True)
+    pages = db.relationship('DocumentPage', backref='document', lazy='dynamic', cascade='all, delete-orphan',
+                            passive_deletes=True)
+    versions = db.relationship('DocumentVersion', backref='document', lazy='dynamic', cascade='all, delete-orphan',
+                               passive_deletes=True, order_by='DocumentVersion.version.desc()')
 
     @property
     def total_views(self):
@@ -34,15 +47,15 @@ class Document(db.Model):
 
     @property
     def unique_viewers(self):
-        """Count unique viewers by email across all links"""
+        """Count unique viewers across all links"""
         from app.models.analytics import DocumentView
         from app.models.link import ShareableLink
 
-        unique_count = db.session.query(db.func.count(db.distinct(DocumentView.viewer_email))).join(
+        unique_count = db.session.query(db.func.count(db.distinct(DocumentView.viewer_id))).join(
             ShareableLink
         ).filter(
             ShareableLink.document_id == self.id,
-            DocumentView.viewer_email.isnot(None)
+            DocumentView.viewer_id.isnot(None)
         ).scalar()
 
         return unique_count or 0
@@ -0,0 +1,51 @@
+from sqlalchemy import DDL, event
+from app import db
+
+class DocumentPage(db.Model):
+    """Extracted text of one PDF page, the unit of full-text search"""
+
+    __tablename__ = 'document_pages'
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'page_number', name='uq_document_pages_document_page'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # Owner, copied from Document
+    page_number = db.Column(db.Integer, nullable=False)  # 1-based
+    content = db.Column(db.Text, nullable=False, default='')
+
+    def __repr__(self):
+        return f'<DocumentPage {self.document_id}:{self.page_number}>'
+
+# The inverted index lives outside the ORM model:
+# - PostgreSQL: a generated tsvector column with a GIN index
+# - SQLite: an FTS5 table kept in sync by triggers; the owner column holds
+#   'u<user_id>' so a MATCH can be restricted to one user's pages
+SEARCH_INDEX_DDL = {
+    'postgresql': [
+        "ALTER TABLE document_pages ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+        "CREATE INDEX ix_document_pages_search_vector ON document_pages USING gin (search_vector)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE document_pages_fts USING fts5(content, owner, tokenize='porter unicode61')",
+        "CREATE TRIGGER document_pages_fts_insert AFTER INSERT ON document_pages BEGIN "
+        "INSERT INTO document_pages_fts (rowid, content, owner) VALUES (new.id, new.content, 'u' || new.user_id); "
+        "END",
+        "CREATE TRIGGER document_pages_fts_delete AFTER DELETE ON document_pages BEGIN "
+        "DELETE FROM document_pages_fts WHERE rowid = old.id; "
+        "END",
+        "CREATE TRIGGER document_pages_fts_update AFTER UPDATE ON document_pages BEGIN "
+        "DELETE FROM document_pages_fts WHERE rowid = old.id; "
+        "INSERT INTO document_pages_fts (rowid, content, owner) VALUES (new.id, new.content, 'u' || new.user_id); "
+        "END",
+    ],
+}
+
+for _dialect, _statements in SEARCH_INDEX_DDL.items():
+    for _statement in _statements:
+        event.listen(DocumentPage.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+event.listen(DocumentPage.__table__, 'after_drop',
+             DDL('DROP TABLE IF EXISTS document_pages_fts').execute_if(dialect='sqlite'))
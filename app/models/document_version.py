@@ -0,0 +1,31 @@
+from datetime import datetime
+from app import db
+
+class DocumentVersion(db.Model):
+    """One uploaded file of a document; the Document row mirrors the latest version"""
+
+    __tablename__ = 'document_versions'
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'version', name='uq_document_versions_document_version'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)  # 1-based, in upload order
+
+    # File information, as on Document
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(10), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    pdf_path = db.Column(db.String(500))
+    file_size = db.Column(db.BigInteger)
+    page_count = db.Column(db.Integer)
+    pdf_crc32 = db.Column(db.BigInteger)  # CRC-32 of the PDF, for bundle ZIPs
+
+    # Content digest of each page (list, page 1 first), set when the version's text is indexed
+    page_hashes = db.Column(db.JSON)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<DocumentVersion {self.document_id} v{self.version}>'
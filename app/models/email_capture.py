@@ -7,9 +7,10 @@ class CapturedEmail(db.Model):
     __tablename__ = 'captured_emails'
 
     id = db.Column(db.Integer, primary_key=True)
-    link_id = db.Column(db.Integer, db.ForeignKey('shareable_links.id'), nullable=False, index=True)
+    link_id = db.Column(db.Integer, db.ForeignKey('shareable_links.id', ondelete='CASCADE'), nullable=False, index=True)
 
     email = db.Column(db.String(120), nullable=False, index=True)
+    viewer_id = db.Column(db.Integer, db.ForeignKey('viewers.id', ondelete='SET NULL'), index=True)
     captured_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     # Additional optional fields
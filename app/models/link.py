@@ -3,39 +3,8 @@ import secrets
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 
-class ShareableLink(db.Model):
-    """Shareable link model with access control settings"""
-
-    __tablename__ = 'shareable_links'
-
-    id = db.Column(db.Integer, primary_key=True)
-    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
-
-    # Link details
-    link_code = db.Column(db.String(32), unique=True, nullable=False, index=True)
-    name = db.Column(db.String(100))  # Internal name for organization
-
-    # Security settings
-    password_hash = db.Column(db.String(255))  # Optional password protection
-    require_email = db.Column(db.Boolean, default=True, nullable=False)
-
-    # Access control
-    is_active = db.Column(db.Boolean, default=True, nullable=False)
-    expires_at = db.Column(db.DateTime)  # Optional expiration
-    max_views = db.Column(db.Integer)  # Optional view limit
-    view_count = db.Column(db.Integer, default=0, nullable=False)
-
-    # Customization
-    custom_message = db.Column(db.Text)  # Message shown before viewing
-    allow_download = db.Column(db.Boolean, default=False, nullable=False)
-
-    # Tracking
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    last_viewed_at = db.Column(db.DateTime)
-
-    # Relationships
-    document_views = db.relationship('DocumentView', backref='link', lazy='dynamic', cascade='all, delete-orphan')
-    captured_emails = db.relationship('CapturedEmail', backref='link', lazy='dynamic', cascade='all, delete-orphan')
+class LinkAccessMixin:
+    """Password, expiry and view-limit checks shared by shareable links and bundles"""
 
     @staticmethod
     def generate_link_code():
@@ -74,5 +43,54 @@ class ShareableLink(db.Model):
         """Check if link requires password"""
         return self.password_hash is not None
 
+class ShareableLink(LinkAccessMixin, db.Model):
+    """Shareable link model with access control settings"""
+
+    __tablename__ = 'shareable_links'
+    __table_args__ = (
+        # Link management: a document's links that are not deleted, newest first
+        db.Index('ix_shareable_links_document_created', 'document_id', 'created_at',
+                 postgresql_where=db.text('deleted_at IS NULL'), sqlite_where=db.text('deleted_at IS NULL')),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # Link details
+    link_code = db.Column(db.String(32), unique=True, nullable=False, index=True)
+    name = db.Column(db.String(100))  # Internal name for organization
+
+    # Security settings
+    password_hash = db.Column(db.String(255))  # Optional password protection
+    require_email = db.Column(db.Boolean, default=True, nullable=False)
+    watermark = db.Column(db.Boolean, default=False, nullable=False)  # Stamp the viewer's email on every page
+
+    # Access control
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    expires_at = db.Column(db.DateTime)  # Optional expiration
+    max_views = db.Column(db.Integer)  # Optional view limit
+    view_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Customization
+    custom_message = db.Column(db.Text)  # Message shown before viewing
+    allow_download = db.Column(db.Boolean, default=False, nullable=False)
+
+    # Tracking
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_viewed_at = db.Column(db.DateTime)
+    deleted_at = db.Column(db.DateTime)  # Set on delete; the row is purged in the background
+
+    # Set on the per-document links of a bundle, which are gated by the bundle and not shared on their own
+    bundle_id = db.Column(db.Integer, db.ForeignKey('bundles.id', ondelete='CASCADE'), index=True)
+
+    # Relationships
+    # passive_deletes: never load history rows to delete them (see DocumentPurger)
+    document_views = db.relationship('DocumentView', backref='link', lazy='dynamic', cascade='all, delete-orphan',
+                                     passive_deletes=True)
+    captured_emails = db.relationship('CapturedEmail', backref='link', lazy='dynamic', cascade='all, delete-orphan',
+                                      passive_deletes=True)
+    view_rollups = db.relationship('DocumentViewRollup', backref='link', lazy='dynamic', cascade='all, delete-orphan',
+                                   passive_deletes=True)
+
     def __repr__(self):
         return f'<ShareableLink {self.link_code}>'
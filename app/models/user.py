@@ -1,6 +1,9 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import has_app_context
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from app import db
 
 class User(UserMixin, db.Model):
@@ -29,3 +32,25 @@ class User(UserMixin, db.Model):
 
     def __repr__(self):
         return f'<User {self.email}>'
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _track_changed_user(mapper, connection, target):
+    """Remember changed users so their cached snapshot is dropped on commit"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    user_ids = session.info.pop('changed_user_ids', None)
+    if not user_ids or not has_app_context():
+        return
+
+    from app.services.user_cache import UserCache
+    for user_id in user_ids:
+        UserCache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
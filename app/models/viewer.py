@@ -0,0 +1,25 @@
+from datetime import datetime
+from app import db
+
+class Viewer(db.Model):
+    """A person who opened an owner's links, one row per owner and normalized email"""
+
+    __tablename__ = 'viewers'
+    __table_args__ = (
+        db.UniqueConstraint('owner_id', 'email', name='uq_viewers_owner_email'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+    email = db.Column(db.String(120), nullable=False)  # Trimmed and lowercased
+    full_name = db.Column(db.String(100))  # Latest non-empty value given at the email gate
+    company = db.Column(db.String(100))
+
+    # Maintained in place by ViewerRegistry's upsert
+    first_seen_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    visit_count = db.Column(db.Integer, default=1, nullable=False)
+
+    def __repr__(self):
+        return f'<Viewer {self.email}>'
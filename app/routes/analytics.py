@@ -1,5 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.analytics import DocumentView
+from app.models.link import ShareableLink
 from app.services.analytics_tracker import AnalyticsTracker
+from app.services.bot_filter import BotFilter
+from app.services.link_generator import LinkGeneratorService
+from app.services.metrics import Metrics
+from app.services.presence import PresenceTracker
 
 bp = Blueprint('analytics', __name__, url_prefix='/api')
 
@@ -15,6 +23,10 @@ def track_view():
         import json
         data = json.loads(request.form.get('data', '{}'))
 
+    if data.get('v') == 2:
+        return track_view_batch(data)
+
+    # Protocol v1: full state on every heartbeat (viewer.js cached from before v2)
     session_id = data.get('session_id')
     current_page = data.get('current_page')
     pages_viewed = data.get('pages_viewed', [])
@@ -40,24 +52,59 @@ def track_view():
     else:
         return jsonify({'error': 'Session not found'}), 404
 
+def track_view_batch(data):
+    """Protocol v2: batched page-entry deltas with a sequence number"""
+    try:
+        batch = AnalyticsTracker.parse_heartbeat_batch(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    session = AnalyticsTracker.apply_heartbeat(**batch)
+
+    if session:
+        link_id, viewer_email = session
+        if batch['is_final']:
+            PresenceTracker.leave(link_id, batch['session_id'])
+        else:
+            PresenceTracker.touch(link_id, batch['session_id'], viewer_email, batch['current_page'])
+        return jsonify({'status': 'success', 'ack': batch['seq']}), 200
+    else:
+        return jsonify({'error': 'Session not found'}), 404
+
 @bp.route('/track/start', methods=['POST'])
 def track_start():
-    """Start a new viewing session"""
-
-    data = request.json
-    link_id = data.get('link_id')
-    viewer_email = data.get('viewer_email')
+    """Open the viewing session reserved by the viewer page's start token (once; replays get the same session)"""
+    data = request.get_json(silent=True) or {}
     viewer_ip = request.remote_addr
     user_agent = request.user_agent.string
 
-    if not link_id:
-        return jsonify({'error': 'Link ID required'}), 400
+    # The link, session id and email come from the signed token, never from the request body
+    try:
+        start = AnalyticsTracker.read_start_token(
+            data.get('token'), current_app.config['SECRET_KEY'], current_app.config['TRACKING_START_TOKEN_MAX_AGE']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    session_id = AnalyticsTracker.start_viewing_session(
-        link_id=link_id,
-        viewer_email=viewer_email,
-        viewer_ip=viewer_ip,
-        user_agent=user_agent
-    )
+    if db.session.query(DocumentView.id).filter_by(session_id=start['session_id']).first():
+        return jsonify({'session_id': start['session_id']}), 200
+
+    if not AnalyticsTracker.accepts_views(db.session.get(ShareableLink, start['link_id'])):
+        return jsonify({'error': 'Link unavailable'}), 403
+
+    bot = BotFilter.classify(user_agent, viewer_ip)
+    if bot:
+        BotFilter.record(bot)
+        return jsonify({'error': 'Automated clients are not tracked'}), 403
+
+    try:
+        session_id = AnalyticsTracker.start_viewing_session(viewer_ip=viewer_ip, user_agent=user_agent, **start)
+    except IntegrityError:
+        # A concurrent replay opened it first
+        db.session.rollback()
+        return jsonify({'session_id': start['session_id']}), 200
 
+    # Counts against max_views like a session opened when the page renders
+    LinkGeneratorService.increment_view_count(start['link_id'])
+    Metrics.view_confirmation('confirmed')
     return jsonify({'session_id': session_id}), 200
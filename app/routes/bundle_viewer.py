@@ -0,0 +1,173 @@
+from flask import Blueprint, Response, current_app, render_template, redirect, url_for, flash, request, session
+from werkzeug.utils import secure_filename
+from app import db
+from app.models.email_capture import CapturedEmail
+from app.services.bot_filter import BotFilter
+from app.services.bundles import BundleService
+from app.services.metrics import Metrics
+from app.services.viewer_registry import ViewerRegistry
+
+bp = Blueprint('bundle_viewer', __name__, url_prefix='/b')
+
+def _gate_redirect(bundle):
+    """Redirect to the first gate this browser session has not passed, or None"""
+    if bundle.requires_password and not session.get(f'link_password_verified_{bundle.link_code}', False):
+        return redirect(url_for('bundle_viewer.password_gate', link_code=bundle.link_code))
+    if bundle.require_email and not session.get(f'link_email_captured_{bundle.link_code}'):
+        return redirect(url_for('bundle_viewer.email_capture', link_code=bundle.link_code))
+    return None
+
+@bp.route('/<link_code>')
+def view(link_code):
+    """Bundle index - handles password and email gates, then lists the documents"""
+
+    is_valid, error_message, bundle = BundleService.validate_access(link_code)
+
+    if not bundle:
+        flash(error_message, 'danger')
+        return render_template('viewer/error.html', message=error_message), 404
+
+    gate = _gate_redirect(bundle)
+    if gate:
+        return gate
+
+    if not is_valid:
+        flash(error_message or 'This link is no longer valid.', 'warning')
+        return render_template('viewer/error.html', message=error_message or 'Link expired'), 403
+
+    # Count the bundle once per browser session; each document counts its own views when opened
+    if not session.get(f'bundle_viewed_{link_code}'):
+        bot = BotFilter.classify(request.user_agent.string, request.remote_addr)
+        if bot:
+            BotFilter.record(bot)
+        else:
+            session[f'bundle_viewed_{link_code}'] = True
+            BundleService.increment_view_count(bundle.id)
+
+    return render_template('viewer/bundle.html', bundle=bundle, items=BundleService.items(bundle))
+
+@bp.route('/<link_code>/password', methods=['GET', 'POST'])
+def password_gate(link_code):
+    """Password protection gate"""
+
+    is_valid, error_message, bundle = BundleService.validate_access(link_code)
+
+    if not bundle or not bundle.requires_password:
+        return redirect(url_for('bundle_viewer.view', link_code=link_code))
+
+    if session.get(f'link_password_verified_{link_code}', False):
+        return redirect(url_for('bundle_viewer.view', link_code=link_code))
+
+    if request.method == 'POST':
+        if bundle.check_password(request.form.get('password', '')):
+            session[f'link_password_verified_{link_code}'] = True
+            return redirect(url_for('bundle_viewer.view', link_code=link_code))
+        else:
+            flash('Incorrect password. Please try again.', 'danger')
+
+    return render_template('viewer/password_gate.html', link=bundle,
+                           action=url_for('bundle_viewer.password_gate', link_code=link_code))
+
+@bp.route('/<link_code>/email', methods=['GET', 'POST'])
+def email_capture(link_code):
+    """Email capture gate, passed once for every document in the bundle"""
+
+    is_valid, error_message, bundle = BundleService.validate_access(link_code)
+
+    if not bundle or not bundle.require_email:
+        return redirect(url_for('bundle_viewer.view', link_code=link_code))
+
+    if session.get(f'link_email_captured_{link_code}'):
+        return redirect(url_for('bundle_viewer.view', link_code=link_code))
+
+    context = {'link': bundle, 'title': bundle.name,
+               'action': url_for('bundle_viewer.email_capture', link_code=link_code)}
+
+    if request.method == 'POST':
+        email = request.form.get('email', '').strip()
+        full_name = request.form.get('full_name', '').strip() or None
+        company = request.form.get('company', '').strip() or None
+
+        if not email:
+            flash('Email address is required.', 'danger')
+            return render_template('viewer/email_capture.html', **context)
+
+        # Scanners that submit forms get the page again without anything being recorded
+        bot = BotFilter.classify(request.user_agent.string, request.remote_addr)
+        if bot:
+            BotFilter.record(bot)
+            return render_template('viewer/email_capture.html', **context)
+
+        # The viewer belongs to the owner, so one visit through any document's link records it;
+        # each document gets its captured email, and opening one starts a session with this email
+        items = BundleService.items(bundle)
+        viewer_id = ViewerRegistry.record_visit(items[0][0].id, email, full_name, company) if items else None
+        for link, _document in items:
+            db.session.add(CapturedEmail(
+                link_id=link.id,
+                email=email,
+                viewer_id=viewer_id,
+                full_name=full_name,
+                company=company,
+                ip_address=request.remote_addr,
+                user_agent=request.user_agent.string
+            ))
+        db.session.commit()
+
+        session[f'link_email_captured_{link_code}'] = email
+        session[f'bundle_viewer_{link_code}'] = [full_name, company]
+        return redirect(url_for('bundle_viewer.view', link_code=link_code))
+
+    return render_template('viewer/email_capture.html', **context)
+
+@bp.route('/<link_code>/download')
+def download(link_code):
+    """Stream the bundle's documents as one ZIP, with byte-range support for resumed downloads"""
+
+    is_valid, error_message, bundle = BundleService.validate_access(link_code)
+
+    if not bundle:
+        return "Bundle not found", 404
+
+    if not is_valid:
+        return "Link unavailable", 403
+
+    if not bundle.allow_download:
+        return "Download not allowed", 403
+
+    if _gate_redirect(bundle):
+        return "Access denied", 403
+
+    try:
+        with Metrics.timer('docone_file_serve_seconds', (('endpoint', 'bundle_viewer.download'),)):
+            archive = BundleService.archive(bundle)
+    except OSError as e:
+        current_app.logger.error(f"Cannot lay out bundle {bundle.id}: {str(e)}")
+        return "Bundle unavailable", 503
+
+    start, stop, status = 0, archive.size, 200
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': f'"{archive.etag}"',
+        'Content-Disposition': f'attachment; filename="{secure_filename(bundle.name) or "bundle"}.zip"',
+    }
+
+    # Honor a single byte range, unless If-Range shows the client holds an older layout of the archive
+    if_range = request.if_range
+    current = if_range.etag == archive.etag if (if_range.etag or if_range.date) else True
+    if request.range and len(request.range.ranges) == 1 and current:
+        byte_range = request.range.range_for_length(archive.size)
+        if byte_range is None:
+            return Response(status=416, headers={'Content-Range': f'bytes */{archive.size}'})
+        start, stop = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{archive.size}'
+
+    # A resumed download counts once, when it started
+    if start == 0:
+        BundleService.increment_download_count(bundle.id)
+    Metrics.bundle_download('full' if status == 200 else 'range')
+
+    headers['Content-Length'] = str(stop - start)
+    return Response(archive.iter_range(start, stop), status=status, headers=headers,
+                    mimetype='application/zip', direct_passthrough=True)
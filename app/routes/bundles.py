@@ -0,0 +1,102 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required, current_user
+from datetime import datetime
+from app.models.bundle import Bundle
+from app.models.document import Document
+from app.services.bundles import BundleService
+
+bp = Blueprint('bundles', __name__)
+
+def _owned_bundle(bundle_id):
+    return Bundle.query.filter_by(id=bundle_id, user_id=current_user.id, deleted_at=None).first()
+
+@bp.route('/bundles')
+@login_required
+def list_bundles():
+    """List the user's bundles"""
+    bundles = Bundle.query.filter_by(
+        user_id=current_user.id,
+        deleted_at=None
+    ).order_by(Bundle.created_at.desc()).all()
+
+    return render_template('bundles/index.html', bundles=bundles)
+
+@bp.route('/bundles/create', methods=['GET', 'POST'])
+@login_required
+def create_bundle():
+    """Create a bundle of several documents under one link"""
+    documents = Document.query.filter_by(
+        user_id=current_user.id,
+        is_deleted=False
+    ).order_by(Document.created_at.desc()).all()
+
+    if request.method == 'POST':
+        name = request.form.get('name', '').strip()
+        if not name:
+            flash('Bundle name is required.', 'danger')
+            return render_template('bundles/create.html', documents=documents)
+
+        # Handle expiration
+        expires_at = None
+        expires_str = request.form.get('expires_at', '').strip()
+        if expires_str:
+            try:
+                expires_at = datetime.strptime(expires_str, '%Y-%m-%d')
+            except ValueError:
+                flash('Invalid expiration date format.', 'warning')
+
+        # Handle max views
+        max_views = None
+        max_views_str = request.form.get('max_views', '').strip()
+        if max_views_str:
+            try:
+                max_views = int(max_views_str)
+            except ValueError:
+                flash('Invalid max views value.', 'warning')
+
+        try:
+            bundle = BundleService.create_bundle(
+                user_id=current_user.id,
+                name=name,
+                document_ids=request.form.getlist('document_ids', type=int),
+                password=request.form.get('password', '').strip() or None,
+                require_email=request.form.get('require_email') == 'on',
+                expires_at=expires_at,
+                max_views=max_views,
+                allow_download=request.form.get('allow_download') == 'on',
+                custom_message=request.form.get('custom_message', '').strip() or None
+            )
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return render_template('bundles/create.html', documents=documents)
+
+        flash('Bundle created successfully!', 'success')
+        return redirect(url_for('bundles.view_bundle', bundle_id=bundle.id))
+
+    return render_template('bundles/create.html', documents=documents)
+
+@bp.route('/bundles/<int:bundle_id>')
+@login_required
+def view_bundle(bundle_id):
+    """Bundle link and per-document analytics"""
+    bundle = _owned_bundle(bundle_id)
+
+    if not bundle:
+        flash('Bundle not found.', 'danger')
+        return redirect(url_for('bundles.list_bundles'))
+
+    return render_template('bundles/view.html', bundle=bundle, items=BundleService.get_stats(bundle))
+
+@bp.route('/bundles/<int:bundle_id>/delete', methods=['POST'])
+@login_required
+def delete_bundle(bundle_id):
+    """Delete a bundle and the view history of its documents' bundle links"""
+    bundle = _owned_bundle(bundle_id)
+
+    if not bundle:
+        flash('Bundle not found.', 'danger')
+        return redirect(url_for('bundles.list_bundles'))
+
+    BundleService.delete_bundle(bundle)
+    flash('Bundle deleted successfully.', 'success')
+    return redirect(url_for('bundles.list_bundles'))
@@ -1,119 +1,136 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify,
+                   Response, stream_with_context)
 from flask_login import login_required, current_user
 from app import db
 from app.models.document import Document
+from app.models.link import ShareableLink
 from app.services.file_storage import FileStorageService
-from app.services.document_converter import DocumentConverter
-import os
+from app.services.document_versions import DocumentVersionService
+from app.services.replica_router import read_only
+from app.services.search_index import SearchIndex
+from app.services.presence import PresenceTracker
+from app.services.purge import DocumentPurger
+from datetime import datetime, timedelta
 
 bp = Blueprint('documents', __name__)
 
 @bp.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
-    """User dashboard with document list"""
+    """User dashboard with document list, or search results when ?q= is given"""
+    query = request.args.get('q', '').strip()
+    if query:
+        results = SearchIndex.search(current_user.id, query)
+        return render_template('dashboard/index.html', documents=[], query=query, results=results)
+
     # Get all documents for current user (excluding deleted)
     documents = Document.query.filter_by(
         user_id=current_user.id,
         is_deleted=False
     ).order_by(Document.created_at.desc()).all()
 
-    return render_template('dashboard/index.html', documents=documents)
+    return render_template('dashboard/index.html', documents=documents, query='', results=None)
+
+@bp.route('/documents/search')
+@login_required
+@read_only
+def search():
+    """Full-text search across the current user's documents"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+    results = SearchIndex.search(current_user.id, query, limit=limit)
+    for result in results:
+        result['url'] = url_for('documents.view_document', document_id=result['document_id'])
+
+    return jsonify({'query': query, 'results': results})
+
+def _uploaded_file():
+    """The file of an upload form, or None (with a flashed message) if it is missing or not allowed"""
+    # Check if file is present
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        flash('No file selected.', 'danger')
+        return None
+
+    # Validate file type
+    if not FileStorageService.is_allowed_file(file.filename):
+        allowed = ', '.join(current_app.config['ALLOWED_EXTENSIONS'])
+        flash(f'Invalid file type. Allowed types: {allowed}', 'danger')
+        return None
+
+    return file
 
 @bp.route('/upload', methods=['GET', 'POST'])
 @login_required
 def upload():
     """Upload new document"""
     if request.method == 'POST':
-        # Check if file is present
-        if 'file' not in request.files:
-            flash('No file selected.', 'danger')
-            return redirect(request.url)
-
-        file = request.files['file']
-
-        if file.filename == '':
-            flash('No file selected.', 'danger')
-            return redirect(request.url)
-
-        # Validate file type
-        if not FileStorageService.is_allowed_file(file.filename):
-            allowed = ', '.join(current_app.config['ALLOWED_EXTENSIONS'])
-            flash(f'Invalid file type. Allowed types: {allowed}', 'danger')
+        file = _uploaded_file()
+        if file is None:
             return redirect(request.url)
 
         try:
-            # Save file
-            relative_path, file_size, original_filename = FileStorageService.save_uploaded_file(
-                file, current_user.id
-            )
-
-            # Get file type
-            file_type = FileStorageService.get_file_type(original_filename)
-
-            # Determine PDF path
-            pdf_path = DocumentConverter.get_pdf_path_for_document(relative_path, file_type)
-
-            # Convert to PDF if needed
-            if file_type != 'pdf':
-                input_full_path = FileStorageService.get_full_path(relative_path)
-                output_full_path = FileStorageService.get_full_path(pdf_path)
-
-                conversion_success = DocumentConverter.convert_to_pdf(
-                    input_full_path,
-                    output_full_path
-                )
-
-                if not conversion_success:
-                    # Clean up uploaded file
-                    FileStorageService.delete_file(relative_path)
-                    flash('Failed to convert document to PDF. Please try again.', 'danger')
-                    return redirect(request.url)
-            else:
-                # For PDF files, pdf_path is same as file_path
-                pdf_path = relative_path
-
-            # Get page count
-            pdf_full_path = FileStorageService.get_full_path(pdf_path)
-            page_count = DocumentConverter.get_pdf_page_count(pdf_full_path)
-
-            # Get title from form or use filename
-            title = request.form.get('title', '').strip()
-            if not title:
-                title = os.path.splitext(original_filename)[0]
-
-            # Create document record
-            document = Document(
-                user_id=current_user.id,
-                title=title,
-                original_filename=original_filename,
-                file_type=file_type,
-                file_path=relative_path,
-                pdf_path=pdf_path,
-                file_size=file_size,
-                page_count=page_count
+            stored = DocumentVersionService.store_upload(file, current_user.id)
+            # Title from the form, or the filename
+            document = DocumentVersionService.create_document(
+                current_user.id, request.form.get('title', '').strip(), stored
             )
-
-            db.session.add(document)
-            db.session.commit()
-
-            flash(f'Document "{title}" uploaded successfully!', 'success')
-            return redirect(url_for('documents.dashboard'))
-
+        except ValueError:
+            flash('Failed to convert document to PDF. Please try again.', 'danger')
+            return redirect(request.url)
         except Exception as e:
             current_app.logger.error(f"Upload error: {str(e)}")
             flash('An error occurred during upload. Please try again.', 'danger')
             return redirect(request.url)
 
+        flash(f'Document "{document.title}" uploaded successfully!', 'success')
+        return redirect(url_for('documents.dashboard'))
+
     return render_template('dashboard/upload.html')
 
+@bp.route('/documents/<int:document_id>/versions', methods=['POST'])
+@login_required
+def upload_version(document_id):
+    """Upload a new version of a document; its links show the new file from then on"""
+    document = Document.query.filter_by(
+        id=document_id,
+        user_id=current_user.id,
+        is_deleted=False
+    ).first()
+
+    if not document:
+        flash('Document not found.', 'danger')
+        return redirect(url_for('documents.dashboard'))
+
+    back = url_for('documents.view_document', document_id=document.id)
+    file = _uploaded_file()
+    if file is None:
+        return redirect(back)
+
+    try:
+        stored = DocumentVersionService.store_upload(file, current_user.id)
+        version = DocumentVersionService.add_version(document, stored)
+    except ValueError:
+        flash('Failed to convert document to PDF. Please try again.', 'danger')
+        return redirect(back)
+    except Exception as e:
+        current_app.logger.error(f"Version upload error: {str(e)}")
+        flash('An error occurred during upload. Please try again.', 'danger')
+        return redirect(back)
+
+    flash(f'Version {version.version} of "{document.title}" uploaded. Its links now show the new file.', 'success')
+    return redirect(back)
+
 @bp.route('/documents/<int:document_id>/delete', methods=['POST'])
 @login_required
 def delete_document(document_id):
     """Delete a document"""
     document = Document.query.filter_by(
         id=document_id,
-        user_id=current_user.id
+        user_id=current_user.id,
+        is_deleted=False
     ).first()
 
     if not document:
@@ -121,15 +138,8 @@ def delete_document(document_id):
         return redirect(url_for('documents.dashboard'))
 
     try:
-        # Delete files from storage
-        FileStorageService.delete_file(document.file_path)
-        if document.pdf_path and document.pdf_path != document.file_path:
-            FileStorageService.delete_file(document.pdf_path)
-
-        # Mark as deleted (soft delete) or hard delete
-        # Using hard delete for simplicity
-        db.session.delete(document)
-        db.session.commit()
+        # Soft delete now; links, view history and files are purged in the background
+        DocumentPurger.soft_delete_document(document)
 
         flash('Document deleted successfully.', 'success')
 
@@ -145,15 +155,47 @@ def view_document(document_id):
     """View document details and analytics"""
     document = Document.query.filter_by(
         id=document_id,
-        user_id=current_user.id
+        user_id=current_user.id,
+        is_deleted=False
     ).first()
 
     if not document:
         flash('Document not found.', 'danger')
         return redirect(url_for('documents.dashboard'))
 
-    # Get analytics stats
+    # Get analytics stats, optionally limited to the last N days
     from app.services.analytics_tracker import AnalyticsTracker
-    stats = AnalyticsTracker.get_document_stats(document.id)
+    days = request.args.get('days', type=int)
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    stats = AnalyticsTracker.get_document_stats(document.id, since=since)
+    versions = AnalyticsTracker.get_version_stats(document.id, since=since)
+
+    from app.services.page_coverage import PageCoverage
+    coverage = PageCoverage.get_document_coverage(document, since=since)
+
+    return render_template('dashboard/analytics.html', document=document, stats=stats, versions=versions,
+                           coverage=coverage)
+
+@bp.route('/documents/<int:document_id>/presence')
+@login_required
+def presence_stream(document_id):
+    """Live viewers of a document as a server-sent event stream"""
+    document = Document.query.filter_by(
+        id=document_id,
+        user_id=current_user.id,
+        is_deleted=False
+    ).first()
+
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+
+    link_ids = [link_id for (link_id,) in db.session.query(ShareableLink.id).filter_by(document_id=document.id)]
+
+    # Give the connection back to the pool before the long-lived response starts
+    db.session.remove()
 
-    return render_template('dashboard/analytics.html', document=document, stats=stats)
+    return Response(
+        stream_with_context(PresenceTracker.stream(link_ids)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -14,14 +14,19 @@ def manage_links(document_id):
     """Manage links for a document"""
     document = Document.query.filter_by(
         id=document_id,
-        user_id=current_user.id
+        user_id=current_user.id,
+        is_deleted=False
     ).first()
 
     if not document:
         flash('Document not found.', 'danger')
         return redirect(url_for('documents.dashboard'))
 
-    links = document.shareable_links.order_by(ShareableLink.created_at.desc()).all()
+    # A bundle's links are managed from the bundle
+    links = document.shareable_links.filter(
+        ShareableLink.deleted_at.is_(None),
+        ShareableLink.bundle_id.is_(None)
+    ).order_by(ShareableLink.created_at.desc()).all()
 
     return render_template('links/manage.html', document=document, links=links)
 
@@ -31,7 +36,8 @@ def create_link(document_id):
     """Create a new shareable link"""
     document = Document.query.filter_by(
         id=document_id,
-        user_id=current_user.id
+        user_id=current_user.id,
+        is_deleted=False
     ).first()
 
     if not document:
@@ -45,6 +51,7 @@ def create_link(document_id):
             password = request.form.get('password', '').strip() or None
             require_email = request.form.get('require_email') == 'on'
             allow_download = request.form.get('allow_download') == 'on'
+            watermark = request.form.get('watermark') == 'on'
             custom_message = request.form.get('custom_message', '').strip() or None
 
             # Handle expiration
@@ -74,7 +81,8 @@ def create_link(document_id):
                 expires_at=expires_at,
                 max_views=max_views,
                 allow_download=allow_download,
-                custom_message=custom_message
+                custom_message=custom_message,
+                watermark=watermark
             )
 
             flash('Shareable link created successfully!', 'success')
@@ -92,7 +100,7 @@ def edit_link(link_id):
     """Edit an existing link"""
     link = ShareableLink.query.get(link_id)
 
-    if not link:
+    if not link or link.deleted_at:
         flash('Link not found.', 'danger')
         return redirect(url_for('documents.dashboard'))
 
@@ -101,6 +109,10 @@ def edit_link(link_id):
         flash('Access denied.', 'danger')
         return redirect(url_for('documents.dashboard'))
 
+    if link.bundle_id is not None:
+        flash('This link is gated by its bundle; change the bundle instead.', 'warning')
+        return redirect(url_for('bundles.view_bundle', bundle_id=link.bundle_id))
+
     if request.method == 'POST':
         try:
             # Get form data
@@ -108,6 +120,7 @@ def edit_link(link_id):
             password = request.form.get('password', '').strip() or None
             require_email = request.form.get('require_email') == 'on'
             allow_download = request.form.get('allow_download') == 'on'
+            watermark = request.form.get('watermark') == 'on'
             is_active = request.form.get('is_active') == 'on'
             custom_message = request.form.get('custom_message', '').strip() or None
 
@@ -139,7 +152,8 @@ def edit_link(link_id):
                 expires_at=expires_at,
                 max_views=max_views,
                 allow_download=allow_download,
-                custom_message=custom_message
+                custom_message=custom_message,
+                watermark=watermark
             )
 
             flash('Link updated successfully!', 'success')
@@ -157,7 +171,7 @@ def delete_link(link_id):
     """Delete a link"""
     link = ShareableLink.query.get(link_id)
 
-    if not link:
+    if not link or link.deleted_at:
         flash('Link not found.', 'danger')
         return redirect(url_for('documents.dashboard'))
 
@@ -0,0 +1,19 @@
+import hmac
+from flask import Blueprint, Response, current_app, request
+from app.services.metrics import Metrics
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token and current_app.config.get('METRICS_REQUIRE_TOKEN'):
+        # Fail closed rather than expose internals when the token was never configured
+        return Response('Metrics token not configured\n', status=403, mimetype='text/plain')
+    if token:
+        provided = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(provided, f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    return Response(Metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -1,11 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session, send_file
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, session, send_file
 import secrets
 from app import db
 from app.models.link import ShareableLink
 from app.models.email_capture import CapturedEmail
 from app.models.analytics import DocumentView
+from app.services.bot_filter import BotFilter
+from app.services.document_versions import DocumentVersionService
 from app.services.link_generator import LinkGeneratorService
 from app.services.file_storage import FileStorageService
+from app.services.metrics import Metrics
+from app.services.viewer_registry import ViewerRegistry
 
 bp = Blueprint('viewer', __name__, url_prefix='/v')
 
@@ -20,45 +24,122 @@ def view(link_code):
         flash(error_message, 'danger')
         return render_template('viewer/error.html', message=error_message), 404
 
+    gate, gate_code = _gate(link)
+
     # Check if password is required and not yet verified
-    if link.requires_password:
-        password_verified = session.get(f'link_password_verified_{link_code}', False)
+    if gate.requires_password:
+        password_verified = session.get(f'link_password_verified_{gate_code}', False)
         if not password_verified:
-            return redirect(url_for('viewer.password_gate', link_code=link_code))
+            return redirect(_gate_url(link, 'password_gate'))
 
     # Check if email is required and not yet captured
-    if link.require_email:
-        email_captured = session.get(f'link_email_captured_{link_code}')
+    if gate.require_email:
+        email_captured = session.get(f'link_email_captured_{gate_code}')
         if not email_captured:
-            return redirect(url_for('viewer.email_capture', link_code=link_code))
+            return redirect(_gate_url(link, 'email_capture'))
 
     # Check if link is valid now (after password/email verification)
-    if not link.is_valid:
+    if not link.is_valid or not gate.is_valid:
         flash(error_message or 'This link is no longer valid.', 'warning')
         return render_template('viewer/error.html', message=error_message or 'Link expired'), 403
 
     # Get or create session ID for analytics tracking
     tracking_session_id = session.get(f'tracking_session_{link_code}')
+    start_token = None
 
-    # If no session ID exists yet (user didn't go through email capture), create one now
+    # If no session ID exists yet (user didn't go through email capture), create one now,
+    # unless the client is a bot or the page script has to confirm it first
     if not tracking_session_id:
-        from app.services.analytics_tracker import AnalyticsTracker
-        tracking_session_id = AnalyticsTracker.start_viewing_session(
-            link_id=link.id,
-            viewer_email=None,  # No email if they didn't go through email capture
-            viewer_ip=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        session[f'tracking_session_{link_code}'] = tracking_session_id
-
-        # Increment view count
-        LinkGeneratorService.increment_view_count(link.id)
+        bot = BotFilter.classify(request.user_agent.string, request.remote_addr)
+        if bot:
+            BotFilter.record(bot)
+        elif current_app.config['BOT_JS_CONFIRMATION']:
+            tracking_session_id, start_token = _reserve_tracking(link, link_code)
+        else:
+            tracking_session_id = _start_tracking(link, link_code)
 
     # Render document viewer
     return render_template('viewer/document.html',
                           link=link,
                           document=link.document,
-                          tracking_session_id=tracking_session_id)
+                          tracking_session_id=tracking_session_id,
+                          start_token=start_token)
+
+def _gate(link):
+    """
+    The settings that gate a link and the code its gate flags are kept under in the session
+    A bundle's document links are gated by the bundle, once for all of its documents.
+    Returns: (ShareableLink or Bundle, link code)
+    """
+    if link.bundle_id is not None:
+        return link.bundle, link.bundle.link_code
+    return link, link.link_code
+
+def _gate_url(link, endpoint):
+    """URL of a link's password or email gate (the bundle's, for a bundle's document)"""
+    gate, gate_code = _gate(link)
+    blueprint = 'bundle_viewer' if link.bundle_id is not None else 'viewer'
+    return url_for(f'{blueprint}.{endpoint}', link_code=gate_code)
+
+def _has_access(link):
+    """Whether this browser session has passed the gates of a link"""
+    gate, gate_code = _gate(link)
+    if gate.requires_password and not session.get(f'link_password_verified_{gate_code}', False):
+        return False
+    if gate.require_email and not session.get(f'link_email_captured_{gate_code}'):
+        return False
+    return True
+
+def _viewer_details(link):
+    """
+    Viewer details a session opened outside the link's own email gate carries:
+    a bundle's documents carry the email given at the bundle's gate
+    Returns: (viewer_email, full_name, company)
+    """
+    if link.bundle_id is None:
+        return None, None, None
+    gate, gate_code = _gate(link)
+    full_name, company = session.get(f'bundle_viewer_{gate_code}') or (None, None)
+    return session.get(f'link_email_captured_{gate_code}'), full_name, company
+
+def _reserve_tracking(link, link_code):
+    """
+    Reserve the session the viewer page's script opens through /api/track/start once it runs.
+    The reserved id stays in the browser session, so reloads reuse it and its start token
+    can open at most that one session.
+    Returns: (session id if the script already opened it, else None; start token or None)
+    """
+    from app.services.analytics_tracker import AnalyticsTracker
+
+    session_id = session.setdefault(f'pending_session_{link_code}', AnalyticsTracker.new_session_id())
+    if db.session.query(DocumentView.id).filter_by(session_id=session_id).first():
+        session.pop(f'pending_session_{link_code}')
+        session[f'tracking_session_{link_code}'] = session_id
+        return session_id, None
+
+    viewer_email, full_name, company = _viewer_details(link)
+    Metrics.view_confirmation('pending')
+    return None, AnalyticsTracker.start_token(link.id, session_id, current_app.config['SECRET_KEY'],
+                                              viewer_email, full_name, company)
+
+def _start_tracking(link, link_code):
+    """Create the viewing session for a link opened without its own email gate and count the view"""
+    from app.services.analytics_tracker import AnalyticsTracker
+
+    viewer_email, full_name, company = _viewer_details(link)
+    tracking_session_id = AnalyticsTracker.start_viewing_session(
+        link_id=link.id,
+        viewer_email=viewer_email,
+        viewer_ip=request.remote_addr,
+        user_agent=request.user_agent.string,
+        full_name=full_name,
+        company=company
+    )
+    session[f'tracking_session_{link_code}'] = tracking_session_id
+
+    # Increment view count
+    LinkGeneratorService.increment_view_count(link.id)
+    return tracking_session_id
 
 @bp.route('/<link_code>/password', methods=['GET', 'POST'])
 def password_gate(link_code):
@@ -66,6 +147,9 @@ def password_gate(link_code):
 
     link = ShareableLink.query.filter_by(link_code=link_code).first()
 
+    if link and link.bundle_id is not None:
+        return redirect(_gate_url(link, 'password_gate'))
+
     if not link or not link.requires_password:
         return redirect(url_for('viewer.view', link_code=link_code))
 
@@ -91,6 +175,9 @@ def email_capture(link_code):
 
     link = ShareableLink.query.filter_by(link_code=link_code).first()
 
+    if link and link.bundle_id is not None:
+        return redirect(_gate_url(link, 'email_capture'))
+
     if not link or not link.require_email:
         return redirect(url_for('viewer.view', link_code=link_code))
 
@@ -107,10 +194,20 @@ def email_capture(link_code):
             flash('Email address is required.', 'danger')
             return render_template('viewer/email_capture.html', link=link, document=link.document)
 
+        # Scanners that submit forms get the page again without anything being recorded
+        bot = BotFilter.classify(request.user_agent.string, request.remote_addr)
+        if bot:
+            BotFilter.record(bot)
+            return render_template('viewer/email_capture.html', link=link, document=link.document)
+
+        # One viewer per owner and email; repeat visits update it in place
+        viewer_id = ViewerRegistry.record_visit(link.id, email, full_name, company)
+
         # Store captured email
         captured = CapturedEmail(
             link_id=link.id,
             email=email,
+            viewer_id=viewer_id,
             full_name=full_name,
             company=company,
             ip_address=request.remote_addr,
@@ -125,6 +222,8 @@ def email_capture(link_code):
         document_view = DocumentView(
             link_id=link.id,
             viewer_email=email,
+            viewer_id=viewer_id,
+            document_version=DocumentVersionService.link_version(link.id),
             viewer_ip=request.remote_addr,
             viewer_user_agent=request.user_agent.string,
             session_id=session_id
@@ -144,6 +243,18 @@ def email_capture(link_code):
 
     return render_template('viewer/email_capture.html', link=link, document=link.document)
 
+def _watermarked_path(link_code, full_path):
+    """Copy of the PDF stamped for the current viewer, or None if it cannot be stamped"""
+    from app.services.watermark import Watermarker
+
+    text = Watermarker.viewer_text(session.get(f'link_email_captured_{link_code}'), request.remote_addr)
+    try:
+        return Watermarker.stamped_path(full_path, text)
+    except Exception as e:
+        # Never fall back to the unstamped file
+        current_app.logger.error(f"Error watermarking {full_path}: {str(e)}")
+        return None
+
 @bp.route('/<link_code>/document.pdf')
 def serve_pdf(link_code):
     """Serve the PDF file"""
@@ -151,30 +262,30 @@ def serve_pdf(link_code):
     # Validate access
     link = ShareableLink.query.filter_by(link_code=link_code).first()
 
-    if not link:
+    if not link or link.deleted_at or link.document.is_deleted:
         return "Document not found", 404
 
-    # Check session for password verification
-    if link.requires_password:
-        if not session.get(f'link_password_verified_{link_code}', False):
-            return "Access denied", 403
-
-    # Check session for email capture
-    if link.require_email:
-        if not session.get(f'link_email_captured_{link_code}'):
-            return "Access denied", 403
+    # Check session for password verification and email capture
+    if not _has_access(link):
+        return "Access denied", 403
 
     # Get PDF file path
     pdf_path = link.document.pdf_path
     full_path = FileStorageService.get_full_path(pdf_path)
 
+    if link.watermark:
+        full_path = _watermarked_path(link_code, full_path)
+        if full_path is None:
+            return "Document unavailable", 503
+
     # Serve file
-    return send_file(
-        full_path,
-        mimetype='application/pdf',
-        as_attachment=False,
-        download_name=link.document.original_filename
-    )
+    with Metrics.timer('docone_file_serve_seconds', (('endpoint', 'viewer.serve_pdf'),)):
+        return send_file(
+            full_path,
+            mimetype='application/pdf',
+            as_attachment=False,
+            download_name=link.document.original_filename
+        )
 
 @bp.route('/<link_code>/download')
 def download_pdf(link_code):
@@ -182,24 +293,30 @@ def download_pdf(link_code):
 
     link = ShareableLink.query.filter_by(link_code=link_code).first()
 
-    if not link or not link.allow_download:
+    if not link or link.deleted_at or link.document.is_deleted:
+        return "Document not found", 404
+
+    if not link.allow_download:
         return "Download not allowed", 403
 
     # Check access permissions (same as serve_pdf)
-    if link.requires_password and not session.get(f'link_password_verified_{link_code}', False):
-        return "Access denied", 403
-
-    if link.require_email and not session.get(f'link_email_captured_{link_code}'):
+    if not _has_access(link):
         return "Access denied", 403
 
     # Get PDF file path
     pdf_path = link.document.pdf_path
     full_path = FileStorageService.get_full_path(pdf_path)
 
+    if link.watermark:
+        full_path = _watermarked_path(link_code, full_path)
+        if full_path is None:
+            return "Document unavailable", 503
+
     # Serve file as download
-    return send_file(
-        full_path,
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=link.document.original_filename
-    )
+    with Metrics.timer('docone_file_serve_seconds', (('endpoint', 'viewer.download_pdf'),)):
+        return send_file(
+            full_path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=link.document.original_filename
+        )
@@ -1,24 +1,35 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import current_app
 from app import db
-from app.models.analytics import DocumentView
+from app.models.analytics import DocumentView, DocumentViewRollup
 from app.models.link import ShareableLink
+from app.services.replica_router import read_only
+from app.services.view_partitions import month_start
+
+MAX_EVENTS_PER_BATCH = 500  # Page entries accepted in one heartbeat batch
+MAX_TRACKED_PAGE = 10000  # Highest page recorded in a session's page bitmap (1.25 KB)
+START_TOKEN_SALT = 'docone.track-start'
 
 class AnalyticsTracker:
     """Service for tracking document views and analytics"""
 
     @staticmethod
-    def start_viewing_session(link_id, viewer_email, viewer_ip, user_agent):
+    def start_viewing_session(link_id, viewer_email, viewer_ip, user_agent, full_name=None, company=None,
+                              session_id=None):
         """
-        Create a new viewing session
-        Returns: session_id
+        Create a new viewing session, under session_id if one was reserved (see start_token)
+        Returns: session_id (raises IntegrityError if a session already holds it)
         """
-        import secrets
+        from app.services.document_versions import DocumentVersionService
+        from app.services.viewer_registry import ViewerRegistry
 
-        session_id = secrets.token_urlsafe(32)
+        session_id = session_id or AnalyticsTracker.new_session_id()
 
         view = DocumentView(
             link_id=link_id,
             viewer_email=viewer_email,
+            viewer_id=ViewerRegistry.record_visit(link_id, viewer_email, full_name, company),
+            document_version=DocumentVersionService.link_version(link_id),
             viewer_ip=viewer_ip,
             viewer_user_agent=user_agent,
             session_id=session_id
@@ -29,6 +40,59 @@ class AnalyticsTracker:
 
         return session_id
 
+    @staticmethod
+    def new_session_id():
+        import secrets
+
+        return secrets.token_urlsafe(32)
+
+    @staticmethod
+    def start_token(link_id, session_id, secret_key, viewer_email=None, full_name=None, company=None):
+        """
+        Sign the one session a /api/track/start call may open: the link, the session id
+        reserved for it and the gate's viewer details (issued by the viewer page once the
+        link's gates have passed). The session id makes the token single-use: replaying
+        it returns the session it already opened.
+        Returns: URL-safe token
+        """
+        from itsdangerous import URLSafeTimedSerializer
+
+        return URLSafeTimedSerializer(secret_key, salt=START_TOKEN_SALT).dumps(
+            {'l': link_id, 's': session_id, 'e': viewer_email, 'n': full_name, 'c': company}
+        )
+
+    @staticmethod
+    def read_start_token(token, secret_key, max_age):
+        """
+        Verify a start token from the viewer page
+        Returns: dict of start_viewing_session arguments: link_id, session_id, viewer_email,
+        full_name, company (raises ValueError when invalid or older than max_age seconds)
+        """
+        from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+        if not token or not isinstance(token, str):
+            raise ValueError('Start token required')
+        try:
+            data = URLSafeTimedSerializer(secret_key, salt=START_TOKEN_SALT).loads(token, max_age=max_age)
+        except BadSignature:  # Expired tokens included
+            raise ValueError('Invalid start token')
+        return {'link_id': data['l'], 'session_id': data['s'], 'viewer_email': data.get('e'),
+                'full_name': data.get('n'), 'company': data.get('c')}
+
+    @staticmethod
+    def accepts_views(link):
+        """
+        Whether a new session may open on a link (loaded with its document and bundle):
+        neither it nor its document is deleted, and it and its bundle are active,
+        unexpired and under their view limits
+        Returns: bool
+        """
+        if link is None or link.deleted_at is not None or link.document.is_deleted:
+            return False
+        if not link.is_valid:
+            return False
+        return link.bundle is None or link.bundle.is_valid
+
     @staticmethod
     def update_viewing_session(session_id, current_page=None, pages_viewed=None, duration_seconds=None):
         """
@@ -45,15 +109,171 @@ class AnalyticsTracker:
             view.max_page_reached = max(view.max_page_reached or 0, current_page)
 
         if pages_viewed is not None:
-            view.pages_viewed = pages_viewed
-            view.total_page_views = len(pages_viewed)
+            view.pages_bitmap = AnalyticsTracker.page_bitmap(pages_viewed)
+            view.total_page_views = AnalyticsTracker.count_pages(view.pages_bitmap)
 
         if duration_seconds is not None:
             view.duration_seconds = duration_seconds
 
+        view.last_heartbeat_at = datetime.utcnow()
         db.session.commit()
         return True
 
+    @staticmethod
+    def parse_heartbeat_batch(data):
+        """
+        Validate a protocol v2 batch: {"v": 2, "sid": ..., "seq": n,
+        "ev": [[page, ms_since_start], ...], "p": current page, "d": duration
+        seconds, "f": 1 on the final beacon}; "ev" only holds page entries
+        queued since the last acknowledged batch
+        Returns: dict of apply_heartbeat arguments (raises ValueError when invalid)
+        """
+        session_id = data.get('sid')
+        seq = data.get('seq')
+        events = data.get('ev') or []
+
+        if not session_id or not isinstance(session_id, str):
+            raise ValueError('Session ID required')
+        if not isinstance(seq, int) or seq < 1 or not isinstance(events, list) or len(events) > MAX_EVENTS_PER_BATCH:
+            raise ValueError('Invalid batch')
+
+        entered_pages = []
+        for event in events:
+            if not isinstance(event, list) or not event or not isinstance(event[0], int) or event[0] < 1:
+                raise ValueError('Invalid event')
+            entered_pages.append(event[0])
+
+        current_page = data.get('p')
+        duration_seconds = data.get('d')
+        if current_page is not None and (not isinstance(current_page, int) or current_page < 1):
+            raise ValueError('Invalid page')
+        if duration_seconds is not None and (not isinstance(duration_seconds, int) or duration_seconds < 0):
+            raise ValueError('Invalid duration')
+
+        return {
+            'session_id': session_id,
+            'seq': seq,
+            'entered_pages': entered_pages,
+            'current_page': current_page,
+            'duration_seconds': duration_seconds,
+            'is_final': bool(data.get('f')),
+        }
+
+    @staticmethod
+    def page_bitmap(pages, bitmap=None):
+        """
+        Set the bits of pages in a session's page bitmap (page p is bit p - 1,
+        least significant bit first), ignoring anything but pages 1..MAX_TRACKED_PAGE
+        Returns: bytes, trimmed after the highest page viewed
+        """
+        bits = bytearray(bitmap or b'')
+        for page in pages:
+            if not isinstance(page, int) or not 1 <= page <= MAX_TRACKED_PAGE:
+                continue
+            index = page - 1
+            if index >> 3 >= len(bits):
+                bits.extend(bytes((index >> 3) + 1 - len(bits)))
+            bits[index >> 3] |= 1 << (index & 7)
+        return bytes(bits.rstrip(b'\x00'))
+
+    @staticmethod
+    def bitmap_pages(bitmap):
+        """
+        Page numbers set in a page bitmap
+        Returns: sorted list of pages
+        """
+        return [byte_index * 8 + bit + 1 for byte_index, byte in enumerate(bitmap or b'')
+                for bit in range(8) if byte >> bit & 1]
+
+    @staticmethod
+    def count_pages(bitmap):
+        """
+        Count the distinct pages in a page bitmap
+        Returns: number of pages
+        """
+        return bin(int.from_bytes(bitmap or b'', 'little')).count('1')
+
+    @staticmethod
+    def merge_pages(bitmap, entered_pages):
+        """
+        Add newly entered pages to a session's page bitmap
+        Returns: the new bitmap, or None when nothing changed
+        """
+        merged = AnalyticsTracker.page_bitmap(entered_pages, bitmap)
+        return merged if merged != (bitmap or b'') else None
+
+    @staticmethod
+    def heartbeat_statement(session_id, seq, current_page=None, duration_seconds=None, highest_page=None,
+                            is_final=False, pages_bitmap=None):
+        """
+        Build the conditional UPDATE for a heartbeat (also run by the ASGI batch writer)
+        current_page and last_seq only move forward with seq; duration and max page only grow
+        Returns: UPDATE statement returning (link_id, viewer_email)
+        """
+        from sqlalchemy import case, func, update
+
+        newer = DocumentView.last_seq < seq
+        values = {'last_seq': case((newer, seq), else_=DocumentView.last_seq), 'last_heartbeat_at': datetime.utcnow()}
+
+        if current_page is not None:
+            values['current_page'] = case((newer, current_page), else_=DocumentView.current_page)
+
+        if duration_seconds is not None:
+            values['duration_seconds'] = case(
+                (func.coalesce(DocumentView.duration_seconds, 0) < duration_seconds, duration_seconds),
+                else_=DocumentView.duration_seconds
+            )
+
+        if highest_page is not None:
+            values['max_page_reached'] = case(
+                (func.coalesce(DocumentView.max_page_reached, 0) < highest_page, highest_page),
+                else_=DocumentView.max_page_reached
+            )
+
+        if is_final:
+            values['ended_at'] = func.coalesce(DocumentView.ended_at, datetime.utcnow())
+        else:
+            # A newer batch after the final one comes from a page restored from the back/forward cache
+            values['ended_at'] = case((newer, None), else_=DocumentView.ended_at)
+
+        if pages_bitmap is not None:
+            values['pages_bitmap'] = pages_bitmap
+            values['total_page_views'] = AnalyticsTracker.count_pages(pages_bitmap)
+
+        return update(DocumentView).where(DocumentView.session_id == session_id).values(**values).returning(
+            DocumentView.link_id, DocumentView.viewer_email
+        )
+
+    @staticmethod
+    def apply_heartbeat(session_id, seq, entered_pages=(), current_page=None, duration_seconds=None, is_final=False):
+        """
+        Apply one batched heartbeat (tracking protocol v2) idempotently
+        Page entries are a set union and duration only grows, so retries and
+        reordered batches are harmless; current_page and last_seq only move
+        forward with seq. Without new pages this is a single UPDATE whose cost
+        does not depend on how many pages the session has seen.
+        Returns: (link_id, viewer_email) of the session, or None if it does not exist
+        """
+        pages_bitmap = None
+        if entered_pages:
+            # New pages change the page bitmap, which needs a read-modify-write under a row lock
+            row = db.session.query(DocumentView.pages_bitmap).filter_by(
+                session_id=session_id
+            ).with_for_update().first()
+            if row is None:
+                db.session.rollback()
+                return None
+            pages_bitmap = AnalyticsTracker.merge_pages(row.pages_bitmap, entered_pages)
+
+        highest_page = max(list(entered_pages) + ([current_page] if current_page else []), default=None)
+        statement = AnalyticsTracker.heartbeat_statement(
+            session_id, seq, current_page=current_page, duration_seconds=duration_seconds,
+            highest_page=highest_page, is_final=is_final, pages_bitmap=pages_bitmap
+        )
+        session = db.session.execute(statement, execution_options={'synchronize_session': False}).first()
+        db.session.commit()
+        return tuple(session) if session else None
+
     @staticmethod
     def end_viewing_session(session_id):
         """
@@ -70,77 +290,229 @@ class AnalyticsTracker:
         return True
 
     @staticmethod
-    def get_document_stats(document_id):
+    def close_idle_sessions(idle_seconds=None, batch_size=None):
+        """
+        Close sessions whose final beacon never arrived: ended_at becomes the last heartbeat
+        Open sessions are read through the partial index on ended_at IS NULL, so a sweep
+        costs in proportion to sessions still open rather than to the whole history.
+        Each batch is one set-based UPDATE in its own transaction.
+        Returns: number of sessions closed
+        """
+        from sqlalchemy import func, select, update
+
+        idle_seconds = idle_seconds if idle_seconds is not None else current_app.config['VIEW_SESSION_IDLE_SECONDS']
+        batch_size = batch_size or current_app.config['VIEW_SESSION_SWEEP_BATCH_SIZE']
+        cutoff = datetime.utcnow() - timedelta(seconds=idle_seconds)
+        last_seen = func.coalesce(DocumentView.last_heartbeat_at, DocumentView.started_at)
+
+        closed = 0
+        while True:
+            # started_at < cutoff is implied by last_seen < cutoff; it bounds the index range and prunes partitions
+            idle = select(DocumentView.id).where(
+                DocumentView.ended_at.is_(None),
+                DocumentView.started_at < cutoff,
+                last_seen < cutoff
+            ).limit(batch_size).scalar_subquery()
+            # Re-checking ended_at keeps a final beacon that lands mid-sweep
+            count = db.session.execute(
+                update(DocumentView).where(DocumentView.id.in_(idle), DocumentView.ended_at.is_(None)).values(
+                    ended_at=last_seen
+                ),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+            closed += count
+            if count < batch_size:
+                return closed
+
+    @staticmethod
+    @read_only
+    def get_document_stats(document_id, since=None, until=None):
         """
         Get aggregate statistics for a document
+        since/until bound started_at so partitioned tables are pruned
         Returns: dict with stats
         """
-        from sqlalchemy import func
+        from app.services.view_archive import ViewArchive
 
         # Get all links for this document
         link_ids = db.session.query(ShareableLink.id).filter_by(document_id=document_id).all()
         link_ids = [lid[0] for lid in link_ids]
 
-        # Total views
-        total_views = DocumentView.query.filter(DocumentView.link_id.in_(link_ids)).count()
-
-        # Unique viewers (by email)
-        unique_viewers = db.session.query(func.count(func.distinct(DocumentView.viewer_email))).filter(
+        return AnalyticsTracker._collect_stats(
             DocumentView.link_id.in_(link_ids),
-            DocumentView.viewer_email.isnot(None)
-        ).scalar() or 0
+            DocumentViewRollup.link_id.in_(link_ids),
+            since, until,
+            archived=ViewArchive.aggregate(document_id, since=since, until=until)
+        )
 
-        # Average duration
-        avg_duration = db.session.query(func.avg(DocumentView.duration_seconds)).filter(
-            DocumentView.link_id.in_(link_ids),
-            DocumentView.duration_seconds.isnot(None),
-            DocumentView.duration_seconds > 0
-        ).scalar() or 0
+    @staticmethod
+    @read_only
+    def get_link_stats(link_id, since=None, until=None):
+        """
+        Get statistics for a specific link
+        since/until bound started_at so partitioned tables are pruned
+        Returns: dict with stats
+        """
+        from app.services.view_archive import ViewArchive
 
-        # Get all views
-        views = DocumentView.query.filter(DocumentView.link_id.in_(link_ids)).order_by(
-            DocumentView.started_at.desc()
+        link = ShareableLink.query.get(link_id)
+        archived = ViewArchive.aggregate(link.document_id, link_id=link_id, since=since, until=until) if link else None
+
+        return AnalyticsTracker._collect_stats(
+            DocumentView.link_id == link_id,
+            DocumentViewRollup.link_id == link_id,
+            since, until,
+            archived=archived
+        )
+
+    @staticmethod
+    @read_only
+    def get_version_stats(document_id, since=None, until=None):
+        """
+        Get live session statistics per version of a document, latest version first
+        Archived and compacted sessions are not attributed to a version.
+        Returns: list of dicts with version details and stats
+        """
+        from sqlalchemy import and_, case, func
+        from app.models.document_version import DocumentVersion
+
+        window = []
+        if since is not None:
+            window.append(DocumentView.started_at >= since)
+        if until is not None:
+            window.append(DocumentView.started_at < until)
+
+        link_ids = db.session.query(ShareableLink.id).filter_by(document_id=document_id)
+        timed = and_(DocumentView.duration_seconds.isnot(None), DocumentView.duration_seconds > 0)
+
+        # One pass over the document's sessions, grouped by the version they opened
+        rows = db.session.query(
+            DocumentView.document_version,
+            func.count(DocumentView.id),
+            func.count(func.distinct(DocumentView.viewer_id)),
+            func.avg(case((timed, DocumentView.duration_seconds))),
+            func.avg(DocumentView.max_page_reached)
+        ).filter(
+            DocumentView.link_id.in_(link_ids.scalar_subquery()),
+            *window
+        ).group_by(DocumentView.document_version).all()
+        stats = {row[0]: row[1:] for row in rows}
+
+        versions = DocumentVersion.query.filter_by(document_id=document_id).order_by(
+            DocumentVersion.version.desc()
         ).all()
 
-        return {
-            'total_views': total_views,
-            'unique_viewers': unique_viewers,
-            'avg_duration': int(avg_duration) if avg_duration else 0,
-            'views': views
-        }
+        result = []
+        for version in versions:
+            views, unique_viewers, avg_duration, avg_max_page = stats.get(version.version, (0, 0, None, None))
+            result.append({
+                'version': version,
+                'total_views': views,
+                'unique_viewers': unique_viewers,
+                'avg_duration': int(avg_duration) if avg_duration else 0,
+                'avg_max_page': round(float(avg_max_page), 1) if avg_max_page else 0
+            })
+        return result
 
     @staticmethod
-    def get_link_stats(link_id):
+    def _collect_stats(view_filter, rollup_filter, since=None, until=None, archived=None):
         """
-        Get statistics for a specific link
+        Aggregate live sessions plus archived sessions and compacted monthly rollups
         Returns: dict with stats
         """
         from sqlalchemy import func
 
+        window = []
+        rollup_window = []
+        if since is not None:
+            window.append(DocumentView.started_at >= since)
+            rollup_window.append(DocumentViewRollup.period_start >= month_start(since))
+        if until is not None:
+            window.append(DocumentView.started_at < until)
+            rollup_window.append(DocumentViewRollup.period_start < until)
+
         # Total views
-        total_views = DocumentView.query.filter_by(link_id=link_id).count()
+        total_views = DocumentView.query.filter(view_filter, *window).count()
 
-        # Unique viewers
-        unique_viewers = db.session.query(func.count(func.distinct(DocumentView.viewer_email))).filter_by(
-            link_id=link_id
-        ).filter(DocumentView.viewer_email.isnot(None)).scalar() or 0
+        # Unique viewers (by viewer id)
+        unique_viewers = db.session.query(func.count(func.distinct(DocumentView.viewer_id))).filter(
+            view_filter,
+            DocumentView.viewer_id.isnot(None),
+            *window
+        ).scalar() or 0
 
-        # Average duration
-        avg_duration = db.session.query(func.avg(DocumentView.duration_seconds)).filter_by(
-            link_id=link_id
+        # Duration totals (combined with rollups below for the average)
+        duration_total, duration_samples = db.session.query(
+            func.coalesce(func.sum(DocumentView.duration_seconds), 0),
+            func.count(DocumentView.id)
         ).filter(
+            view_filter,
             DocumentView.duration_seconds.isnot(None),
-            DocumentView.duration_seconds > 0
-        ).scalar() or 0
+            DocumentView.duration_seconds > 0,
+            *window
+        ).one()
+
+        # Months already compacted by the retention policy
+        rollup = db.session.query(
+            func.coalesce(func.sum(DocumentViewRollup.view_count), 0),
+            func.coalesce(func.sum(DocumentViewRollup.duration_total), 0),
+            func.coalesce(func.sum(DocumentViewRollup.duration_samples), 0)
+        ).filter(rollup_filter, *rollup_window).one()
+        rollup_viewers = db.session.query(
+            DocumentViewRollup.viewer_hashes,
+            DocumentViewRollup.unique_viewers
+        ).filter(rollup_filter, *rollup_window, DocumentViewRollup.unique_viewers > 0).all()
+
+        # Sessions moved to the columnar archive
+        has_archive = bool(archived and archived['view_count'])
+        if has_archive:
+            total_views += archived['view_count']
+            duration_total += archived['duration_total']
+            duration_samples += archived['duration_samples']
+
+        # Viewers of compacted months without stored hashes can't be deduplicated
+        estimated_viewers = sum(count for hashes, count in rollup_viewers if hashes is None)
+
+        hashed_rollups = [hashes for hashes, _ in rollup_viewers if hashes is not None]
+        if has_archive or hashed_rollups:
+            import numpy as np
+            from app.models.viewer import Viewer
+            from app.services.view_archive import email_hash, unpack_hashes
+
+            # Distinct viewers across live, archived and compacted sessions, by the hash of
+            # the registered viewer's normalized email (the same viewers as COUNT(DISTINCT viewer_id))
+            live_emails = db.session.query(func.distinct(Viewer.email)).join(
+                DocumentView, DocumentView.viewer_id == Viewer.id
+            ).filter(view_filter, *window).all()
+            parts = [np.array([email_hash(row[0]) for row in live_emails], dtype=np.uint64)]
+            if has_archive:
+                parts.append(archived['viewer_hashes'])
+            parts.extend(unpack_hashes(hashes) for hashes in hashed_rollups)
+            unique_viewers = len(np.unique(np.concatenate(parts)))
+
+        total_views += rollup[0]
+        duration_total += rollup[1]
+        duration_samples += rollup[2]
+        avg_duration = duration_total / duration_samples if duration_samples else 0
 
         # Get all views
-        views = DocumentView.query.filter_by(link_id=link_id).order_by(
+        views = DocumentView.query.filter(view_filter, *window).order_by(
             DocumentView.started_at.desc()
         ).all()
 
+        # Live sessions per country, most views first (archived and compacted sessions have no location)
+        countries = db.session.query(DocumentView.country, func.count(DocumentView.id)).filter(
+            view_filter,
+            DocumentView.country.isnot(None),
+            *window
+        ).group_by(DocumentView.country).order_by(func.count(DocumentView.id).desc()).all()
+
         return {
             'total_views': total_views,
             'unique_viewers': unique_viewers,
+            'estimated_viewers': estimated_viewers,  # Per-month counts from older rollups, may overlap
             'avg_duration': int(avg_duration) if avg_duration else 0,
-            'views': views
+            'views': views,
+            'countries': [(country, count) for country, count in countries]
         }
@@ -0,0 +1,59 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.services.metrics import registry
+
+class BackgroundTasks:
+    """In-process thread pool for work that should not block a request
+
+    Tasks run inside an app context of the submitting app. The pool is
+    created lazily per process (again after a gunicorn fork), so a task
+    queued in one worker runs in that worker. Work that must survive a
+    restart should also be discoverable from the database, the way
+    SearchIndex.index_pending picks up documents that were never indexed.
+    """
+
+    _executor = None
+    _pid = None
+    _lock = threading.Lock()
+    _gauge_registered = False
+
+    @staticmethod
+    def _get_executor(app):
+        if BackgroundTasks._pid != os.getpid():
+            with BackgroundTasks._lock:
+                if BackgroundTasks._pid != os.getpid():
+                    BackgroundTasks._executor = ThreadPoolExecutor(
+                        max_workers=app.config['BACKGROUND_WORKERS'],
+                        thread_name_prefix='docone-background'
+                    )
+                    BackgroundTasks._pid = os.getpid()
+                    if not BackgroundTasks._gauge_registered:
+                        registry.register_gauge_callback(BackgroundTasks._queue_gauges)
+                        BackgroundTasks._gauge_registered = True
+        return BackgroundTasks._executor
+
+    @staticmethod
+    def _queue_gauges():
+        executor = BackgroundTasks._executor
+        if executor is not None and BackgroundTasks._pid == os.getpid():
+            yield 'docone_queue_depth', (('queue', 'background'),), executor._work_queue.qsize()
+
+    @staticmethod
+    def submit(fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the background pool inside an app context
+        Returns: concurrent.futures.Future
+        """
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    return fn(*args, **kwargs)
+                except Exception:
+                    app.logger.exception(f"Background task {fn.__qualname__} failed")
+                    raise
+
+        return BackgroundTasks._get_executor(app).submit(run)
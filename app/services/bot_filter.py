@@ -0,0 +1,144 @@
+import bisect
+import ipaddress
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from flask import current_app
+from app.services.metrics import Metrics
+
+# Link unfurlers, chat previews, mail security scanners, crawlers and HTTP libraries
+# (Cubot is a phone brand, hence the lookbehind)
+USER_AGENT_PATTERNS = [
+    r'(?<!cu)bot\b', r'crawl', r'spider', r'slurp', r'preview', r'fetcher', r'scanner',
+    r'slack(?:bot|-imgproxy)', r'discordbot', r'telegrambot', r'whatsapp', r'skypeuripreview',
+    r'microsoftpreview', r'facebookexternalhit', r'linkedinbot', r'twitterbot', r'embedly',
+    r'iframely', r'google-pagerenderer', r'googleimageproxy', r'bingpreview', r'yahoomailproxy',
+    r'barracuda', r'mimecast', r'proofpoint', r'ironport', r'forcepoint', r'trendmicro', r'symantec',
+    r'headlesschrome', r'phantomjs', r'python-requests', r'python-urllib', r'aiohttp', r'httpx',
+    r'go-http-client', r'java/', r'okhttp', r'curl/', r'wget/', r'libwww-perl', r'node-fetch', r'axios/',
+]
+USER_AGENT_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in USER_AGENT_PATTERNS), re.IGNORECASE)
+RANGES_RECHECK_SECONDS = 60  # How often the ranges file's mtime is checked
+
+@lru_cache(maxsize=4096)
+def is_bot_user_agent(user_agent):
+    """Match a User-Agent against the compiled patterns; verdicts for recent agents are cached"""
+    return not user_agent or USER_AGENT_RE.search(user_agent) is not None
+
+class IPRangeSet:
+    """Membership test over many CIDR blocks
+
+    Blocks are merged into disjoint, sorted integer intervals per IP version,
+    so a lookup is one bisect over the interval starts.
+    """
+
+    def __init__(self, networks):
+        ranges = {4: [], 6: []}
+        for network in networks:
+            ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+
+        self._starts = {}
+        self._ends = {}
+        for version, intervals in ranges.items():
+            merged = []
+            for start, end in sorted(intervals):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    @classmethod
+    def from_file(cls, path):
+        """One CIDR block or address per line; blank lines and # comments are skipped"""
+        networks = []
+        with open(path) as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    networks.append(ipaddress.ip_network(line, strict=False))
+        return cls(networks)
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def __contains__(self, address):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+
+        value = int(ip)
+        position = bisect.bisect_right(self._starts[ip.version], value) - 1
+        return position >= 0 and value <= self._ends[ip.version][position]
+
+class BotFilter:
+    """Service for telling automated clients from people before any view is recorded
+
+    Chat unfurlers, mail scanners and crawlers that open a link are matched by
+    User-Agent or by source address (BOT_IP_RANGES_FILE). Clients that pass
+    both still only get a session once the viewer page's script confirms it
+    (BOT_JS_CONFIRMATION), which clients that do not run JavaScript never do.
+    Filtered hits are counted in the docone_bot_hits_total metric instead of
+    creating DocumentView rows.
+    """
+
+    _ranges = None
+    _ranges_key = None
+    _ranges_checked = 0.0
+    _ranges_lock = threading.Lock()
+
+    @staticmethod
+    def ip_ranges(path):
+        """
+        The parsed BOT_IP_RANGES_FILE, reloaded when the file changes
+        Returns: IPRangeSet, or None when no file is configured
+        """
+        if not path:
+            return None
+
+        now = time.monotonic()
+        key = BotFilter._ranges_key
+        if key and key[0] == path and now - BotFilter._ranges_checked < RANGES_RECHECK_SECONDS:
+            return BotFilter._ranges
+
+        with BotFilter._ranges_lock:
+            try:
+                key = (path, os.stat(path).st_mtime_ns)
+            except OSError:
+                key = (path, None)
+            if key != BotFilter._ranges_key:
+                BotFilter._ranges = IPRangeSet.from_file(path) if key[1] is not None else None
+                BotFilter._ranges_key = key
+            BotFilter._ranges_checked = now
+        return BotFilter._ranges
+
+    @staticmethod
+    def classify(user_agent, remote_addr, config=None):
+        """
+        Decide whether a request comes from an automated client
+        config defaults to the current app's (the ASGI tracking app passes its own)
+        Returns: 'user_agent' or 'ip_range' for a bot, None otherwise
+        """
+        config = config or current_app.config
+        if not config['BOT_FILTER_ENABLED']:
+            return None
+
+        if is_bot_user_agent(user_agent or ''):
+            return 'user_agent'
+
+        ranges = BotFilter.ip_ranges(config['BOT_IP_RANGES_FILE'])
+        if ranges is not None and remote_addr and remote_addr in ranges:
+            return 'ip_range'
+
+        return None
+
+    @staticmethod
+    def record(reason):
+        """Count a filtered hit by reason (user_agent or ip_range)"""
+        Metrics.bot_hit(reason)
@@ -0,0 +1,160 @@
+import bisect
+import hashlib
+import struct
+import zlib
+
+COPY_CHUNK = 256 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+MAX_ENTRIES = 0xFFFF
+UTF8_FLAG = 0x0800
+UNIX_FILE = 0o100644 << 16  # External attributes: regular file, rw-r--r--
+
+class BundleArchive:
+    """Layout of a stored (uncompressed) ZIP of a bundle's PDFs, streamed from the original files
+
+    PDFs are already compressed, so entries are stored as-is and every byte
+    of the archive is known before anything is read: headers come from each
+    file's size and CRC-32 (computed once at upload, Document.pdf_crc32) and
+    the file bodies are the files themselves. The archive is a list of
+    segments (header bytes or a slice of a file) with precomputed offsets, so
+    any byte range is served by seeking into the right segments, which is
+    what lets clients resume a download with a Range request. Nothing is
+    written to disk and memory use does not depend on the file sizes.
+    Archives over 4 GiB or 65,535 entries use the Zip64 extensions.
+    """
+
+    def __init__(self, entries):
+        """entries: (name, full_path, size, crc32, modified_at) per file, in archive order"""
+        self._starts = []
+        self._segments = []  # (bytes or full_path, length)
+        self.size = 0
+
+        central = []
+        for name, full_path, size, crc, modified_at in entries:
+            encoded = name.encode('utf-8')
+            dos_time, dos_date = BundleArchive.dos_datetime(modified_at)
+            offset = self.size
+
+            self._append(BundleArchive._local_header(encoded, size, crc, dos_time, dos_date))
+            self._append(full_path, size)
+            central.append(BundleArchive._central_header(encoded, size, crc, dos_time, dos_date, offset))
+
+        directory = b''.join(central)
+        self._append(directory)
+        self._append(BundleArchive._end_records(len(central), len(directory), self.size - len(directory)))
+
+        # Every byte of the archive follows from the central directory
+        self.etag = hashlib.sha256(directory).hexdigest()[:32]
+
+    def _append(self, data, length=None):
+        length = len(data) if length is None else length
+        self._starts.append(self.size)
+        self._segments.append((data, length))
+        self.size += length
+
+    def iter_range(self, start=0, stop=None):
+        """
+        Stream bytes [start, stop) of the archive
+        Returns: generator of bytes chunks
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        index = bisect.bisect_right(self._starts, start) - 1
+        position = start
+        while position < stop:
+            data, length = self._segments[index]
+            offset = position - self._starts[index]
+            end = min(length, stop - self._starts[index])
+            if isinstance(data, bytes):
+                yield data[offset:end]
+            else:
+                yield from BundleArchive._read_file(data, offset, end - offset)
+            position = self._starts[index] + end
+            index += 1
+
+    @staticmethod
+    def _read_file(full_path, offset, length):
+        with open(full_path, 'rb') as f:
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(COPY_CHUNK, length))
+                if not chunk:
+                    # The headers already promised these bytes; abort rather than send a corrupt archive
+                    raise IOError(f'{full_path} is shorter than when the archive was laid out')
+                length -= len(chunk)
+                yield chunk
+
+    @staticmethod
+    def file_crc32(full_path):
+        """
+        CRC-32 of a file, as stored in ZIP headers
+        Returns: unsigned 32-bit int
+        """
+        crc = 0
+        with open(full_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    @staticmethod
+    def dos_datetime(moment):
+        """
+        MS-DOS time and date fields for a datetime (clamped to 1980, the earliest DOS date)
+        Returns: (time, date)
+        """
+        if moment is None or moment.year < 1980:
+            return 0, (1 << 5) | 1
+        return ((moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+                ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day)
+
+    @staticmethod
+    def entry_names(titles, extension='.pdf'):
+        """
+        Unique, path-safe archive names for a list of titles, in order
+        Returns: list of names
+        """
+        names, seen = [], set()
+        for title in titles:
+            base = ''.join('_' if char in '/\\:' or ord(char) < 32 else char for char in title).strip(' .') or 'document'
+            base = base[:150]
+            name, number = base + extension, 2
+            while name.lower() in seen:
+                name = f'{base} ({number}){extension}'
+                number += 1
+            seen.add(name.lower())
+            names.append(name)
+        return names
+
+    @staticmethod
+    def _local_header(name, size, crc, dos_time, dos_date):
+        zip64 = size >= ZIP64_LIMIT
+        extra = struct.pack('<HHQQ', 0x0001, 16, size, size) if zip64 else b''
+        stored_size = ZIP64_LIMIT if zip64 else size
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, UTF8_FLAG, 0, dos_time, dos_date,
+            crc, stored_size, stored_size, len(name), len(extra)
+        ) + name + extra
+
+    @staticmethod
+    def _central_header(name, size, crc, dos_time, dos_date, offset):
+        zip64 = size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+        extra = struct.pack('<HHQQQ', 0x0001, 24, size, size, offset) if zip64 else b''
+        version = 45 if zip64 else 20
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | version, version, UTF8_FLAG, 0, dos_time, dos_date,
+            crc, ZIP64_LIMIT if zip64 else size, ZIP64_LIMIT if zip64 else size, len(name), len(extra), 0, 0, 0,
+            UNIX_FILE, ZIP64_LIMIT if zip64 else offset
+        ) + name + extra
+
+    @staticmethod
+    def _end_records(count, directory_size, directory_offset):
+        zip64 = count >= MAX_ENTRIES or directory_size >= ZIP64_LIMIT or directory_offset >= ZIP64_LIMIT
+        records = b''
+        if zip64:
+            end_offset = directory_offset + directory_size
+            records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+                                   count, count, directory_size, directory_offset)
+            records += struct.pack('<IIQI', 0x07064b50, 0, end_offset, 1)
+        return records + struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, min(count, MAX_ENTRIES), min(count, MAX_ENTRIES),
+            min(directory_size, ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0
+        )
@@ -0,0 +1,195 @@
+import os
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, case, func, update
+from app import db
+from app.models.analytics import DocumentView
+from app.models.bundle import Bundle
+from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.models.link import ShareableLink
+from app.services.bundle_archive import BundleArchive
+from app.services.file_storage import FileStorageService
+
+class BundleService:
+    """Service for data room bundles: several documents shared under one link code
+
+    A bundle owns one ShareableLink per document (ShareableLink.bundle_id).
+    Those links are gated by the bundle's password, email and expiry
+    settings, and the sessions they carry count towards each document's
+    analytics like any other link's. The bundle download streams a ZIP of
+    the documents' current PDFs (BundleArchive).
+    """
+
+    @staticmethod
+    def create_bundle(user_id, name, document_ids, password=None, require_email=True, expires_at=None,
+                      max_views=None, allow_download=False, custom_message=None):
+        """
+        Create a bundle and a link for each of its documents, in the given order
+        Returns: Bundle (raises ValueError for an empty, oversized or foreign document list)
+        """
+        document_ids = list(dict.fromkeys(document_ids))
+        if not document_ids:
+            raise ValueError('Select at least one document.')
+        if len(document_ids) > current_app.config['BUNDLE_MAX_DOCUMENTS']:
+            raise ValueError(f"A bundle can hold at most {current_app.config['BUNDLE_MAX_DOCUMENTS']} documents.")
+
+        owned = {document_id for (document_id,) in db.session.query(Document.id).filter(
+            Document.id.in_(document_ids),
+            Document.user_id == user_id,
+            Document.is_deleted == False
+        )}
+        if len(owned) != len(document_ids):
+            raise ValueError('Some of the selected documents are not available.')
+
+        link_code = Bundle.generate_link_code()
+        while Bundle.query.filter_by(link_code=link_code).first():
+            link_code = Bundle.generate_link_code()
+
+        bundle = Bundle(
+            user_id=user_id,
+            link_code=link_code,
+            name=name,
+            require_email=require_email,
+            expires_at=expires_at,
+            max_views=max_views,
+            allow_download=allow_download,
+            custom_message=custom_message
+        )
+        bundle.set_password(password)
+        db.session.add(bundle)
+        db.session.flush()
+
+        # Item links carry no gate settings of their own; ids keep the bundle's order
+        for document_id in document_ids:
+            db.session.add(ShareableLink(
+                document_id=document_id,
+                bundle_id=bundle.id,
+                link_code=ShareableLink.generate_link_code(),
+                name=name,
+                require_email=False,
+                allow_download=allow_download
+            ))
+        db.session.commit()
+        return bundle
+
+    @staticmethod
+    def delete_bundle(bundle):
+        """Deactivate a bundle now and queue the purge of its links' view history"""
+        from app.services.purge import DocumentPurger
+
+        bundle.is_active = False
+        bundle.deleted_at = datetime.utcnow()
+        db.session.commit()
+        for link in bundle.items.filter(ShareableLink.deleted_at.is_(None)).all():
+            DocumentPurger.soft_delete_link(link)
+
+    @staticmethod
+    def validate_access(link_code):
+        """
+        Validate if a bundle can be accessed (before its password and email gates)
+        Returns: (is_valid, error_message, bundle)
+        """
+        bundle = Bundle.query.filter_by(link_code=link_code).first()
+
+        if not bundle or bundle.deleted_at:
+            return False, "Link not found", None
+
+        if not bundle.is_valid:
+            if not bundle.is_active:
+                return False, "This link has been deactivated", bundle
+            elif bundle.expires_at and bundle.expires_at < datetime.utcnow():
+                return False, "This link has expired", bundle
+            elif bundle.max_views and bundle.view_count >= bundle.max_views:
+                return False, "This link has reached its view limit", bundle
+
+        return True, None, bundle
+
+    @staticmethod
+    def items(bundle):
+        """
+        The bundle's documents that can still be opened, in bundle order
+        Returns: list of (ShareableLink, Document)
+        """
+        return db.session.query(ShareableLink, Document).join(
+            Document, Document.id == ShareableLink.document_id
+        ).filter(
+            ShareableLink.bundle_id == bundle.id,
+            ShareableLink.deleted_at.is_(None),
+            Document.is_deleted == False
+        ).order_by(ShareableLink.id).all()
+
+    @staticmethod
+    def increment_view_count(bundle_id):
+        """Count one opening of a bundle"""
+        db.session.execute(update(Bundle).where(Bundle.id == bundle_id).values(
+            view_count=Bundle.view_count + 1, last_viewed_at=datetime.utcnow()
+        ))
+        db.session.commit()
+
+    @staticmethod
+    def increment_download_count(bundle_id):
+        """Count one ZIP download of a bundle"""
+        db.session.execute(update(Bundle).where(Bundle.id == bundle_id).values(
+            download_count=Bundle.download_count + 1
+        ))
+        db.session.commit()
+
+    @staticmethod
+    def archive(bundle):
+        """
+        Lay out the ZIP of the bundle's current PDFs
+        CRCs missing from documents uploaded before bundles existed are computed once and stored.
+        Returns: BundleArchive
+        """
+        documents = [document for _, document in BundleService.items(bundle)]
+        names = BundleArchive.entry_names([document.title for document in documents])
+
+        entries = []
+        for name, document in zip(names, documents):
+            full_path = FileStorageService.get_full_path(document.pdf_path or document.file_path)
+            if document.pdf_crc32 is None:
+                BundleService._store_crc32(document, BundleArchive.file_crc32(full_path))
+            entries.append((name, full_path, os.path.getsize(full_path), document.pdf_crc32, document.updated_at))
+
+        db.session.commit()
+        return BundleArchive(entries)
+
+    @staticmethod
+    def _store_crc32(document, crc):
+        document.pdf_crc32 = crc
+        db.session.execute(update(DocumentVersion).where(
+            DocumentVersion.document_id == document.id,
+            DocumentVersion.pdf_path == document.pdf_path
+        ).values(pdf_crc32=crc))
+
+    @staticmethod
+    def get_stats(bundle):
+        """
+        Live session statistics per document of a bundle, in bundle order
+        Returns: list of dicts with link, document and stats
+        """
+        timed = and_(DocumentView.duration_seconds.isnot(None), DocumentView.duration_seconds > 0)
+        rows = db.session.query(
+            DocumentView.link_id,
+            func.count(DocumentView.id),
+            func.count(func.distinct(DocumentView.viewer_id)),
+            func.avg(case((timed, DocumentView.duration_seconds)))
+        ).join(
+            ShareableLink, ShareableLink.id == DocumentView.link_id
+        ).filter(
+            ShareableLink.bundle_id == bundle.id
+        ).group_by(DocumentView.link_id).all()
+        stats = {row[0]: row[1:] for row in rows}
+
+        result = []
+        for link, document in BundleService.items(bundle):
+            views, unique_viewers, avg_duration = stats.get(link.id, (0, 0, None))
+            result.append({
+                'link': link,
+                'document': document,
+                'total_views': views,
+                'unique_viewers': unique_viewers,
+                'avg_duration': int(avg_duration) if avg_duration else 0
+            })
+        return result
@@ -1,8 +1,9 @@
 import os
 import subprocess
 import platform
+import time
 from flask import current_app
-from PyPDF2 import PdfReader
+from app.services.metrics import registry
 
 class DocumentConverter:
     """Service for converting documents to PDF"""
@@ -13,6 +14,18 @@ class DocumentConverter:
         Convert DOCX/PPTX to PDF
         Returns: True if successful, False otherwise
         """
+        started = time.perf_counter()
+        success = DocumentConverter._convert_to_pdf(input_path, output_path)
+
+        file_ext = input_path.rsplit('.', 1)[1].lower() if '.' in input_path else ''
+        registry.observe('docone_document_conversion_seconds',
+                         (('file_type', file_ext), ('result', 'success' if success else 'failure')),
+                         time.perf_counter() - started)
+        return success
+
+    @staticmethod
+    def _convert_to_pdf(input_path, output_path):
+        """Pick a conversion backend for the current platform"""
         try:
             file_ext = input_path.rsplit('.', 1)[1].lower() if '.' in input_path else ''
 
@@ -84,6 +97,7 @@ class DocumentConverter:
     def get_pdf_page_count(pdf_path):
         """Get number of pages in PDF"""
         try:
+            from PyPDF2 import PdfReader
             reader = PdfReader(pdf_path)
             return len(reader.pages)
         except Exception as e:
@@ -0,0 +1,108 @@
+import os
+from datetime import datetime
+from sqlalchemy import func, select
+from app import db
+from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.models.link import ShareableLink
+from app.services.bundle_archive import BundleArchive
+from app.services.document_converter import DocumentConverter
+from app.services.file_storage import FileStorageService
+from app.services.search_index import SearchIndex
+
+# Fields a version shares with the Document row that mirrors it
+FILE_FIELDS = ('original_filename', 'file_type', 'file_path', 'pdf_path', 'file_size', 'page_count', 'pdf_crc32')
+
+class DocumentVersionService:
+    """Service for uploading documents and new versions of them
+
+    A document keeps its id, links and analytics across versions. Every
+    upload becomes a DocumentVersion, and the Document row mirrors the file
+    fields of the latest one, so links, the viewer, watermarking and search
+    always serve the newest file without any lookup. Sessions record the
+    version they opened (DocumentView.document_version). Text extraction for
+    a new version is incremental (SearchIndex.index_document).
+    """
+
+    @staticmethod
+    def store_upload(file, user_id):
+        """
+        Save an uploaded file, convert it to PDF if needed and count its pages
+        Returns: dict of file fields (raises ValueError if the conversion fails)
+        """
+        relative_path, file_size, original_filename = FileStorageService.save_uploaded_file(file, user_id)
+        file_type = FileStorageService.get_file_type(original_filename)
+
+        if file_type != 'pdf':
+            pdf_path = DocumentConverter.get_pdf_path_for_document(relative_path, file_type)
+            converted = DocumentConverter.convert_to_pdf(
+                FileStorageService.get_full_path(relative_path),
+                FileStorageService.get_full_path(pdf_path)
+            )
+            if not converted:
+                FileStorageService.delete_file(relative_path)
+                raise ValueError('Failed to convert document to PDF')
+        else:
+            # For PDF files, pdf_path is same as file_path
+            pdf_path = relative_path
+
+        full_pdf_path = FileStorageService.get_full_path(pdf_path)
+        return {
+            'original_filename': original_filename,
+            'file_type': file_type,
+            'file_path': relative_path,
+            'pdf_path': pdf_path,
+            'file_size': file_size,
+            'page_count': DocumentConverter.get_pdf_page_count(full_pdf_path),
+            'pdf_crc32': BundleArchive.file_crc32(full_pdf_path),
+        }
+
+    @staticmethod
+    def create_document(user_id, title, stored):
+        """
+        Create a document from a stored upload as its version 1 and queue text extraction
+        Returns: Document
+        """
+        document = Document(user_id=user_id, title=title or os.path.splitext(stored['original_filename'])[0],
+                            version=1, **stored)
+        db.session.add(document)
+        db.session.flush()
+        db.session.add(DocumentVersion(document_id=document.id, version=1, **stored))
+        db.session.commit()
+
+        SearchIndex.schedule(document.id)
+        return document
+
+    @staticmethod
+    def add_version(document, stored):
+        """
+        Make a stored upload the latest version of a document and queue incremental text extraction
+        Earlier versions' files are kept, for their analytics and until the document is purged.
+        Returns: DocumentVersion
+        """
+        # Lock the document row so concurrent uploads get distinct version numbers
+        number = db.session.execute(
+            select(Document.version).where(Document.id == document.id).with_for_update()
+        ).scalar() + 1
+
+        version = DocumentVersion(document_id=document.id, version=number, **stored)
+        db.session.add(version)
+        for field in FILE_FIELDS:
+            setattr(document, field, stored[field])
+        document.version = number
+        document.updated_at = datetime.utcnow()
+        document.text_indexed_at = None  # Picked up by `flask docone search index` if the task is lost
+        db.session.commit()
+
+        SearchIndex.schedule(document.id)
+        return version
+
+    @staticmethod
+    def link_version(link_id):
+        """
+        Current version of the document behind a link, as a subquery evaluated when a session row is inserted
+        Returns: scalar subquery
+        """
+        return func.coalesce(select(Document.version).join(
+            ShareableLink, ShareableLink.document_id == Document.id
+        ).where(ShareableLink.id == link_id).scalar_subquery(), 1)
@@ -0,0 +1,358 @@
+import csv
+import ipaddress
+import json
+import os
+import shutil
+import socket
+import threading
+from functools import lru_cache
+from flask import current_app
+from sqlalchemy import select, update
+from app import db
+from app.models.analytics import DocumentView
+
+UNKNOWN_COUNTRY = 'ZZ'  # Stored for sessions whose address is missing or not in the table
+MANIFEST = 'manifest.json'
+IPV4_IN_IPV6 = ipaddress.ip_network('::/96')  # Where MaxMind DBs keep the IPv4 tree
+IPV4_ALIASES = [ipaddress.ip_network('::ffff:0:0/96'), ipaddress.ip_network('2002::/16')]  # Pointers into it
+
+def ip_key(address):
+    """
+    Sort key of an address in the table
+    Returns: (4, 32-bit int) or (6, upper 64 bits), or None if it does not parse
+    """
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+    except (OSError, TypeError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, address.split('%', 1)[0])
+    except (OSError, TypeError, AttributeError):
+        return None
+    if packed[:12] == b'\0' * 10 + b'\xff\xff':  # IPv4-mapped
+        return 4, int.from_bytes(packed[12:], 'big')
+    return 6, int.from_bytes(packed[:8], 'big')
+
+class GeoIPTable:
+    """Address ranges mapped to (country, city), as memory-mapped NumPy arrays
+
+    Per IP version there are three parallel arrays sorted by range start:
+    starts, ends and a location index. IPv6 ranges are keyed on the upper
+    64 bits, the finest granularity GeoIP databases publish. Locations are a
+    fixed-width country array plus city names in one UTF-8 blob with
+    offsets. Everything is opened with mmap, so workers share the page cache
+    and resident memory grows only with the pages lookups touch.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        self._arrays = {}
+        for version in (4, 6):
+            self._arrays[version] = tuple(
+                np.load(os.path.join(path, f'v{version}_{name}.npy'), mmap_mode='r')
+                for name in ('starts', 'ends', 'locations')
+            )
+        self._countries = np.load(os.path.join(path, 'countries.npy'), mmap_mode='r')
+        self._city_offsets = np.load(os.path.join(path, 'city_offsets.npy'), mmap_mode='r')
+        self._cities = np.memmap(os.path.join(path, 'cities.bin'), dtype=np.uint8, mode='r') \
+            if os.path.getsize(os.path.join(path, 'cities.bin')) else b''
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    def __len__(self):
+        return sum(len(arrays[0]) for arrays in self._arrays.values())
+
+    def location(self, index):
+        """(country, city or None) for a location index"""
+        country = self._countries[index].decode('ascii') or UNKNOWN_COUNTRY
+        start, end = int(self._city_offsets[index]), int(self._city_offsets[index + 1])
+        city = bytes(self._cities[start:end]).decode('utf-8') if end > start else None
+        return country, city
+
+    def find(self, version, value):
+        """Location index for one key, or -1"""
+        import numpy as np
+
+        starts, ends, locations = self._arrays[version]
+        value = starts.dtype.type(value)  # A Python int would be compared as float64 against uint64
+        position = int(np.searchsorted(starts, value, side='right')) - 1
+        if position >= 0 and value <= ends[position]:
+            return int(locations[position])
+        return -1
+
+    def find_many(self, version, values):
+        """Location indexes for an array of keys (-1 where not found), in one vectorized search"""
+        import numpy as np
+
+        starts, ends, locations = self._arrays[version]
+        if not len(starts):
+            return np.full(len(values), -1, dtype=np.int64)
+        values = np.asarray(values, dtype=starts.dtype)
+        positions = np.searchsorted(starts, values, side='right') - 1
+        clipped = np.maximum(positions, 0)
+        found = (positions >= 0) & (values <= ends[clipped])
+        return np.where(found, locations[clipped].astype(np.int64), -1)
+
+    def lookup_many(self, addresses):
+        """
+        Geolocate a batch of addresses
+        Returns: list of (country, city) or None, in input order
+        """
+        import numpy as np
+
+        results = [None] * len(addresses)
+        keys = {4: ([], []), 6: ([], [])}
+        for position, address in enumerate(addresses):
+            key = ip_key(address) if address else None
+            if key:
+                keys[key[0]][0].append(position)
+                keys[key[0]][1].append(key[1])
+
+        for version, (positions, values) in keys.items():
+            if not positions:
+                continue
+            indexes = self.find_many(version, np.array(values, dtype=np.uint64))
+            for position, index in zip(positions, indexes.tolist()):
+                if index >= 0:
+                    results[position] = self.location(index)
+        return results
+
+    @staticmethod
+    def write(path, ranges, locations, source):
+        """
+        Write a table directory atomically (built next to path, then swapped in)
+        ranges: {4: [(start, end, location index)], 6: [...]}; locations: [(country, city)]
+        Returns: dict manifest
+        """
+        import numpy as np
+
+        staging = f'{path}.building'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        dtypes = {4: np.uint32, 6: np.uint64}
+        for version in (4, 6):
+            rows = sorted(ranges.get(version, []))
+            for column, name in enumerate(('starts', 'ends')):
+                np.save(os.path.join(staging, f'v{version}_{name}.npy'),
+                        np.array([row[column] for row in rows], dtype=dtypes[version]))
+            np.save(os.path.join(staging, f'v{version}_locations.npy'),
+                    np.array([row[2] for row in rows], dtype=np.uint32))
+
+        np.save(os.path.join(staging, 'countries.npy'),
+                np.array([(country or '').encode('ascii', 'ignore')[:2] for country, _ in locations], dtype='S2'))
+        blob = bytearray()
+        offsets = [0]
+        for _, city in locations:
+            blob += (city or '').encode('utf-8')
+            offsets.append(len(blob))
+        np.save(os.path.join(staging, 'city_offsets.npy'), np.array(offsets, dtype=np.uint32))
+        with open(os.path.join(staging, 'cities.bin'), 'wb') as f:
+            f.write(bytes(blob))
+
+        manifest = {
+            'source': source,
+            'ipv4_ranges': len(ranges.get(4, [])),
+            'ipv6_ranges': len(ranges.get(6, [])),
+            'locations': len(locations),
+        }
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        previous = f'{path}.previous'
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, previous)
+        os.rename(staging, path)
+        shutil.rmtree(previous, ignore_errors=True)
+        return manifest
+
+def _range_keys(network):
+    """(version, start key, end key) of a network"""
+    first, last = int(network.network_address), int(network.broadcast_address)
+    if network.version == 6:
+        return 6, first >> 64, last >> 64
+    return 4, first, last
+
+def _read_geolite_csv(blocks_paths, locations_path):
+    """GeoLite2/GeoIP2 CSV: Blocks-IPv4/IPv6 files plus a Locations file keyed by geoname_id"""
+    locations = []
+    location_ids = {}
+    with open(locations_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            location_ids[row['geoname_id']] = len(locations)
+            locations.append((row.get('country_iso_code') or '', row.get('city_name') or None))
+
+    ranges = {4: [], 6: []}
+    for path in blocks_paths:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                geoname_id = row.get('geoname_id') or row.get('registered_country_geoname_id')
+                index = location_ids.get(geoname_id)
+                if index is None:
+                    continue
+                version, start, end = _range_keys(ipaddress.ip_network(row['network'], strict=False))
+                ranges[version].append((start, end, index))
+    return ranges, locations
+
+def _read_range_csv(path):
+    """Plain range CSV (DB-IP and IP2Location style): start_ip,end_ip,country[,city]; header optional"""
+    locations = []
+    location_ids = {}
+    ranges = {4: [], 6: []}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            start, end = ip_key(row[0].strip()), ip_key(row[1].strip())
+            if not start or not end or start[0] != end[0]:
+                continue  # Header or malformed line
+            location = (row[2].strip().upper()[:2], (row[3].strip() or None) if len(row) > 3 else None)
+            index = location_ids.setdefault(location, len(locations))
+            if index == len(locations):
+                locations.append(location)
+            ranges[start[0]].append((start[1], end[1], index))
+    return ranges, locations
+
+def _read_mmdb(path):
+    """MaxMind DB file (needs the optional maxminddb package)"""
+    import maxminddb
+
+    locations = []
+    location_ids = {}
+    ranges = {4: [], 6: []}
+    with maxminddb.open_database(path) as reader:
+        for network, record in reader:
+            country = ((record or {}).get('country') or {}).get('iso_code') or ''
+            city = (((record or {}).get('city') or {}).get('names') or {}).get('en')
+            location = (country, city)
+            index = location_ids.setdefault(location, len(locations))
+            if index == len(locations):
+                locations.append(location)
+            if network.version == 6:
+                if any(network.subnet_of(alias) for alias in IPV4_ALIASES):
+                    continue
+                if network.subnet_of(IPV4_IN_IPV6):
+                    network = ipaddress.ip_network((int(network.network_address), network.prefixlen - 96))
+            version, start, end = _range_keys(network)
+            ranges[version].append((start, end, index))
+    return ranges, locations
+
+class GeoIP:
+    """Service for offline geolocation of view sessions
+
+    `flask docone geoip build` compiles a GeoIP database (MaxMind .mmdb,
+    GeoLite2 CSV or a plain range CSV) into a GeoIPTable under GEOIP_DIR.
+    Sessions are not geolocated when they start; `flask docone geoip enrich`
+    fills in country and city for new sessions in batches, reading them
+    through a partial index on country IS NULL.
+    """
+
+    _table = None
+    _table_key = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def build(sources, locations_path=None, path=None):
+        """
+        Compile a GeoIP database into the table directory
+        sources: one .mmdb, one range CSV, or GeoLite2 block CSVs with locations_path
+        Returns: dict manifest
+        """
+        path = path or current_app.config['GEOIP_DIR']
+        if locations_path:
+            ranges, locations = _read_geolite_csv(sources, locations_path)
+        elif len(sources) == 1 and sources[0].endswith('.mmdb'):
+            ranges, locations = _read_mmdb(sources[0])
+        elif len(sources) == 1:
+            ranges, locations = _read_range_csv(sources[0])
+        else:
+            raise ValueError('GeoLite2 block files need the matching locations CSV')
+
+        manifest = GeoIPTable.write(path, ranges, locations, [os.path.basename(source) for source in sources])
+        GeoIP._table_key = None
+        return manifest
+
+    @staticmethod
+    def table():
+        """
+        The compiled table, reopened after a rebuild
+        Returns: GeoIPTable, or None if none has been built
+        """
+        path = current_app.config['GEOIP_DIR']
+        try:
+            key = (path, os.stat(os.path.join(path, MANIFEST)).st_mtime_ns)
+        except OSError:
+            return None
+        if key != GeoIP._table_key:
+            with GeoIP._lock:
+                if key != GeoIP._table_key:
+                    GeoIP._table = GeoIPTable(path)
+                    GeoIP._table_key = key
+                    _cached_lookup.cache_clear()
+        return GeoIP._table
+
+    @staticmethod
+    def lookup(address):
+        """
+        Geolocate one address; results for recent addresses are cached
+        Returns: (country, city) or None
+        """
+        table = GeoIP.table()
+        if table is None or not address:
+            return None
+        return _cached_lookup(table, address)
+
+    @staticmethod
+    def enrich_pending(batch_size=None, limit=None):
+        """
+        Fill in country and city for sessions that have none yet, one batch per transaction
+        Addresses repeat within a batch (the same viewer, office NAT), so each is looked up once.
+        Sessions that cannot be placed get UNKNOWN_COUNTRY so they are not read again.
+        Returns: dict with sessions enriched and unknown (None when no table is built)
+        """
+        table = GeoIP.table()
+        if table is None:
+            return None
+
+        batch_size = batch_size or current_app.config['GEOIP_ENRICH_BATCH_SIZE']
+        counters = {'enriched': 0, 'unknown': 0}
+        while limit is None or counters['enriched'] + counters['unknown'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - counters['enriched'] - counters['unknown'])
+            rows = db.session.execute(
+                select(DocumentView.id, DocumentView.viewer_ip).where(
+                    DocumentView.country.is_(None)
+                ).order_by(DocumentView.id).limit(size)
+            ).all()
+            if not rows:
+                break
+
+            addresses = sorted({ip for _, ip in rows if ip})
+            located = dict(zip(addresses, table.lookup_many(addresses)))
+
+            by_location = {}
+            for view_id, ip in rows:
+                location = located.get(ip) or (UNKNOWN_COUNTRY, None)
+                by_location.setdefault(location, []).append(view_id)
+
+            for (country, city), view_ids in by_location.items():
+                db.session.execute(
+                    update(DocumentView).where(DocumentView.id.in_(view_ids)).values(country=country, city=city),
+                    execution_options={'synchronize_session': False}
+                )
+                counters['unknown' if country == UNKNOWN_COUNTRY else 'enriched'] += len(view_ids)
+            db.session.commit()
+
+            if len(rows) < size:
+                break
+        return counters
+
+@lru_cache(maxsize=65536)
+def _cached_lookup(table, address):
+    key = ip_key(address)
+    if key is None:
+        return None
+    index = table.find(*key)
+    return table.location(index) if index >= 0 else None
@@ -7,7 +7,7 @@ class LinkGeneratorService:
 
     @staticmethod
     def create_link(document_id, name=None, password=None, require_email=True,
-                   expires_at=None, max_views=None, allow_download=False, custom_message=None):
+                   expires_at=None, max_views=None, allow_download=False, custom_message=None, watermark=False):
         """
         Create a new shareable link for a document
         Returns: ShareableLink object
@@ -28,7 +28,8 @@ class LinkGeneratorService:
             expires_at=expires_at,
             max_views=max_views,
             allow_download=allow_download,
-            custom_message=custom_message
+            custom_message=custom_message,
+            watermark=watermark
         )
 
         # Set password if provided
@@ -87,7 +88,7 @@ class LinkGeneratorService:
 
         # Update allowed fields
         allowed_fields = ['name', 'require_email', 'is_active', 'expires_at',
-                         'max_views', 'allow_download', 'custom_message']
+                         'max_views', 'allow_download', 'custom_message', 'watermark']
 
         for field in allowed_fields:
             if field in kwargs:
@@ -105,11 +106,12 @@ class LinkGeneratorService:
 
     @staticmethod
     def delete_link(link_id):
-        """Delete a link"""
+        """Delete a link (hidden now, its view history is purged in the background)"""
+        from app.services.purge import DocumentPurger
+
         link = ShareableLink.query.get(link_id)
-        if link:
-            db.session.delete(link)
-            db.session.commit()
+        if link and link.deleted_at is None:
+            DocumentPurger.soft_delete_link(link)
             return True
         return False
 
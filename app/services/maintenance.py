@@ -0,0 +1,344 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from flask import Flask, current_app
+from sqlalchemy import update
+from app import db
+from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.services.document_converter import DocumentConverter
+from app.services.file_storage import FileStorageService
+
+JOBS = {}
+
+def register_job(cls):
+    """Class decorator that makes a job available to `flask docone maintenance run`"""
+    JOBS[cls.name] = cls
+    return cls
+
+class MaintenanceJob:
+    """Base class for resumable batch jobs
+
+    The parent process reads items in keyset order with batches(), worker
+    processes run process() on each payload (with an app context but no
+    database access), and the parent writes results back in bulk with
+    apply(). Keys must increase strictly so a checkpoint can resume after
+    the last applied key.
+    """
+
+    name = None
+    description = ''
+    dry_run = False  # Set by the runner before start()
+    report_file = None  # Explicit report destination for jobs that write one
+
+    def start(self, resumed):
+        """Called once before the first batch"""
+
+    def batches(self, after_key, batch_size):
+        """
+        Read the next batch of items after after_key (None on a fresh run)
+        Returns: list of (key, payload) in key order
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def process(payload):
+        """Do the per-item work in a worker process"""
+        raise NotImplementedError
+
+    def apply(self, results, dry_run):
+        """
+        Persist one batch of results in the parent process
+        Returns: dict of counters to add to the job totals
+        """
+        return {}
+
+    def finish(self, counters):
+        """Called after the last batch has been applied"""
+
+@register_job
+class PageCountJob(MaintenanceJob):
+    name = 'page-count'
+    description = 'Recompute Document.page_count from the stored PDF.'
+
+    def batches(self, after_key, batch_size):
+        rows = db.session.query(Document.id, Document.file_path, Document.pdf_path, Document.page_count).filter(
+            Document.id > (after_key or 0),
+            Document.is_deleted == False
+        ).order_by(Document.id).limit(batch_size).all()
+
+        return [
+            (row.id, (row.id, FileStorageService.get_full_path(row.pdf_path or row.file_path), row.page_count))
+            for row in rows
+        ]
+
+    @staticmethod
+    def process(payload):
+        document_id, pdf_path, current = payload
+        return document_id, current, DocumentConverter.get_pdf_page_count(pdf_path)
+
+    def apply(self, results, dry_run):
+        changes = [
+            {'id': document_id, 'page_count': page_count}
+            for document_id, current, page_count in results
+            if page_count is not None and page_count != current
+        ]
+        if changes and not dry_run:
+            db.session.execute(update(Document), changes)
+            db.session.commit()
+
+        return {
+            'checked': len(results),
+            'updated': len(changes),
+            'unreadable': sum(1 for _, _, page_count in results if page_count is None),
+        }
+
+@register_job
+class OrphanFilesJob(MaintenanceJob):
+    name = 'orphan-files'
+    description = 'List files in per-user upload folders that no Document references (report only).'
+
+    def start(self, resumed):
+        # A dry run only writes a report to an explicit --report path
+        self.report_path = self.report_file
+        if not self.report_path and not self.dry_run:
+            self.report_path = os.path.join(current_app.config['MAINTENANCE_DIR'], 'orphan-files.tsv')
+        if self.report_path and (not resumed or not os.path.exists(self.report_path)):
+            with open(self.report_path, 'w') as f:
+                f.write('path\tsize\tmodified_at\n')
+
+    def batches(self, after_key, batch_size):
+        root = FileStorageService.get_full_path('')
+        if not os.path.isdir(root):
+            return []
+
+        user_ids = sorted(
+            int(name) for name in os.listdir(root)
+            if name.isdigit() and os.path.isdir(os.path.join(root, name))
+        )
+        user_ids = [user_id for user_id in user_ids if after_key is None or user_id > after_key][:batch_size]
+        if not user_ids:
+            return []
+
+        referenced = {user_id: set() for user_id in user_ids}
+        rows = db.session.query(Document.user_id, Document.file_path, Document.pdf_path).filter(
+            Document.user_id.in_(user_ids)
+        ).all()
+        # Earlier versions' files stay until the document is purged
+        rows += db.session.query(Document.user_id, DocumentVersion.file_path, DocumentVersion.pdf_path).join(
+            DocumentVersion, DocumentVersion.document_id == Document.id
+        ).filter(
+            Document.user_id.in_(user_ids)
+        ).all()
+        for user_id, file_path, pdf_path in rows:
+            referenced[user_id].add(file_path)
+            if pdf_path:
+                referenced[user_id].add(pdf_path)
+
+        return [(user_id, (root, str(user_id), referenced[user_id])) for user_id in user_ids]
+
+    @staticmethod
+    def process(payload):
+        root, user_folder, referenced = payload
+        orphans = []
+        for dirpath, _, filenames in os.walk(os.path.join(root, user_folder)):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                relative_path = os.path.relpath(full_path, root)
+                if relative_path in referenced:
+                    continue
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                orphans.append((relative_path, stat.st_size, stat.st_mtime))
+        return orphans
+
+    def apply(self, results, dry_run):
+        orphans = [orphan for user_orphans in results for orphan in user_orphans]
+        if orphans and self.report_path:
+            with open(self.report_path, 'a') as f:
+                for relative_path, size, mtime in orphans:
+                    f.write(f'{relative_path}\t{size}\t{datetime.utcfromtimestamp(mtime).isoformat()}\n')
+
+        return {
+            'user_folders': len(results),
+            'orphans': len(orphans),
+            'orphan_bytes': sum(size for _, size, _ in orphans),
+        }
+
+    def finish(self, counters):
+        if self.report_path:
+            current_app.logger.info(f"Orphan file report written to {self.report_path}")
+
+def _worker_config(config):
+    """Plain config values that can be sent to spawned worker processes"""
+    plain = (str, int, float, bool, type(None), list, tuple, dict, set, frozenset, timedelta)
+    return {key: value for key, value in config.items() if key.isupper() and isinstance(value, plain)}
+
+def _init_worker(config):
+    """Give each worker process an app context with the parent's configuration"""
+    app = Flask('app')
+    app.config.update(config)
+    app.app_context().push()
+
+def _process_batch(process, payloads):
+    return [process(payload) for payload in payloads]
+
+class MaintenanceRunner:
+    """Runs a MaintenanceJob with a worker pool, checkpoints and throttling"""
+
+    @staticmethod
+    def checkpoint_path(job_name):
+        return os.path.join(current_app.config['MAINTENANCE_DIR'], f'{job_name}.checkpoint.json')
+
+    @staticmethod
+    def load_checkpoint(job_name):
+        """
+        Read a job's checkpoint
+        Returns: dict or None
+        """
+        path = MaintenanceRunner.checkpoint_path(job_name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _save_checkpoint(job_name, state):
+        path = MaintenanceRunner.checkpoint_path(job_name)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _wait_for_replica():
+        """Hold off while the read replica (if any) lags behind, so bulk writes don't widen the gap"""
+        from app.services.replica_router import ReplicaRouter, REPLICA_BIND
+
+        replica = db.engines.get(REPLICA_BIND)
+        if replica is None:
+            return
+        while ReplicaRouter.replica_lag(replica) > current_app.config['REPLICA_MAX_LAG_SECONDS']:
+            time.sleep(current_app.config['REPLICA_LAG_CHECK_INTERVAL'])
+
+    @staticmethod
+    def run(job_name, workers=None, batch_size=None, max_in_flight=None, sleep=None, max_rate=None,
+            limit=None, restart=False, dry_run=False, report=None, report_file=None):
+        """
+        Run a registered job to completion (or until limit items), resuming from its checkpoint
+        Returns: final state dict with processed, counters, elapsed and rate
+        """
+        config = current_app.config
+        job = JOBS[job_name]()
+        job.dry_run = dry_run
+        job.report_file = report_file
+        workers = config['MAINTENANCE_WORKERS'] if workers is None else workers
+        batch_size = batch_size or config['MAINTENANCE_BATCH_SIZE']
+        max_in_flight = max_in_flight or max(2, 2 * workers)
+        sleep = config['MAINTENANCE_BATCH_SLEEP'] if sleep is None else sleep
+
+        os.makedirs(config['MAINTENANCE_DIR'], exist_ok=True)
+        state = None if restart else MaintenanceRunner.load_checkpoint(job_name)
+        if state and state.get('completed'):
+            state = None
+        resumed = state is not None
+        if state is None:
+            state = {'job': job_name, 'last_key': None, 'processed': 0, 'counters': {},
+                     'started_at': datetime.utcnow().isoformat(), 'completed': False}
+
+        job.start(resumed)
+
+        executor = None
+        if workers > 0:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_worker, initargs=(_worker_config(config),))
+
+        pending = {}  # future -> (sequence, last key of the batch)
+        finished = {}  # sequence -> (last key, results), waiting for earlier batches
+        next_sequence = 0
+        next_apply = 0
+        after_key = state['last_key']
+        read = 0
+        exhausted = False
+        started = time.monotonic()
+        processed = 0
+
+        try:
+            while True:
+                # Bounded queue: never hold more than max_in_flight batches in memory
+                while not exhausted and len(pending) + len(finished) < max_in_flight:
+                    size = batch_size if not limit else min(batch_size, limit - read)
+                    if size <= 0:
+                        exhausted = True
+                        break
+
+                    MaintenanceRunner._wait_for_replica()
+                    items = job.batches(after_key, size)
+                    db.session.commit()  # End the read transaction between batches
+                    if not items:
+                        exhausted = True
+                        break
+
+                    after_key = items[-1][0]
+                    read += len(items)
+                    payloads = [payload for _, payload in items]
+                    if executor:
+                        future = executor.submit(_process_batch, job.process, payloads)
+                    else:
+                        future = Future()
+                        future.set_result(_process_batch(job.process, payloads))
+                    pending[future] = (next_sequence, after_key)
+                    next_sequence += 1
+
+                    if sleep:
+                        time.sleep(sleep)
+                    if max_rate:
+                        ahead = read / max_rate - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+                if not pending and not finished:
+                    break
+
+                if pending:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        sequence, last_key = pending.pop(future)
+                        finished[sequence] = (last_key, future.result())
+
+                # Apply in key order so the checkpoint never skips an unapplied batch
+                while next_apply in finished:
+                    last_key, results = finished.pop(next_apply)
+                    next_apply += 1
+                    for name, value in job.apply(results, dry_run).items():
+                        state['counters'][name] = state['counters'].get(name, 0) + value
+
+                    processed += len(results)
+                    state['processed'] += len(results)
+                    state['last_key'] = last_key
+                    state['updated_at'] = datetime.utcnow().isoformat()
+                    if not dry_run:
+                        MaintenanceRunner._save_checkpoint(job_name, state)
+                    if report:
+                        report(MaintenanceRunner._progress(state, processed, started))
+
+            state['completed'] = not limit or read < limit
+            job.finish(state['counters'])
+            if not dry_run:
+                MaintenanceRunner._save_checkpoint(job_name, state)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        return MaintenanceRunner._progress(state, processed, started)
+
+    @staticmethod
+    def _progress(state, processed, started):
+        elapsed = time.monotonic() - started
+        return dict(state, elapsed=round(elapsed, 2), run_processed=processed,
+                    rate=round(processed / elapsed, 1) if elapsed else 0.0)
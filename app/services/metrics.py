@@ -0,0 +1,413 @@
+import atexit
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'docone_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.', None),
+    'docone_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.', DEFAULT_BUCKETS),
+    'docone_db_queries_per_request': ('histogram', 'SQL statements executed per request.', COUNT_BUCKETS),
+    'docone_db_time_seconds': ('histogram', 'Time spent in SQL statements per request.', DEFAULT_BUCKETS),
+    'docone_document_conversion_seconds': ('histogram', 'DocumentConverter.convert_to_pdf duration.', DEFAULT_BUCKETS),
+    'docone_file_serve_seconds': ('histogram', 'Time to open and prepare a file response.', DEFAULT_BUCKETS),
+    'docone_watermark_seconds': ('histogram', 'Time to stamp a PDF for a new viewer (cache misses).', DEFAULT_BUCKETS),
+    'docone_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit/miss).', None),
+    'docone_bot_hits_total': ('counter', 'Viewer requests from automated clients, by how they were detected.', None),
+    'docone_view_confirmations_total': ('counter', 'Viewer pages awaiting script confirmation, and confirmations.', None),
+    'docone_bundle_downloads_total': ('counter', 'Bundle ZIP responses, whole archives and byte ranges.', None),
+    'docone_cache_hit_ratio': ('gauge', 'Cache hit ratio since process start.', None),
+    'docone_db_pool_checked_out': ('gauge', 'Database connections currently checked out of the pool.', None),
+    'docone_queue_depth': ('gauge', 'Items waiting in background queues.', None),
+}
+
+class MetricsRegistry:
+    """In-process metric storage with one shard per thread
+
+    Each thread only ever writes to its own shard, so the hot path takes no
+    lock; a scrape copies and sums the shards. Gauges are plain assignments
+    or callbacks evaluated at scrape time.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (thread, shard) pairs
+        self._retired = {}  # Merged shards of threads that have exited
+        self._shards_lock = threading.Lock()  # Only taken when a thread first records a metric
+        self._gauges = {}
+        self._gauge_callbacks = []
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) > 64:
+                    self._retire_dead_shards()
+        return shard
+
+    def _retire_dead_shards(self):
+        """Fold shards of finished threads into one (caller holds _shards_lock)"""
+        live = []
+        retired = self._retired
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge_into(retired, shard)
+        self._shards = live
+
+    def inc(self, name, labels=(), value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        shard = self._shard()
+        key = (name, labels)
+        series = shard.get(key)
+        if series is None:
+            # One counter per bucket plus +Inf, then sum
+            series = shard[key] = [0] * (len(buckets) + 2)
+        series[bisect.bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+    def set_gauge(self, name, labels, value):
+        self._gauges[(name, labels)] = value
+
+    def register_gauge_callback(self, callback):
+        """Register fn() -> iterable of (name, labels, value) evaluated on scrape"""
+        self._gauge_callbacks.append(callback)
+
+    def snapshot(self):
+        """
+        Merge all thread shards into plain data
+        Returns: dict with 'series' and 'gauges' lists
+        """
+        with self._shards_lock:
+            self._retire_dead_shards()
+            shards = [shard.copy() for _, shard in self._shards]
+            shards.append(self._retired.copy())
+
+        merged = {}
+        for shard in shards:
+            _merge_into(merged, shard)
+
+        gauges = dict(self._gauges)
+        for callback in self._gauge_callbacks:
+            try:
+                for name, labels, value in callback():
+                    gauges[(name, labels)] = value
+            except Exception:
+                continue
+
+        return {
+            'series': [[name, list(labels), value] for (name, labels), value in merged.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+        }
+
+def _merge_into(target, source):
+    """Add counter values and histogram lists from source into target"""
+    for key, value in source.items():
+        if isinstance(value, list):
+            current = target.setdefault(key, [0] * len(value))
+            for i, item in enumerate(value):
+                current[i] += item
+        else:
+            target[key] = target.get(key, 0) + value
+
+registry = MetricsRegistry()
+_request_local = threading.local()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _request_local.query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_request_local, 'active', False):
+        _request_local.queries += 1
+        _request_local.db_seconds += time.perf_counter() - _request_local.query_started
+
+def _pool_gauges():
+    from app import db
+    for bind, engine in db.engines.items():
+        checked_out = getattr(engine.pool, 'checkedout', None)
+        if checked_out:
+            yield 'docone_db_pool_checked_out', (('bind', bind or 'default'),), checked_out()
+
+def _pid_alive(pid):
+    """Whether a process with this PID still runs on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists, owned by another user
+    return True
+
+RETIRED_FILE = 'metrics-retired.json'  # Counters and buckets of workers that have exited
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _retire_snapshot(path):
+    """
+    Add a stopped worker's counters and histogram buckets to RETIRED_FILE, then
+    delete its snapshot, so the merged totals never go down. Its gauges are dropped.
+    The lock makes sure a snapshot is folded in once even if several workers scrape.
+    """
+    metrics_dir = os.path.dirname(path)
+    with open(os.path.join(metrics_dir, 'metrics-retired.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return  # Already retired by another worker
+        except (OSError, ValueError):
+            snapshot = {'series': []}  # Torn or unreadable: nothing to keep
+
+        retired_path = os.path.join(metrics_dir, RETIRED_FILE)
+        retired = {}
+        try:
+            with open(retired_path) as f:
+                for name, labels, value in json.load(f)['series']:
+                    retired[(name, tuple(tuple(pair) for pair in labels))] = value
+        except FileNotFoundError:
+            pass
+        _merge_into(retired, {(name, tuple(tuple(pair) for pair in labels)): value
+                              for name, labels, value in snapshot['series']})
+        _write_json(retired_path, {
+            'series': [[name, [list(pair) for pair in labels], value] for (name, labels), value in retired.items()],
+            'gauges': [],
+        })
+
+        for stale in (path, f'{path}.tmp'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+def _retire_own_snapshot(path, pid):
+    """atexit: write this worker's final counts and retire them"""
+    if os.getpid() != pid:
+        return
+    try:
+        _write_json(path, registry.snapshot())
+        _retire_snapshot(path)
+    except OSError:
+        pass
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + escaped + '}'
+
+class Metrics:
+    """Service for recording and exposing Prometheus metrics"""
+
+    _last_flush = 0.0
+    _snapshot_path = None  # This worker's file in METRICS_DIR, retired at exit
+
+    @staticmethod
+    def init_app(app):
+        """Install request timing middleware and SQL query counters"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        # Engine-wide hooks cover the primary and replica binds
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            registry.register_gauge_callback(_pool_gauges)
+
+        @app.before_request
+        def _start_request_timer():
+            g.metrics_started = time.perf_counter()
+            _request_local.active = True
+            _request_local.queries = 0
+            _request_local.db_seconds = 0.0
+
+        @app.after_request
+        def _record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is None:
+                return response
+
+            endpoint = request.endpoint or 'unmatched'
+            labels = (('endpoint', endpoint),)
+            registry.inc('docone_http_requests_total',
+                         (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+            registry.observe('docone_http_request_duration_seconds', labels, time.perf_counter() - started)
+            registry.observe('docone_db_queries_per_request', labels, _request_local.queries)
+            registry.observe('docone_db_time_seconds', labels, _request_local.db_seconds)
+            _request_local.active = False
+
+            Metrics.maybe_flush()
+            return response
+
+    @staticmethod
+    @contextmanager
+    def timer(name, labels=()):
+        """Observe the duration of a block into a histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            registry.observe(name, tuple(labels), time.perf_counter() - started)
+
+    @staticmethod
+    def cache_lookup(cache, hit):
+        registry.inc('docone_cache_requests_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+    @staticmethod
+    def bot_hit(reason):
+        registry.inc('docone_bot_hits_total', (('reason', reason),))
+
+    @staticmethod
+    def view_confirmation(stage):
+        registry.inc('docone_view_confirmations_total', (('stage', stage),))
+
+    @staticmethod
+    def bundle_download(kind):
+        registry.inc('docone_bundle_downloads_total', (('kind', kind),))
+
+    @staticmethod
+    def maybe_flush():
+        """Write this worker's snapshot to METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds"""
+        metrics_dir = current_app.config.get('METRICS_DIR')
+        if not metrics_dir:
+            return
+
+        now = time.monotonic()
+        if now - Metrics._last_flush < current_app.config['METRICS_FLUSH_INTERVAL']:
+            return
+        Metrics._last_flush = now
+
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            path = os.path.join(metrics_dir, f'metrics-{os.getpid()}.json')
+            if Metrics._snapshot_path != path:
+                # Registered again after a fork; each handler only removes its own process's file
+                Metrics._snapshot_path = path
+                atexit.register(_retire_own_snapshot, path, os.getpid())
+            _write_json(path, registry.snapshot())
+        except OSError as e:
+            current_app.logger.warning(f"Metrics flush failed: {str(e)}")
+
+    @staticmethod
+    def collect():
+        """
+        Merge this process with snapshots written by other workers and the
+        retired counters of workers that have exited
+        Returns: (series dict, gauges dict)
+        """
+        snapshots = [registry.snapshot()]
+        metrics_dir = current_app.config.get('METRICS_DIR')
+        fresh_after = time.time() - 3 * current_app.config['METRICS_FLUSH_INTERVAL']
+        own_file = f'metrics-{os.getpid()}.json'
+
+        if metrics_dir and os.path.isdir(metrics_dir):
+            for filename in os.listdir(metrics_dir):
+                pid = filename[len('metrics-'):-len('.json')]
+                if filename.endswith('.json') and pid.isdigit() and not _pid_alive(int(pid)):
+                    # A worker that exited without cleaning up (killed, crashed)
+                    try:
+                        _retire_snapshot(os.path.join(metrics_dir, filename))
+                    except OSError:
+                        continue
+
+            # Live workers' snapshots plus RETIRED_FILE
+            for filename in os.listdir(metrics_dir):
+                if not filename.endswith('.json') or filename == own_file:
+                    continue
+                path = os.path.join(metrics_dir, filename)
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                    # Gauges from workers that stopped flushing are no longer current
+                    if os.path.getmtime(path) < fresh_after:
+                        snapshot['gauges'] = []
+                    snapshots.append(snapshot)
+                except (OSError, ValueError):
+                    continue
+
+        series = {}
+        gauges = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['series']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if isinstance(value, list):
+                    current = series.setdefault(key, [0] * len(value))
+                    for i, item in enumerate(value):
+                        current[i] += item
+                else:
+                    series[key] = series.get(key, 0) + value
+            for name, labels, value in snapshot['gauges']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                gauges[key] = gauges.get(key, 0) + value
+
+        # Derived hit ratios per cache
+        lookups = {}
+        for (name, labels), value in series.items():
+            if name == 'docone_cache_requests_total':
+                label_map = dict(labels)
+                hits, total = lookups.get(label_map['cache'], (0, 0))
+                hit = value if label_map['result'] == 'hit' else 0
+                lookups[label_map['cache']] = (hits + hit, total + value)
+        for cache, (hits, total) in lookups.items():
+            if total:
+                gauges[('docone_cache_hit_ratio', (('cache', cache),))] = hits / total
+
+        return series, gauges
+
+    @staticmethod
+    def render():
+        """Render all metrics in the Prometheus text exposition format"""
+        series, gauges = Metrics.collect()
+
+        by_name = {}
+        for (name, labels), value in list(series.items()) + list(gauges.items()):
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            samples = by_name.get(name)
+            if not samples:
+                continue
+
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in sorted(samples):
+                if metric_type == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ['+Inf'], value[:-1]):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {value[-1]}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,140 @@
+import numpy as np
+from app import db
+from app.models.analytics import DocumentView
+from app.models.link import ShareableLink
+from app.services.replica_router import read_only
+
+CHUNK_ROWS = 65536  # Sessions unpacked into the page matrix at a time
+
+class PageCoverage:
+    """Vectorized page reach and completion analytics over session page bitmaps
+
+    Each session's DocumentView.pages_bitmap is padded or cut to the
+    document's page count and unpacked into a sessions x pages matrix of
+    bits, a chunk of rows at a time, and every statistic is accumulated
+    from that matrix in a single pass. Page numbers only mean the same page
+    within one version, so a document is analyzed one version at a time.
+    """
+
+    @staticmethod
+    def empty(page_count):
+        """Accumulator for analyze()"""
+        return {
+            'sessions': 0,
+            'page_views': np.zeros(page_count, dtype=np.int64),  # Sessions that viewed each page
+            'furthest': np.zeros(page_count + 1, dtype=np.int64),  # Sessions by furthest page viewed (0: none)
+            'complete': 0,  # Sessions that viewed every page
+            'pages_total': 0,  # Distinct pages viewed, summed over sessions
+        }
+
+    @staticmethod
+    def matrix(bitmaps, page_count):
+        """
+        Unpack page bitmaps into a bit matrix (pages past page_count are dropped)
+        Returns: uint8 array of shape (sessions, page_count)
+        """
+        width = (page_count + 7) // 8
+        blank = bytes(width)
+        packed = b''.join(bitmap[:width].ljust(width, b'\x00') if bitmap else blank for bitmap in bitmaps)
+        rows = np.frombuffer(packed, dtype=np.uint8).reshape(-1, width)
+        return np.unpackbits(rows, axis=1, count=page_count, bitorder='little')
+
+    @staticmethod
+    def analyze(chunks, page_count, totals=None):
+        """
+        Accumulate coverage statistics over chunks of session page bitmaps
+        Returns: accumulator dict (see empty())
+        """
+        totals = totals or PageCoverage.empty(page_count)
+
+        for bitmaps in chunks:
+            if not bitmaps:
+                continue
+            bits = PageCoverage.matrix(bitmaps, page_count)
+            pages = bits.sum(axis=1, dtype=np.int64)
+
+            # Furthest page: position of the last set bit, found from the reversed rows
+            furthest = np.where(pages > 0, page_count - np.argmax(bits[:, ::-1], axis=1), 0)
+
+            totals['sessions'] += len(bits)
+            totals['page_views'] += bits.sum(axis=0, dtype=np.int64)
+            totals['furthest'] += np.bincount(furthest, minlength=page_count + 1)
+            totals['complete'] += int((pages == page_count).sum())
+            totals['pages_total'] += int(pages.sum())
+
+        return totals
+
+    @staticmethod
+    def summarize(totals, page_count):
+        """
+        Turn accumulated counts into reach curves, a drop-off funnel and completion rates
+        Returns: dict with sessions, rates and a per-page list
+        """
+        sessions = totals['sessions']
+        denominator = max(sessions, 1)
+
+        # Sessions that got to page p or beyond, whether or not they viewed every page on the way
+        reached = np.cumsum(totals['furthest'][::-1])[::-1][1:]
+
+        pages = [{
+            'page': page,
+            'viewed': int(viewed),
+            'reached': int(reach),
+            'dropped': int(dropped),  # Sessions whose furthest page was this one
+            'viewed_rate': viewed / denominator,
+            'reached_rate': reach / denominator,
+        } for page, viewed, reach, dropped in zip(
+            range(1, page_count + 1), totals['page_views'].tolist(), reached.tolist(),
+            totals['furthest'][1:].tolist()
+        )]
+
+        return {
+            'sessions': sessions,
+            'page_count': page_count,
+            'completion_rate': totals['complete'] / denominator,
+            'reached_end_rate': int(reached[-1]) / denominator if page_count else 0,
+            'avg_coverage': totals['pages_total'] / (denominator * page_count) if page_count else 0,
+            'pages': pages,
+        }
+
+    @staticmethod
+    def bitmap_chunks(statement, chunk_rows=CHUNK_ROWS):
+        """Stream the single bitmap column of a query in chunks of rows"""
+        # A Core execution skips ORM row loading, which costs more than the analysis itself
+        result = db.session.connection().execute(statement.execution_options(yield_per=chunk_rows))
+        for partition in result.scalars().partitions():
+            yield partition
+
+    @staticmethod
+    @read_only
+    def get_document_coverage(document, version=None, since=None, until=None):
+        """
+        Page reach and completion over a document's live sessions of one version
+        (the latest by default); archived and compacted sessions keep no page bitmaps.
+        Sessions without a bitmap viewed no page yet and still count.
+        Returns: dict from summarize(), or None when the version's page count is unknown
+        """
+        from sqlalchemy import select
+        from app.models.document_version import DocumentVersion
+
+        version = version or document.version
+        page_count = document.page_count
+        if version != document.version:
+            page_count = db.session.query(DocumentVersion.page_count).filter_by(
+                document_id=document.id, version=version
+            ).scalar()
+        if not page_count:
+            return None
+
+        link_ids = db.session.query(ShareableLink.id).filter_by(document_id=document.id)
+        statement = select(DocumentView.pages_bitmap).where(
+            DocumentView.link_id.in_(link_ids.scalar_subquery()),
+            DocumentView.document_version == version
+        )
+        if since is not None:
+            statement = statement.where(DocumentView.started_at >= since)
+        if until is not None:
+            statement = statement.where(DocumentView.started_at < until)
+
+        totals = PageCoverage.analyze(PageCoverage.bitmap_chunks(statement), page_count)
+        return PageCoverage.summarize(totals, page_count)
@@ -0,0 +1,292 @@
+import json
+import os
+import shlex
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from app.services.user_cache import REDIS_SCHEMES
+
+class MemoryPresenceBackend:
+    """Per-process presence table, for a single-process deployment only
+
+    Heartbeats and streams only see each other within one process, so with
+    several workers (or the separate ASGI tracking app) presence needs the
+    Redis or database backend; PresenceTracker uses the database backend
+    instead when it finds more than one worker.
+
+    Each link keeps an OrderedDict of session_id -> (expires_at, first_seen,
+    email, page) in last-heartbeat order, so expiry only ever pops from the
+    front. A per-link version counter changes on join, leave, page change
+    and expiry; streams compare versions instead of diffing viewer lists.
+    """
+
+    def __init__(self):
+        self._links = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _bump(self, link_id):
+        self._versions[link_id] = self._versions.get(link_id, 0) + 1
+
+    def _expire(self, link_id, now):
+        sessions = self._links.get(link_id)
+        if not sessions:
+            return
+        expired = False
+        while sessions:
+            session_id, entry = next(iter(sessions.items()))
+            if entry[0] > now:
+                break
+            del sessions[session_id]
+            expired = True
+        if expired:
+            self._bump(link_id)
+        if not sessions:
+            del self._links[link_id]
+
+    def touch(self, link_id, session_id, email, page, ttl):
+        now = time.time()
+        with self._lock:
+            sessions = self._links.setdefault(link_id, OrderedDict())
+            previous = sessions.pop(session_id, None)
+            sessions[session_id] = (now + ttl, previous[1] if previous else now, email, page)
+            if previous is None or previous[3] != page:
+                self._bump(link_id)
+            self._expire(link_id, now)
+
+    def leave(self, link_id, session_id):
+        with self._lock:
+            sessions = self._links.get(link_id)
+            if sessions and sessions.pop(session_id, None) is not None:
+                self._bump(link_id)
+                if not sessions:
+                    del self._links[link_id]
+
+    def version(self, link_ids):
+        now = time.time()
+        with self._lock:
+            for link_id in link_ids:
+                self._expire(link_id, now)
+            return sum(self._versions.get(link_id, 0) for link_id in link_ids)
+
+    def viewers(self, link_ids):
+        now = time.time()
+        viewers = []
+        with self._lock:
+            for link_id in link_ids:
+                self._expire(link_id, now)
+                for session_id, (_, first_seen, email, page) in self._links.get(link_id, {}).items():
+                    viewers.append((link_id, session_id, first_seen, email, page))
+        return viewers
+
+class RedisPresenceBackend:
+    """Redis presence table shared by all gunicorn workers"""
+
+    KEY_PREFIX = 'docone:presence:'
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def _keys(self, link_id):
+        return f'{self.KEY_PREFIX}{link_id}', f'{self.KEY_PREFIX}{link_id}:v'
+
+    def touch(self, link_id, session_id, email, page, ttl):
+        key, version_key = self._keys(link_id)
+        now = time.time()
+        previous = self._client.hget(key, session_id)
+        previous = json.loads(previous) if previous else None
+        entry = {'x': now + ttl, 'f': previous['f'] if previous else now, 'e': email, 'p': page}
+
+        pipeline = self._client.pipeline()
+        pipeline.hset(key, session_id, json.dumps(entry))
+        pipeline.expire(key, int(ttl) + 1)
+        if previous is None or previous['p'] != page:
+            pipeline.incr(version_key)
+        pipeline.execute()
+
+    def leave(self, link_id, session_id):
+        key, version_key = self._keys(link_id)
+        if self._client.hdel(key, session_id):
+            self._client.incr(version_key)
+
+    def _entries(self, link_id):
+        key, version_key = self._keys(link_id)
+        now = time.time()
+        entries = {}
+        expired = []
+        for session_id, payload in self._client.hgetall(key).items():
+            entry = json.loads(payload)
+            if entry['x'] <= now:
+                expired.append(session_id)
+            else:
+                entries[session_id.decode()] = entry
+        if expired:
+            self._client.hdel(key, *expired)
+            self._client.incr(version_key)
+        return entries
+
+    def version(self, link_ids):
+        for link_id in link_ids:
+            self._entries(link_id)
+        versions = self._client.mget([self._keys(link_id)[1] for link_id in link_ids]) if link_ids else []
+        return sum(int(value) for value in versions if value)
+
+    def viewers(self, link_ids):
+        viewers = []
+        for link_id in link_ids:
+            for session_id, entry in self._entries(link_id).items():
+                viewers.append((link_id, session_id, entry['f'], entry['e'], entry['p']))
+        return viewers
+
+class DatabasePresenceBackend:
+    """Presence read from the view sessions themselves, shared by every process
+
+    Each heartbeat already stamps last_heartbeat_at and current_page on its
+    session row, whichever process handled it (a gunicorn worker or the ASGI
+    tracking app), so touch and leave have nothing to do. Viewers are the open
+    sessions with a heartbeat in the last PRESENCE_TTL seconds, read with one
+    query per poll; the version is derived from them.
+    """
+
+    EPOCH = datetime(1970, 1, 1)
+
+    def __init__(self, ttl):
+        self._ttl = ttl
+
+    def touch(self, link_id, session_id, email, page, ttl):
+        pass
+
+    def leave(self, link_id, session_id):
+        pass
+
+    def version(self, link_ids):
+        return hash(tuple(sorted((session_id, page) for _, session_id, _, _, page in self.viewers(link_ids))))
+
+    def viewers(self, link_ids):
+        from app import db
+        from app.models.analytics import DocumentView
+
+        if not link_ids:
+            return []
+        rows = db.session.query(
+            DocumentView.link_id, DocumentView.session_id, DocumentView.started_at,
+            DocumentView.viewer_email, DocumentView.current_page
+        ).filter(
+            DocumentView.link_id.in_(link_ids),
+            DocumentView.ended_at.is_(None),
+            DocumentView.last_heartbeat_at >= datetime.utcnow() - timedelta(seconds=self._ttl)
+        ).all()
+        db.session.close()  # A stream holds no connection between polls
+
+        return [(link_id, session_id, (started_at - self.EPOCH).total_seconds(), email, page)
+                for link_id, session_id, started_at, email, page in rows]
+
+class PresenceTracker:
+    """Service for live "who is viewing now" state fed by viewer heartbeats"""
+
+    @staticmethod
+    def init_app(app):
+        """Create the configured backend and register it on the app"""
+        url = app.config.get('PRESENCE_URL')
+
+        if url and url.startswith(REDIS_SCHEMES):
+            backend = RedisPresenceBackend(url)
+        elif url == 'database':
+            backend = DatabasePresenceBackend(app.config['PRESENCE_TTL'])
+        elif PresenceTracker.worker_count(app) > 1:
+            # Each worker would only show the viewers whose heartbeats it happened to handle
+            app.logger.warning("In-memory presence only works in one process; using PRESENCE_URL=database. "
+                               "Set PRESENCE_URL to a redis:// or rediss:// URL to take the load off the database.")
+            backend = DatabasePresenceBackend(app.config['PRESENCE_TTL'])
+        else:
+            backend = MemoryPresenceBackend()
+
+        app.extensions['presence'] = backend
+
+    @staticmethod
+    def worker_count(app):
+        """
+        Worker processes serving the app: WEB_CONCURRENCY, or under gunicorn (which sets
+        SERVER_SOFTWARE) the -w/--workers given on its command line or in GUNICORN_CMD_ARGS
+        Returns: int
+        """
+        count = app.config['WEB_CONCURRENCY']
+        if not os.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+            return count
+
+        args = shlex.split(os.environ.get('GUNICORN_CMD_ARGS', '')) + sys.argv[1:]
+        for i, arg in enumerate(args):
+            value = None
+            if arg in ('-w', '--workers') and i + 1 < len(args):
+                value = args[i + 1]
+            elif arg.startswith('--workers='):
+                value = arg[len('--workers='):]
+            elif arg.startswith('-w') and len(arg) > 2:
+                value = arg[2:]
+            if value and value.isdigit():
+                count = max(count, int(value))
+        return count
+
+    @staticmethod
+    def _backend():
+        return current_app.extensions['presence']
+
+    @staticmethod
+    def touch(link_id, session_id, email, page):
+        """Record a heartbeat; the session counts as present for PRESENCE_TTL seconds"""
+        PresenceTracker._backend().touch(link_id, session_id, email, page, current_app.config['PRESENCE_TTL'])
+
+    @staticmethod
+    def leave(link_id, session_id):
+        PresenceTracker._backend().leave(link_id, session_id)
+
+    @staticmethod
+    def version(link_ids):
+        """Changes whenever a viewer of any of the links joins, leaves or turns a page"""
+        return PresenceTracker._backend().version(link_ids)
+
+    @staticmethod
+    def snapshot(link_ids):
+        """
+        Current viewers of a set of links
+        Returns: dict with count and viewers (email, page, link_id, since as a unix timestamp)
+        """
+        viewers = [
+            {'email': email, 'page': page, 'link_id': link_id, 'since': int(first_seen)}
+            for link_id, _, first_seen, email, page in PresenceTracker._backend().viewers(link_ids)
+        ]
+        viewers.sort(key=lambda viewer: viewer['since'])
+        return {'count': len(viewers), 'viewers': viewers}
+
+    @staticmethod
+    def stream(link_ids):
+        """
+        Server-sent events for a presence panel: a "presence" event on every
+        change and a comment line as keepalive. Waiting is plain time.sleep, so
+        under gevent workers an idle stream is a parked greenlet rather than a
+        busy thread. The stream ends after PRESENCE_STREAM_SECONDS and
+        EventSource reconnects on its own.
+        Returns: generator of SSE text chunks
+        """
+        config = current_app.config
+        interval = config['PRESENCE_POLL_INTERVAL']
+        deadline = time.monotonic() + config['PRESENCE_STREAM_SECONDS']
+        keepalive_every = 15.0
+
+        yield f"retry: {int(interval * 1000) + 1000}\n\n"
+        last_version = None
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            version = PresenceTracker.version(link_ids)
+            if version != last_version:
+                last_version = version
+                last_sent = time.monotonic()
+                yield f"event: presence\ndata: {json.dumps(PresenceTracker.snapshot(link_ids))}\n\n"
+            elif time.monotonic() - last_sent >= keepalive_every:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            time.sleep(interval)
@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from flask import current_app, g, request
+
+logger = logging.getLogger('docone.profiling')
+
+class _RequestState:
+    """Per-request sampling state shared with the sampler thread"""
+
+    __slots__ = ('started', 'sampled', 'stacks')
+
+    def __init__(self, started, sampled):
+        self.started = started
+        self.sampled = sampled
+        self.stacks = {}
+
+class RequestProfiler:
+    """Opt-in statistical profiler for requests and slow SQL
+
+    A single sampler thread per process walks sys._current_frames() every
+    PROFILING_INTERVAL_MS for requests that were picked by the sample rate or
+    have already run longer than the slow-request threshold. Sampled stacks
+    are written in collapsed format (one "frame;frame;frame count" line per
+    stack), which flamegraph.pl, speedscope and similar tools render directly.
+
+    Settings can be changed at runtime through the control file written by
+    `flask docone profiling`; every worker re-reads it within a second.
+
+    Sampling needs real threads: under gevent workers requests are greenlets
+    that sys._current_frames() does not see, and the sampler would only run
+    when a request yields. There no stacks are sampled (a warning is logged
+    once), while slow requests and slow queries are still logged.
+    """
+
+    _active = {}  # thread id -> _RequestState
+    _sampler_pid = None
+    _settings = None
+    _settings_checked_at = 0.0
+    _settings_mtime = None
+    _frame_names = {}
+
+    @staticmethod
+    def init_app(app):
+        """Install request hooks and slow-query logging"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        if not event.contains(Engine, 'after_cursor_execute', _log_slow_query):
+            event.listen(Engine, 'before_cursor_execute', _start_query_timer)
+            event.listen(Engine, 'after_cursor_execute', _log_slow_query)
+
+        @app.before_request
+        def _start_profiling():
+            settings = RequestProfiler.settings()
+            if not settings['enabled']:
+                return
+
+            RequestProfiler._ensure_sampler()
+            state = _RequestState(time.perf_counter(), random.random() < settings['sample_rate'])
+            RequestProfiler._active[threading.get_ident()] = state
+            g.profiling_state = state
+
+        @app.teardown_request
+        def _finish_profiling(exc):
+            state = g.pop('profiling_state', None)
+            if state is None:
+                return
+            RequestProfiler._active.pop(threading.get_ident(), None)
+
+            elapsed_ms = (time.perf_counter() - state.started) * 1000
+            settings = RequestProfiler.settings()
+            slow = elapsed_ms >= settings['slow_request_ms']
+            if slow:
+                logger.warning(f"Slow request {request.method} {request.path} "
+                               f"({request.endpoint}) took {elapsed_ms:.0f} ms")
+
+            if state.stacks and (state.sampled or slow):
+                RequestProfiler._write_stacks(settings, request.endpoint or 'unmatched', elapsed_ms, state.stacks)
+
+    @staticmethod
+    def settings():
+        """
+        Current profiling settings: config defaults overridden by the control file
+        Returns: dict with enabled, sample_rate, slow_request_ms, slow_query_ms, interval_ms, directory,
+        log_parameters
+        """
+        now = time.monotonic()
+        if RequestProfiler._settings is not None and now - RequestProfiler._settings_checked_at < 1.0:
+            return RequestProfiler._settings
+        RequestProfiler._settings_checked_at = now
+
+        control_file = RequestProfiler.control_file()
+        try:
+            mtime = os.path.getmtime(control_file)
+        except OSError:
+            mtime = None
+
+        if RequestProfiler._settings is None or mtime != RequestProfiler._settings_mtime:
+            config = current_app.config
+            settings = {
+                'enabled': config['PROFILING_ENABLED'],
+                'sample_rate': config['PROFILING_SAMPLE_RATE'],
+                'slow_request_ms': config['PROFILING_SLOW_REQUEST_MS'],
+                'slow_query_ms': config['PROFILING_SLOW_QUERY_MS'],
+                'interval_ms': config['PROFILING_INTERVAL_MS'],
+                'directory': config['PROFILING_DIR'],
+                'log_parameters': config['PROFILING_LOG_PARAMETERS'],
+            }
+            if mtime is not None:
+                try:
+                    with open(control_file) as f:
+                        settings.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    current_app.logger.warning(f"Ignoring profiling control file: {str(e)}")
+
+            RequestProfiler._settings = settings
+            RequestProfiler._settings_mtime = mtime
+
+        return RequestProfiler._settings
+
+    @staticmethod
+    def control_file():
+        return current_app.config.get('PROFILING_CONTROL_FILE') or \
+            os.path.join(current_app.config['PROFILING_DIR'], 'control.json')
+
+    @staticmethod
+    def write_control(**overrides):
+        """Persist runtime overrides picked up by every worker without a restart"""
+        path = RequestProfiler.control_file()
+        current = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                current = json.load(f)
+        current.update({key: value for key, value in overrides.items() if value is not None})
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(current, f, indent=2)
+        os.replace(tmp_path, path)
+        return current
+
+    @staticmethod
+    def _ensure_sampler():
+        """Start the sampler thread once per process (again after a fork)"""
+        if RequestProfiler._sampler_pid == os.getpid():
+            return
+        RequestProfiler._sampler_pid = os.getpid()
+        RequestProfiler._active = {}
+
+        if _gevent_patched():
+            logger.warning('Profiling under gevent workers: stacks are not sampled, '
+                           'only slow requests and queries are logged')
+            return
+
+        app = current_app._get_current_object()
+        thread = threading.Thread(target=RequestProfiler._sample_loop, args=(app,),
+                                  name='docone-profiler', daemon=True)
+        thread.start()
+
+    @staticmethod
+    def _sample_loop(app):
+        with app.app_context():
+            while True:
+                settings = RequestProfiler.settings()
+                interval = settings['interval_ms'] / 1000.0
+                if not settings['enabled']:
+                    time.sleep(1.0)
+                    continue
+
+                time.sleep(interval)
+                active = dict(RequestProfiler._active)
+                if not active:
+                    continue
+
+                now = time.perf_counter()
+                slow_after = settings['slow_request_ms'] / 1000.0
+                frames = sys._current_frames()
+                for thread_id, state in active.items():
+                    if not state.sampled and now - state.started < slow_after:
+                        continue
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = RequestProfiler._collapse(frame)
+                        state.stacks[stack] = state.stacks.get(stack, 0) + 1
+
+    @staticmethod
+    def _collapse(frame):
+        """Render a frame chain root-first as 'func (file:line);...'"""
+        names = RequestProfiler._frame_names
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            name = names.get(code)
+            if name is None:
+                name = names[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            parts.append(name)
+            frame = frame.f_back
+        parts.reverse()
+        return ';'.join(parts)
+
+    @staticmethod
+    def _write_stacks(settings, endpoint, elapsed_ms, stacks):
+        directory = settings['directory']
+        try:
+            os.makedirs(directory, exist_ok=True)
+            filename = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{endpoint}-{elapsed_ms:.0f}ms.collapsed"
+            with open(os.path.join(directory, filename), 'w') as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f'{stack} {count}\n')
+        except OSError as e:
+            logger.warning(f"Could not write profile: {str(e)}")
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._docone_query_started = time.perf_counter()
+
+def _gevent_patched():
+    """Whether gevent has replaced the threading module (e.g. gunicorn -k gevent)"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def _describe_parameters(parameters):
+    """Parameter types only, so emails, IPs and hashes stay out of the logs"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def _explain(conn, cursor, statement, parameters):
+    """
+    Run an EXPLAIN on a pooled connection of its own, so a failure cannot abort the
+    request's transaction (on PostgreSQL every later statement would fail). Pools that
+    hand every checkout the same connection (in-memory SQLite) use the request's cursor
+    connection instead; SQLite does not abort a transaction on a failed statement.
+    Returns: list of plan rows
+    """
+    from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+    if isinstance(conn.engine.pool, (SingletonThreadPool, StaticPool)):
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(statement, parameters)
+            return explain_cursor.fetchall()
+        finally:
+            explain_cursor.close()
+
+    with conn.engine.connect() as explain_conn:
+        return explain_conn.exec_driver_sql(statement, parameters).fetchall()
+
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    """Log statements over the time budget together with their EXPLAIN plan"""
+    started = getattr(context, '_docone_query_started', None)
+    if started is None:
+        return
+
+    settings = RequestProfiler._settings
+    if not settings or not settings['enabled']:
+        return
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < settings['slow_query_ms']:
+        return
+
+    plan = ''
+    if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        try:
+            plan = '\n'.join(' | '.join(str(col) for col in row) for row in _explain(conn, cursor, prefix + statement,
+                                                                                    parameters))
+        except Exception as e:
+            plan = f'(EXPLAIN failed: {e})'
+
+    shown = parameters if settings.get('log_parameters') else _describe_parameters(parameters)
+    logger.warning(f"Slow query ({elapsed_ms:.0f} ms): {statement}\nParameters: {shown!r}\nPlan:\n{plan}")
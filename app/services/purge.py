@@ -0,0 +1,185 @@
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select, update
+from app import db
+from app.models.analytics import DocumentView, DocumentViewRollup
+from app.models.document import Document
+from app.models.document_page import DocumentPage
+from app.models.document_version import DocumentVersion
+from app.models.email_capture import CapturedEmail
+from app.models.link import ShareableLink
+from app.services.background import BackgroundTasks
+from app.services.file_storage import FileStorageService
+
+class DocumentPurger:
+    """Service for deleting documents and links without loading their history
+
+    Deleting is two steps. The request only marks the row (Document.is_deleted,
+    ShareableLink.deleted_at) and deactivates links, which is a couple of
+    single-row UPDATEs. A background task then removes dependent rows in
+    PURGE_BATCH_SIZE batches, each in its own short transaction, and finally
+    the row itself and its files. Rows left marked by a restart are picked up
+    again by `flask docone purge run`.
+
+    Archived sessions (ViewArchive files) are removed while the row is still
+    marked, so an interrupted purge redoes them and a link id reused later
+    never inherits the old link's archived views.
+
+    On PostgreSQL the foreign keys are ON DELETE CASCADE, so once the large
+    tables are drained the final DELETE also removes links, rollups and versions.
+    """
+
+    @staticmethod
+    def soft_delete_document(document):
+        """Hide a document and its links now and queue the purge"""
+        now = datetime.utcnow()
+        document.is_deleted = True
+        document.deleted_at = now
+        db.session.execute(
+            update(ShareableLink).where(ShareableLink.document_id == document.id).values(is_active=False)
+        )
+        db.session.commit()
+        return BackgroundTasks.submit(DocumentPurger.purge_document, document.id)
+
+    @staticmethod
+    def soft_delete_link(link):
+        """Deactivate and hide a link now and queue the purge"""
+        link.is_active = False
+        link.deleted_at = datetime.utcnow()
+        db.session.commit()
+        return BackgroundTasks.submit(DocumentPurger.purge_link, link.id)
+
+    @staticmethod
+    def _delete_in_batches(table, condition, name, counters, report):
+        """Delete matching rows PURGE_BATCH_SIZE at a time, committing after each batch"""
+        batch_size = current_app.config['PURGE_BATCH_SIZE']
+        pause = current_app.config['PURGE_BATCH_SLEEP']
+
+        while True:
+            batch = select(table.c.id).where(condition).limit(batch_size).scalar_subquery()
+            deleted = db.session.execute(delete(table).where(table.c.id.in_(batch))).rowcount
+            db.session.commit()
+            counters[name] = counters.get(name, 0) + deleted
+            if report:
+                report(dict(counters))
+            if deleted < batch_size:
+                return
+            if pause:
+                time.sleep(pause)
+
+    @staticmethod
+    def _purge_link_rows(link_ids, counters, report, cascades):
+        tables = [(DocumentView.__table__, 'views'), (CapturedEmail.__table__, 'captured_emails')]
+        if not cascades:
+            tables.append((DocumentViewRollup.__table__, 'rollups'))
+        for table, name in tables:
+            DocumentPurger._delete_in_batches(table, table.c.link_id.in_(link_ids), name, counters, report)
+
+    @staticmethod
+    def _cascades():
+        return db.engine.dialect.name == 'postgresql'
+
+    @staticmethod
+    def purge_link(link_id, report=None):
+        """
+        Remove a deleted link and its view history
+        Returns: dict of deleted row counts (None if the link is gone or not deleted)
+        """
+        from app.services.view_archive import ViewArchive  # numpy stays out of the boot path
+
+        link = db.session.get(ShareableLink, link_id)
+        if link is None or link.deleted_at is None:
+            return None
+
+        counters = {'archived_views': ViewArchive.remove_link(link.document_id, link_id)}
+        db.session.commit()
+        cascades = DocumentPurger._cascades()
+        DocumentPurger._purge_link_rows([link_id], counters, report, cascades)
+        db.session.execute(delete(ShareableLink).where(ShareableLink.id == link_id))
+        db.session.commit()
+        counters['links'] = 1
+        current_app.logger.info(f"Purged link {link_id}: {counters}")
+        return counters
+
+    @staticmethod
+    def purge_document(document_id, report=None):
+        """
+        Remove a deleted document, everything that depends on it and its files
+        Returns: dict of deleted row counts (None if the document is gone or not deleted)
+        """
+        from app.services.view_archive import ViewArchive
+
+        document = db.session.get(Document, document_id)
+        if document is None or not document.is_deleted:
+            return None
+
+        paths = {document.file_path, document.pdf_path}
+        for file_path, pdf_path in db.session.query(DocumentVersion.file_path, DocumentVersion.pdf_path).filter_by(
+            document_id=document_id
+        ):
+            paths.update((file_path, pdf_path))
+        paths.discard(None)
+        link_ids = [link_id for (link_id,) in db.session.query(ShareableLink.id).filter_by(document_id=document_id)]
+        db.session.commit()
+
+        counters = {'archive_files': ViewArchive.remove_document(document_id)}
+        cascades = DocumentPurger._cascades()
+        if link_ids:
+            DocumentPurger._purge_link_rows(link_ids, counters, report, cascades)
+        DocumentPurger._delete_in_batches(
+            DocumentPage.__table__, DocumentPage.__table__.c.document_id == document_id, 'pages', counters, report
+        )
+
+        if not cascades:
+            db.session.execute(delete(ShareableLink).where(ShareableLink.document_id == document_id))
+            db.session.execute(delete(DocumentVersion).where(DocumentVersion.document_id == document_id))
+        db.session.execute(delete(Document).where(Document.id == document_id))
+        db.session.commit()
+        counters['links'] = len(link_ids)
+
+        # Files go last: a crash before this leaves orphans for `flask docone storage gc`, never dangling rows
+        counters['files'] = sum(1 for path in paths if FileStorageService.delete_file(path))
+        current_app.logger.info(f"Purged document {document_id}: {counters}")
+        return counters
+
+    @staticmethod
+    def pending():
+        """
+        Deleted documents and links still waiting to be purged
+        Returns: list of dicts with kind, id, deleted_at and remaining view rows
+        """
+        items = []
+        documents = db.session.query(Document.id, Document.deleted_at).filter(
+            Document.is_deleted == True
+        ).order_by(Document.deleted_at).all()
+        for document_id, deleted_at in documents:
+            views = db.session.query(db.func.count(DocumentView.id)).join(ShareableLink).filter(
+                ShareableLink.document_id == document_id
+            ).scalar()
+            items.append({'kind': 'document', 'id': document_id, 'deleted_at': deleted_at, 'views': views})
+
+        links = db.session.query(ShareableLink.id, ShareableLink.deleted_at).join(Document).filter(
+            ShareableLink.deleted_at.isnot(None),
+            Document.is_deleted == False
+        ).order_by(ShareableLink.deleted_at).all()
+        for link_id, deleted_at in links:
+            views = db.session.query(db.func.count(DocumentView.id)).filter(DocumentView.link_id == link_id).scalar()
+            items.append({'kind': 'link', 'id': link_id, 'deleted_at': deleted_at, 'views': views})
+
+        return items
+
+    @staticmethod
+    def purge_pending(report=None):
+        """
+        Purge everything marked deleted (links of deleted documents go with their document)
+        Returns: dict of deleted row counts across all items
+        """
+        totals = {}
+        for item in DocumentPurger.pending():
+            purge = DocumentPurger.purge_document if item['kind'] == 'document' else DocumentPurger.purge_link
+            counters = purge(item['id'], report=report) or {}
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+            totals[f"{item['kind']}s_purged"] = totals.get(f"{item['kind']}s_purged", 0) + 1
+        return totals
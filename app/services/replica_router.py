@@ -0,0 +1,131 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+REPLICA_BIND = 'replica'
+PRIMARY_UNTIL_SESSION_KEY = 'db_primary_until'  # Unix time until which this user reads from the primary
+
+class RoutingSession(Session):
+    """Session that sends read-only work to the replica bind when it is safe"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('read_only')
+                and not self._flushing and not self.info.get('has_writes')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_writes(session, flush_context):
+    session.info['has_writes'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_statement_writes(orm_execute_state):
+    """INSERT/UPDATE/DELETE through session.execute() never flush, so mark them here
+    (before get_bind runs, which keeps the statement itself on the primary too)"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['has_writes'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_user_write(session):
+    """Keep an authenticated user on the primary for a while after their writes (read-your-writes)
+
+    The window is stored as a deadline of twice the allowed lag and only moved
+    once less than one lag period is left, so a user making many writes does
+    not get a new session cookie with each of them.
+    """
+    had_writes = session.info.pop('has_writes', False)
+    if had_writes and has_request_context():
+        from flask_login import current_user
+        if current_user.is_authenticated:
+            max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+            now = time.time()
+            if flask_session.get(PRIMARY_UNTIL_SESSION_KEY, 0) < now + max_lag:
+                flask_session[PRIMARY_UNTIL_SESSION_KEY] = now + 2 * max_lag
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop('has_writes', None)
+
+class ReplicaRouter:
+    """Service for routing explicitly read-only calls to the replica database"""
+
+    _lag_lock = threading.Lock()
+    _lag_checked_at = 0.0
+    _lag_seconds = 0.0
+
+    @staticmethod
+    def replica_lag(engine):
+        """
+        Measure replication lag on the replica, cached per process
+        Returns: lag in seconds (0 when the backend cannot report it)
+        """
+        interval = current_app.config['REPLICA_LAG_CHECK_INTERVAL']
+        now = time.monotonic()
+
+        with ReplicaRouter._lag_lock:
+            if now - ReplicaRouter._lag_checked_at < interval:
+                return ReplicaRouter._lag_seconds
+
+            lag = 0.0
+            if engine.dialect.name == 'postgresql':
+                try:
+                    with engine.connect() as conn:
+                        # The last replayed transaction ages while the primary is idle, so a
+                        # replica that has replayed everything it received counts as current
+                        lag = conn.execute(text(
+                            'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                            'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+                        )).scalar() or 0.0
+                except Exception as e:
+                    current_app.logger.warning(f"Replica lag check failed: {str(e)}")
+                    lag = float('inf')
+
+            ReplicaRouter._lag_checked_at = now
+            ReplicaRouter._lag_seconds = float(lag)
+            return ReplicaRouter._lag_seconds
+
+    @staticmethod
+    def can_use_replica():
+        """Check replica config, recent writes by this user and replica lag"""
+        from app import db
+
+        replica = db.engines.get(REPLICA_BIND)
+        if replica is None:
+            return False
+
+        max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+
+        # Read-your-writes: stay on the primary right after this user's own writes
+        if has_request_context():
+            if time.time() < flask_session.get(PRIMARY_UNTIL_SESSION_KEY, 0):
+                return False
+
+        return ReplicaRouter.replica_lag(replica) <= max_lag
+
+@contextmanager
+def replica_reads():
+    """Route queries inside the block to the replica when it is safe"""
+    from app import db
+
+    session = db.session()
+    previous = session.info.get('read_only', False)
+    session.info['read_only'] = previous or ReplicaRouter.can_use_replica()
+    try:
+        yield
+    finally:
+        session.info['read_only'] = previous
+
+def read_only(f):
+    """Decorator marking a service call or view as safe to serve from the replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with replica_reads():
+            return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,304 @@
+import hashlib
+import re
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, insert, text
+from app import db
+from app.models.document import Document
+from app.models.document_page import DocumentPage
+from app.models.document_version import DocumentVersion
+from app.services.background import BackgroundTasks
+from app.services.file_storage import FileStorageService
+
+MAX_PAGE_CHARS = 100000  # Keeps a single page well under the tsvector size limit
+RANKED_MATCH_LIMIT = 5000  # Above this many matching pages, relevance ranking is skipped
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Each dialect has a bounded count, a relevance-ranked and a newest-first query.
+# Scoring costs a lookup per matching page, so terms that match most of a user's
+# pages (where relevance says little anyway) are answered newest-first instead.
+SQLITE_QUERIES = {
+    'count': text("""
+        SELECT count(*) FROM (
+            SELECT rowid FROM document_pages_fts
+            WHERE document_pages_fts MATCH :query
+            ORDER BY rowid DESC
+            LIMIT :count_limit
+        ) AS f
+    """),
+    'ranked': text("""
+        SELECT p.document_id, p.page_number, f.score
+        FROM (
+            SELECT rowid, -bm25(document_pages_fts, 1.0, 0.0) AS score
+            FROM document_pages_fts
+            WHERE document_pages_fts MATCH :query
+            ORDER BY score DESC
+            LIMIT :page_limit
+        ) AS f
+        JOIN document_pages p ON p.id = f.rowid
+    """),
+    'newest': text("""
+        SELECT p.document_id, p.page_number, 1.0 AS score
+        FROM (
+            SELECT rowid FROM document_pages_fts
+            WHERE document_pages_fts MATCH :query
+            ORDER BY rowid DESC
+            LIMIT :page_limit
+        ) AS f
+        JOIN document_pages p ON p.id = f.rowid
+    """),
+}
+
+POSTGRES_QUERIES = {
+    'count': text("""
+        SELECT count(*) FROM (
+            SELECT 1 FROM document_pages
+            WHERE user_id = :user_id AND search_vector @@ to_tsquery('english', :query)
+            LIMIT :count_limit
+        ) AS f
+    """),
+    'ranked': text("""
+        SELECT p.document_id, p.page_number, ts_rank_cd(p.search_vector, q.query) AS score
+        FROM document_pages p, to_tsquery('english', :query) AS q(query)
+        WHERE p.user_id = :user_id AND p.search_vector @@ q.query
+        ORDER BY score DESC
+        LIMIT :page_limit
+    """),
+    'newest': text("""
+        SELECT document_id, page_number, 1.0 AS score
+        FROM document_pages
+        WHERE user_id = :user_id AND search_vector @@ to_tsquery('english', :query)
+        ORDER BY id DESC
+        LIMIT :page_limit
+    """),
+}
+
+class SearchIndex:
+    """Service for per-page text extraction and full-text search over a user's documents"""
+
+    @staticmethod
+    def extract_pages(pdf_path):
+        """
+        Extract the text of every page of a PDF
+        Returns: list of page strings (empty strings for pages without text)
+        """
+        from PyPDF2 import PdfReader
+
+        return [SearchIndex.extract_page(page, pdf_path) for page in PdfReader(pdf_path).pages]
+
+    @staticmethod
+    def extract_page(page, pdf_path):
+        """
+        Extract the text of one PDF page, whitespace-normalized and capped at MAX_PAGE_CHARS
+        Returns: page string (empty if the page has no text)
+        """
+        try:
+            content = page.extract_text() or ''
+        except Exception as e:
+            current_app.logger.warning(f"Text extraction failed for a page of {pdf_path}: {str(e)}")
+            content = ''
+        return ' '.join(content.split())[:MAX_PAGE_CHARS]
+
+    @staticmethod
+    def page_digest(page):
+        """
+        Digest of what a page's text depends on: its raw content streams, the raw
+        data of the XObjects it draws and the names and ToUnicode maps of its fonts
+        Much cheaper than extracting the text, and stable when an unchanged page is
+        re-saved. Object numbers are left out, so pages keep their digest when
+        other pages are inserted, removed or reordered.
+        Returns: hex digest, or None if the page cannot be read
+        """
+        from PyPDF2.generic import ArrayObject
+
+        def raw(obj):
+            obj = obj.get_object()
+            if isinstance(obj, ArrayObject):
+                return b''.join(raw(item) for item in obj)
+            return getattr(obj, '_data', b'') or b''
+
+        try:
+            sha = hashlib.sha256()
+            sha.update(f'{[float(value) for value in page.cropbox]} {page.get("/Rotate", 0)}'.encode())
+            if '/Contents' in page:
+                sha.update(raw(page.raw_get('/Contents')))
+            resources = (page.get('/Resources') or {})
+            for name, xobject in sorted((resources.get('/XObject') or {}).items()):
+                sha.update(name.encode() + raw(xobject))
+            for name, font in sorted((resources.get('/Font') or {}).items()):
+                font = font.get_object()
+                sha.update(name.encode() + str(font.get('/BaseFont', '')).encode())
+                if '/ToUnicode' in font:
+                    sha.update(raw(font.raw_get('/ToUnicode')))
+            return sha.hexdigest()
+        except Exception:
+            return None
+
+    @staticmethod
+    def schedule(document_id):
+        """Queue a document for indexing on the background pool"""
+        return BackgroundTasks.submit(SearchIndex.index_document, document_id)
+
+    @staticmethod
+    def index_document(document_id, full=False):
+        """
+        Bring the indexed page text of one document up to date with its latest version
+        Pages whose digest matches a page of the last indexed version reuse that
+        page's text instead of being extracted again (full=True extracts every
+        page), and only page rows whose text changed are written, so a new
+        version that edits a few slides costs a few extractions and index updates.
+        Returns: number of pages indexed, or None if the document is gone
+        """
+        from PyPDF2 import PdfReader
+
+        document = Document.query.get(document_id)
+        if not document or document.is_deleted:
+            return None
+
+        versions = DocumentVersion.query.filter_by(document_id=document.id)
+        current = versions.filter_by(version=document.version).first()
+        indexed = None if full else versions.filter(
+            DocumentVersion.page_hashes.isnot(None)
+        ).order_by(DocumentVersion.version.desc()).first()
+
+        existing = dict(db.session.query(DocumentPage.page_number, DocumentPage.content).filter_by(
+            document_id=document.id
+        ).all())
+        reusable = {}
+        for number, digest in enumerate(indexed.page_hashes if indexed else [], start=1):
+            if digest:
+                reusable.setdefault(digest, existing.get(number, ''))
+
+        pdf_path = FileStorageService.get_full_path(document.pdf_path or document.file_path)
+        pages, hashes, extracted = [], [], 0
+        try:
+            for page in PdfReader(pdf_path).pages:
+                digest = SearchIndex.page_digest(page)
+                content = reusable.get(digest) if digest else None
+                if content is None:
+                    content = SearchIndex.extract_page(page, pdf_path)
+                    extracted += 1
+                pages.append(content)
+                hashes.append(digest)
+        except Exception as e:
+            # Unreadable files are marked as indexed with no text so they are not retried forever
+            current_app.logger.error(f"Error extracting text from document {document_id}: {str(e)}")
+            pages, hashes = [], None
+
+        wanted = {number: content for number, content in enumerate(pages, start=1) if content}
+        removed = [number for number in existing if number not in wanted]
+        changed = [{'number': number, 'text': content} for number, content in wanted.items()
+                   if number in existing and existing[number] != content]
+        added = [{'document_id': document.id, 'user_id': document.user_id, 'page_number': number, 'content': content}
+                 for number, content in wanted.items() if number not in existing]
+
+        if removed:
+            DocumentPage.query.filter(
+                DocumentPage.document_id == document.id, DocumentPage.page_number.in_(removed)
+            ).delete(synchronize_session=False)
+        if changed:
+            pages_table = DocumentPage.__table__
+            db.session.connection().execute(
+                pages_table.update().where(
+                    pages_table.c.document_id == document.id, pages_table.c.page_number == bindparam('number')
+                ).values(content=bindparam('text')),
+                changed
+            )
+        if added:
+            db.session.execute(insert(DocumentPage), added)
+
+        if current is not None:
+            current.page_hashes = hashes
+        document.text_indexed_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.info(
+            f"Indexed document {document_id} v{document.version}: {extracted} of {len(pages)} page(s) extracted, "
+            f"{len(added)} added, {len(changed)} changed, {len(removed)} removed"
+        )
+        return len(wanted)
+
+    @staticmethod
+    def index_pending(limit=None, reindex=False):
+        """
+        Index documents that have not been indexed yet (or all of them, extracting every page again)
+        Returns: number of documents indexed
+        """
+        query = db.session.query(Document.id).filter(Document.is_deleted == False)
+        if not reindex:
+            query = query.filter(Document.text_indexed_at.is_(None))
+        query = query.order_by(Document.id)
+        if limit:
+            query = query.limit(limit)
+
+        document_ids = [document_id for (document_id,) in query.all()]
+        for document_id in document_ids:
+            SearchIndex.index_document(document_id, full=reindex)
+
+        if document_ids and db.engine.dialect.name == 'sqlite':
+            # Merge the FTS5 segments written by many small inserts
+            db.session.execute(text("INSERT INTO document_pages_fts (document_pages_fts) VALUES ('optimize')"))
+            db.session.commit()
+
+        return len(document_ids)
+
+    @staticmethod
+    def parse_terms(query):
+        """Split a free-text query into lowercase search terms"""
+        return [term.lower() for term in TERM_PATTERN.findall(query or '')][:16]
+
+    @staticmethod
+    def search(user_id, query, limit=20, page_limit=500):
+        """
+        Rank a user's documents by pages matching every (stemmed) term of the
+        query; a trailing * matches the last term as a prefix
+        Returns: list of dicts with document_id, title, score and matching pages (best first)
+        """
+        terms = SearchIndex.parse_terms(query)
+        if not terms:
+            return []
+
+        prefix = query.rstrip().endswith('*')
+
+        if db.engine.dialect.name == 'postgresql':
+            queries = POSTGRES_QUERIES
+            match = ' & '.join(terms[:-1] + [terms[-1] + (':*' if prefix else '')])
+        else:
+            queries = SQLITE_QUERIES
+            phrases = ' '.join(f'"{term}"' for term in terms) + ('*' if prefix else '')
+            match = f'owner : "u{int(user_id)}" AND content : ({phrases})'
+
+        params = {'query': match, 'user_id': user_id, 'page_limit': page_limit,
+                  'count_limit': RANKED_MATCH_LIMIT + 1}
+        matches = db.session.execute(queries['count'], params).scalar()
+        if not matches:
+            return []
+        order = 'ranked' if matches <= RANKED_MATCH_LIMIT else 'newest'
+        rows = db.session.execute(queries[order], params).all()
+
+        # Group page hits by document; a document ranks by its best page plus a
+        # small bonus for every further matching page
+        results = {}
+        for document_id, page_number, score in rows:
+            result = results.get(document_id)
+            if result is None:
+                results[document_id] = {'document_id': document_id, 'score': float(score), 'pages': [page_number]}
+            else:
+                result['score'] += float(score) * 0.1
+                result['pages'].append(page_number)
+
+        if not results:
+            return []
+
+        titles = dict(db.session.query(Document.id, Document.title).filter(
+            Document.id.in_(list(results)),
+            Document.user_id == user_id,
+            Document.is_deleted == False
+        ).all())
+
+        ranked = []
+        for document_id, result in results.items():
+            if document_id in titles:
+                result['title'] = titles[document_id]
+                ranked.append(result)
+        ranked.sort(key=lambda result: result['score'], reverse=True)
+        return ranked[:limit]
@@ -0,0 +1,162 @@
+import os
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, union_all
+from app import db
+from app.models.document import Document
+from app.models.document_version import DocumentVersion
+from app.services.file_storage import FileStorageService
+
+class StorageReconciler:
+    """Reconcile UPLOAD_FOLDER against the documents and document_versions tables
+
+    Both sides are streamed in the same order (code point order of the
+    relative path) and merge-joined, so memory stays flat no matter how many
+    files or rows there are: the directory walk only holds one sorted
+    directory listing per level, and the database side is a streamed cursor.
+    """
+
+    @staticmethod
+    def iter_files(root):
+        """
+        Walk root in code point order of relative paths, skipping dotfiles
+        Returns: generator of (relative_path, os.DirEntry)
+        """
+        def walk(directory, prefix):
+            try:
+                with os.scandir(directory) as iterator:
+                    entries = list(iterator)
+            except OSError as e:
+                current_app.logger.warning(f"Cannot list {directory}: {str(e)}")
+                return
+
+            # 'a/...' must sort where the string 'a/' would, not where 'a' would,
+            # for the walk order to match ORDER BY on the full path
+            entries.sort(key=lambda entry: entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name)
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                relative_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    yield from walk(entry.path, relative_path + '/')
+                elif entry.is_file(follow_symlinks=False):
+                    yield relative_path, entry
+
+        if os.path.isdir(root):
+            yield from walk(root, '')
+
+    @staticmethod
+    def iter_references():
+        """
+        Stream every file path referenced by a document, ordered by path
+        Returns: generator of (relative_path, document_id)
+        """
+        documents = Document.__table__
+        versions = DocumentVersion.__table__
+        references = union_all(
+            select(documents.c.file_path.label('path'), documents.c.id),
+            select(documents.c.pdf_path.label('path'), documents.c.id).where(
+                documents.c.pdf_path.isnot(None),
+                documents.c.pdf_path != documents.c.file_path
+            ),
+            # Earlier versions' files (the latest version repeats the document's paths)
+            select(versions.c.file_path.label('path'), versions.c.document_id),
+            select(versions.c.pdf_path.label('path'), versions.c.document_id).where(
+                versions.c.pdf_path.isnot(None),
+                versions.c.pdf_path != versions.c.file_path
+            )
+        ).subquery()
+
+        order = references.c.path
+        if db.engine.dialect.name == 'postgresql':
+            # Byte order, matching Python string comparison (the default collation is locale aware)
+            order = order.collate('C')
+
+        statement = select(references.c.path, references.c.id).order_by(order)
+        result = db.session.execute(statement.execution_options(yield_per=10000))
+        for path, document_id in result:
+            yield path, document_id
+
+    @staticmethod
+    def reconcile(grace_hours=None, delete=False, report_path=None):
+        """
+        Find files no document references and documents whose files are missing
+        Orphans younger than the grace period are kept: uploads write the file before the row commits
+        Returns: dict of counters
+        """
+        grace_hours = current_app.config['STORAGE_GC_GRACE_HOURS'] if grace_hours is None else grace_hours
+        cutoff = time.time() - grace_hours * 3600
+        root = FileStorageService.get_full_path('')
+
+        counters = {'files': 0, 'referenced': 0, 'orphans': 0, 'orphan_bytes': 0, 'deleted': 0,
+                    'recent_orphans': 0, 'dangling_references': 0, 'delete_errors': 0}
+
+        report = open(report_path, 'w') if report_path else None
+        if report:
+            report.write('kind\tpath\tsize\tmodified_at\tdocument_id\n')
+
+        def record(kind, path, size='', mtime=None, document_id=''):
+            if report:
+                modified_at = datetime.utcfromtimestamp(mtime).isoformat() if mtime else ''
+                report.write(f'{kind}\t{path}\t{size}\t{modified_at}\t{document_id}\n')
+
+        try:
+            files = StorageReconciler.iter_files(root)
+            references = StorageReconciler.iter_references()
+            file_item = next(files, None)
+            reference = next(references, None)
+
+            while file_item is not None or reference is not None:
+                if reference is None or (file_item is not None and file_item[0] < reference[0]):
+                    relative_path, entry = file_item
+                    counters['files'] += 1
+                    StorageReconciler._handle_orphan(entry, relative_path, cutoff, delete, counters, record)
+                    file_item = next(files, None)
+
+                elif file_item is None or reference[0] < file_item[0]:
+                    counters['dangling_references'] += 1
+                    record('dangling', reference[0], document_id=reference[1])
+                    reference = next(references, None)
+
+                else:
+                    counters['files'] += 1
+                    counters['referenced'] += 1
+                    path = reference[0]
+                    # Several rows can point at the same file
+                    while reference is not None and reference[0] == path:
+                        reference = next(references, None)
+                    file_item = next(files, None)
+        finally:
+            if report:
+                report.close()
+            db.session.commit()  # Close the streaming read transaction
+
+        return counters
+
+    @staticmethod
+    def _handle_orphan(entry, relative_path, cutoff, delete, counters, record):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return  # Removed while we were walking
+
+        if stat.st_mtime > cutoff:
+            counters['recent_orphans'] += 1
+            record('recent_orphan', relative_path, stat.st_size, stat.st_mtime)
+            return
+
+        counters['orphans'] += 1
+        counters['orphan_bytes'] += stat.st_size
+        if not delete:
+            record('orphan', relative_path, stat.st_size, stat.st_mtime)
+            return
+
+        try:
+            os.remove(entry.path)
+            counters['deleted'] += 1
+            record('deleted', relative_path, stat.st_size, stat.st_mtime)
+        except OSError as e:
+            counters['delete_errors'] += 1
+            current_app.logger.error(f"Error deleting orphan {relative_path}: {str(e)}")
+            record('delete_error', relative_path, stat.st_size, stat.st_mtime)
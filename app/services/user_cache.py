@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from flask import current_app
+from flask_login import UserMixin
+from app.services.metrics import Metrics
+
+class CachedUser(UserMixin):
+    """Immutable snapshot of the user fields needed per request"""
+
+    __slots__ = ('id', 'email', 'full_name', 'is_active')
+
+    def __init__(self, id, email, full_name, is_active):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, 'full_name', full_name)
+        object.__setattr__(self, 'is_active', bool(is_active))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CachedUser is read-only')
+
+    @classmethod
+    def from_user(cls, user):
+        """Build a snapshot from a User model instance"""
+        return cls(user.id, user.email, user.full_name, user.is_active)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'full_name': self.full_name,
+            'is_active': self.is_active
+        }
+
+    def __repr__(self):
+        return f'<CachedUser {self.email}>'
+
+class MemoryUserCacheBackend:
+    """Per-process cache backend (invalidation does not reach other workers)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class RedisUserCacheBackend:
+    """Redis cache backend shared by all gunicorn workers"""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.setex(key, ttl, value)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+REDIS_SCHEMES = ('redis://', 'rediss://')  # Plain and TLS connections
+
+class UserCache:
+    """Service for caching user identity snapshots used by Flask-Login"""
+
+    KEY_PREFIX = 'docone:user:'
+
+    @staticmethod
+    def init_app(app):
+        """Create the configured backend and register it on the app"""
+        url = app.config.get('USER_CACHE_URL')
+
+        if url and url.startswith(REDIS_SCHEMES):
+            backend = RedisUserCacheBackend(url)
+        else:
+            backend = MemoryUserCacheBackend()
+
+        app.extensions['user_cache'] = backend
+
+    @staticmethod
+    def _backend():
+        return current_app.extensions['user_cache']
+
+    @staticmethod
+    def load(user_id):
+        """
+        Load a user snapshot, falling back to the database on a miss
+        Returns: CachedUser or None
+        """
+        from app import db
+        from app.models.user import User
+
+        key = f'{UserCache.KEY_PREFIX}{user_id}'
+        backend = UserCache._backend()
+
+        payload = backend.get(key)
+        Metrics.cache_lookup('user', payload is not None)
+        if payload is not None:
+            return CachedUser(**json.loads(payload))
+
+        user = db.session.get(User, user_id)
+        if not user:
+            return None
+
+        snapshot = CachedUser.from_user(user)
+        backend.set(key, json.dumps(snapshot.to_dict()), current_app.config['USER_CACHE_TTL'])
+        return snapshot
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop the cached snapshot for a user"""
+        UserCache._backend().delete(f'{UserCache.KEY_PREFIX}{user_id}')
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import shutil
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from app import db
+from app.models.analytics import DocumentView
+from app.models.link import ShareableLink
+from app.models.viewer import Viewer
+from app.services.view_partitions import month_start, add_months
+
+# Column name -> dtype of the archived session arrays
+ARCHIVE_COLUMNS = {
+    'id': np.int64,
+    'link_id': np.int32,
+    'started_at': np.int64,  # Unix seconds
+    'duration_seconds': np.int32,
+    'max_page_reached': np.int32,
+    'total_page_views': np.int32,
+    'viewer_hash': np.uint64,  # 64-bit hash of the viewer's normalized email, 0 when unknown
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+def email_hash(email):
+    """Stable 64-bit hash of a viewer email used for distinct counts, taken after
+    ViewerRegistry.normalize_email so every spelling of a viewer hashes alike"""
+    from app.services.viewer_registry import ViewerRegistry
+
+    email = ViewerRegistry.normalize_email(email)
+    if not email:
+        return 0
+    digest = hashlib.blake2b(email.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+def pack_hashes(hashes):
+    """Sorted distinct viewer hashes as bytes, as stored in DocumentViewRollup.viewer_hashes"""
+    return np.unique(np.asarray(hashes, dtype=np.uint64)).astype('<u8').tobytes()
+
+def unpack_hashes(data):
+    """Inverse of pack_hashes()"""
+    return np.frombuffer(data or b'', dtype='<u8').astype(np.uint64)
+
+def to_unix(value):
+    return int((value - EPOCH).total_seconds())
+
+class ViewArchive:
+    """Service for moving old view sessions into compressed columnar files
+
+    Sessions are stored as numpy arrays in one compressed .npz file per
+    document and month: {ARCHIVE_FOLDER}/views/{document_id}/{YYYY-MM}.npz
+    """
+
+    @staticmethod
+    def get_root():
+        """Get the absolute archive directory"""
+        archive_folder = current_app.config['ARCHIVE_FOLDER']
+        if not os.path.isabs(archive_folder):
+            # If archive_folder is relative, make it relative to app root
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            archive_folder = os.path.join(base_dir, archive_folder)
+        return os.path.join(archive_folder, 'views')
+
+    @staticmethod
+    def get_path(document_id, period_start):
+        return os.path.join(ViewArchive.get_root(), str(document_id), f'{period_start:%Y-%m}.npz')
+
+    @staticmethod
+    def load(path, columns=ARCHIVE_COLUMNS):
+        """Load one archive file as a dict of column arrays"""
+        with np.load(path) as data:
+            return {name: data[name] for name in columns}
+
+    @staticmethod
+    def _write(path, columns):
+        """Merge columns into an archive file, skipping ids it already holds"""
+        new = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in ARCHIVE_COLUMNS.items()}
+
+        if os.path.exists(path):
+            existing = ViewArchive.load(path)
+            keep = ~np.isin(new['id'], existing['id'])
+            new = {name: np.concatenate([existing[name], new[name][keep]]) for name in ARCHIVE_COLUMNS}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(tmp_path, **new)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def remove_link(document_id, link_id):
+        """
+        Rewrite a document's archive files without the sessions of one link
+        Returns: number of archived sessions removed
+        """
+        directory = os.path.join(ViewArchive.get_root(), str(document_id))
+        if not os.path.isdir(directory):
+            return 0
+
+        removed = 0
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.npz') or filename.endswith('.tmp.npz'):
+                continue
+            path = os.path.join(directory, filename)
+            columns = ViewArchive.load(path)
+            keep = columns['link_id'] != link_id
+            if keep.all():
+                continue
+            removed += int((~keep).sum())
+            if not keep.any():
+                os.remove(path)
+                continue
+            tmp_path = f'{path}.tmp.npz'
+            np.savez_compressed(tmp_path, **{name: columns[name][keep] for name in ARCHIVE_COLUMNS})
+            os.replace(tmp_path, path)
+        return removed
+
+    @staticmethod
+    def remove_document(document_id):
+        """
+        Delete every archive file of a document
+        Returns: number of files deleted
+        """
+        directory = os.path.join(ViewArchive.get_root(), str(document_id))
+        if not os.path.isdir(directory):
+            return 0
+        count = sum(1 for filename in os.listdir(directory)
+                    if filename.endswith('.npz') and not filename.endswith('.tmp.npz'))
+        shutil.rmtree(directory)
+        return count
+
+    @staticmethod
+    def archive_older_than(days=None, batch_size=5000):
+        """
+        Move sessions that started more than `days` ago into archive files
+        Returns: number of sessions archived
+        """
+        if days is None:
+            days = current_app.config['VIEW_ARCHIVE_AFTER_DAYS']
+
+        cutoff = datetime.utcnow() - timedelta(days=days)
+
+        rows = db.session.query(
+            ShareableLink.document_id,
+            DocumentView.id,
+            DocumentView.link_id,
+            DocumentView.started_at,
+            DocumentView.duration_seconds,
+            DocumentView.max_page_reached,
+            DocumentView.total_page_views,
+            Viewer.email  # The registered viewer, as the live COUNT(DISTINCT viewer_id) counts them
+        ).join(ShareableLink, DocumentView.link_id == ShareableLink.id).outerjoin(
+            Viewer, DocumentView.viewer_id == Viewer.id
+        ).filter(
+            DocumentView.started_at < cutoff
+        ).order_by(ShareableLink.document_id, DocumentView.started_at).yield_per(batch_size)
+
+        archived_ids = []
+        group_key = None
+        columns = None
+
+        def flush():
+            if group_key and columns['id']:
+                ViewArchive._write(ViewArchive.get_path(*group_key), columns)
+                archived_ids.extend(columns['id'])
+
+        for document_id, view_id, link_id, started_at, duration, max_page, page_views, email in rows:
+            key = (document_id, month_start(started_at))
+            if key != group_key:
+                flush()
+                group_key = key
+                columns = {name: [] for name in ARCHIVE_COLUMNS}
+
+            columns['id'].append(view_id)
+            columns['link_id'].append(link_id)
+            columns['started_at'].append(to_unix(started_at))
+            columns['duration_seconds'].append(duration or 0)
+            columns['max_page_reached'].append(max_page or 0)
+            columns['total_page_views'].append(page_views or 0)
+            columns['viewer_hash'].append(email_hash(email))
+
+        flush()
+
+        # Rows are only deleted once every file is written; reruns skip ids already archived
+        for i in range(0, len(archived_ids), batch_size):
+            chunk = archived_ids[i:i + batch_size]
+            DocumentView.query.filter(DocumentView.id.in_(chunk)).delete(synchronize_session=False)
+            db.session.commit()
+
+        return len(archived_ids)
+
+    @staticmethod
+    def aggregate(document_id, link_id=None, since=None, until=None):
+        """
+        Vectorized aggregates over archived sessions of a document
+        Returns: dict with view_count, duration_total, duration_samples, viewer_hashes
+        """
+        result = {
+            'view_count': 0,
+            'duration_total': 0,
+            'duration_samples': 0,
+            'viewer_hashes': np.empty(0, dtype=np.uint64)
+        }
+
+        directory = os.path.join(ViewArchive.get_root(), str(document_id))
+        if not os.path.isdir(directory):
+            return result
+
+        first = month_start(since) if since else None
+        paths = []
+        for filename in sorted(os.listdir(directory)):
+            # Leftover temp files from an interrupted rewrite are not months
+            if not filename.endswith('.npz') or filename.endswith('.tmp.npz'):
+                continue
+            period = datetime.strptime(filename[:-4], '%Y-%m')
+            # Skip whole months outside the requested window
+            if first and add_months(period, 1) <= first:
+                continue
+            if until and period >= until:
+                continue
+            paths.append(os.path.join(directory, filename))
+
+        if not paths:
+            return result
+
+        needed = ('link_id', 'started_at', 'duration_seconds', 'viewer_hash')
+        loaded = [ViewArchive.load(path, needed) for path in paths]
+        columns = {name: np.concatenate([part[name] for part in loaded]) for name in needed}
+
+        mask = np.ones(len(columns['started_at']), dtype=bool)
+        if link_id is not None:
+            mask &= columns['link_id'] == link_id
+        if since is not None:
+            mask &= columns['started_at'] >= to_unix(since)
+        if until is not None:
+            mask &= columns['started_at'] < to_unix(until)
+
+        durations = columns['duration_seconds'][mask]
+        hashes = columns['viewer_hash'][mask]
+
+        result['view_count'] = int(mask.sum())
+        result['duration_total'] = int(durations[durations > 0].sum(dtype=np.int64))
+        result['duration_samples'] = int((durations > 0).sum())
+        result['viewer_hashes'] = np.unique(hashes[hashes != 0])
+        return result
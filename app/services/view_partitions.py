@@ -0,0 +1,243 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, text
+from app import db
+from app.models.analytics import DocumentView, DocumentViewRollup
+from app.models.viewer import Viewer
+
+VIEWS_TABLE = 'document_views'
+
+def month_start(value):
+    """Truncate a datetime to the first instant of its month"""
+    return datetime(value.year, value.month, 1)
+
+def add_months(value, months):
+    """Shift a month-start datetime by a number of months"""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+class ViewPartitionManager:
+    """Service for monthly partitioning and retention of document_views
+
+    On PostgreSQL the table is natively partitioned by RANGE (started_at).
+    Other backends (SQLite in development and tests) keep a single table and
+    the same operations fall back to range DELETEs.
+    """
+
+    @staticmethod
+    def is_postgres():
+        return db.engine.dialect.name == 'postgresql'
+
+    @staticmethod
+    def partition_name(period_start):
+        return f'{VIEWS_TABLE}_y{period_start.year}m{period_start.month:02d}'
+
+    @staticmethod
+    def partition_period(name):
+        """Parse the month a partition covers from its name (None for the default partition)"""
+        try:
+            return datetime.strptime(name[len(VIEWS_TABLE) + 1:], 'y%Ym%m')
+        except ValueError:
+            return None
+
+    @staticmethod
+    def is_partitioned():
+        """Check whether document_views is a native partitioned table"""
+        if not ViewPartitionManager.is_postgres():
+            return False
+
+        return db.session.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name)"
+        ), {'name': VIEWS_TABLE}).scalar()
+
+    @staticmethod
+    def existing_partitions():
+        """
+        List monthly partitions attached to document_views
+        Returns: sorted list of partition table names
+        """
+        if not ViewPartitionManager.is_partitioned():
+            return []
+
+        rows = db.session.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name ORDER BY c.relname"
+        ), {'name': VIEWS_TABLE}).all()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def convert_to_partitioned():
+        """
+        Rebuild a plain document_views table as a partitioned table
+        Returns: True if the table was converted
+        """
+        if not ViewPartitionManager.is_postgres() or ViewPartitionManager.is_partitioned():
+            return False
+
+        oldest = db.session.query(func.min(DocumentView.started_at)).scalar()
+        first_month = month_start(oldest or datetime.utcnow())
+
+        statements = [
+            f"ALTER TABLE {VIEWS_TABLE} RENAME TO {VIEWS_TABLE}_legacy",
+            f"ALTER SEQUENCE {VIEWS_TABLE}_id_seq OWNED BY NONE",
+            f"CREATE TABLE {VIEWS_TABLE} (LIKE {VIEWS_TABLE}_legacy INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (started_at)",
+            # Unique constraints on a partitioned table must include the partition key
+            f"ALTER TABLE {VIEWS_TABLE} ADD PRIMARY KEY (id, started_at)",
+            f"ALTER TABLE {VIEWS_TABLE} ADD CONSTRAINT uq_{VIEWS_TABLE}_session "
+            f"UNIQUE (session_id, started_at)",
+            f"CREATE TABLE {VIEWS_TABLE}_default PARTITION OF {VIEWS_TABLE} DEFAULT",
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+
+        ViewPartitionManager._create_range(first_month, current_app.config['VIEW_PARTITION_MONTHS_AHEAD'])
+
+        statements = [
+            f"INSERT INTO {VIEWS_TABLE} SELECT * FROM {VIEWS_TABLE}_legacy",
+            f"DROP TABLE {VIEWS_TABLE}_legacy",
+            f"ALTER SEQUENCE {VIEWS_TABLE}_id_seq OWNED BY {VIEWS_TABLE}.id",
+            f"ALTER TABLE {VIEWS_TABLE} ADD CONSTRAINT {VIEWS_TABLE}_link_id_fkey "
+            f"FOREIGN KEY (link_id) REFERENCES shareable_links (id) ON DELETE CASCADE",
+            f"ALTER TABLE {VIEWS_TABLE} ADD CONSTRAINT {VIEWS_TABLE}_viewer_id_fkey "
+            f"FOREIGN KEY (viewer_id) REFERENCES viewers (id) ON DELETE SET NULL",
+            f"CREATE INDEX ix_{VIEWS_TABLE}_link_started ON {VIEWS_TABLE} (link_id, started_at)",
+            f"CREATE INDEX ix_{VIEWS_TABLE}_link_viewer ON {VIEWS_TABLE} (link_id, viewer_id, started_at) "
+            f"WHERE viewer_id IS NOT NULL",
+            f"CREATE INDEX ix_{VIEWS_TABLE}_open ON {VIEWS_TABLE} (started_at) WHERE ended_at IS NULL",
+            f"CREATE INDEX ix_{VIEWS_TABLE}_geo_pending ON {VIEWS_TABLE} (id) WHERE country IS NULL",
+            f"CREATE INDEX ix_{VIEWS_TABLE}_viewer_email ON {VIEWS_TABLE} (viewer_email)",
+            f"CREATE INDEX ix_{VIEWS_TABLE}_started_at ON {VIEWS_TABLE} (started_at)",
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def _create_range(first_month, months_ahead):
+        """Create missing monthly partitions from first_month up to months_ahead from now"""
+        existing = set(ViewPartitionManager.existing_partitions())
+        last_month = add_months(month_start(datetime.utcnow()), months_ahead)
+
+        created = []
+        period = first_month
+        while period <= last_month:
+            name = ViewPartitionManager.partition_name(period)
+            if name not in existing:
+                db.session.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {VIEWS_TABLE} "
+                    f"FOR VALUES FROM ('{period:%Y-%m-%d}') TO ('{add_months(period, 1):%Y-%m-%d}')"
+                ))
+                created.append(name)
+            period = add_months(period, 1)
+
+        return created
+
+    @staticmethod
+    def create_future_partitions(months_ahead=None):
+        """
+        Create partitions for the current month and the next months_ahead months
+        Returns: list of created partition names (empty on non-partitioned backends)
+        """
+        if not ViewPartitionManager.is_partitioned():
+            return []
+
+        if months_ahead is None:
+            months_ahead = current_app.config['VIEW_PARTITION_MONTHS_AHEAD']
+
+        created = ViewPartitionManager._create_range(month_start(datetime.utcnow()), months_ahead)
+        db.session.commit()
+        return created
+
+    @staticmethod
+    def compact_month(period_start):
+        """
+        Fold one month of raw sessions into DocumentViewRollup and purge them
+        Returns: number of sessions compacted
+        """
+        period_end = add_months(period_start, 1)
+        in_period = (
+            DocumentView.started_at >= period_start,
+            DocumentView.started_at < period_end
+        )
+
+        rows = db.session.query(
+            DocumentView.link_id,
+            func.count(DocumentView.id),
+            func.count(func.distinct(DocumentView.viewer_id)),
+            func.sum(DocumentView.duration_seconds).filter(DocumentView.duration_seconds > 0),
+            func.count(DocumentView.id).filter(DocumentView.duration_seconds > 0)
+        ).filter(*in_period).group_by(DocumentView.link_id).all()
+
+        # Viewer hashes per link, so distinct counts can be combined across months
+        from app.services.view_archive import email_hash, pack_hashes, unpack_hashes
+        viewer_hashes = {}
+        for link_id, email in db.session.query(DocumentView.link_id, Viewer.email).join(
+            Viewer, DocumentView.viewer_id == Viewer.id
+        ).filter(*in_period).distinct():
+            viewer_hashes.setdefault(link_id, set()).add(email_hash(email))
+
+        compacted = 0
+        for link_id, views, unique_viewers, duration_total, duration_samples in rows:
+            rollup = DocumentViewRollup.query.filter_by(link_id=link_id, period_start=period_start).first()
+            if not rollup:
+                rollup = DocumentViewRollup(link_id=link_id, period_start=period_start, view_count=0,
+                                            unique_viewers=0, viewer_hashes=b'', duration_total=0,
+                                            duration_samples=0)
+                db.session.add(rollup)
+
+            rollup.view_count += views
+            if rollup.viewer_hashes is None and rollup.unique_viewers:
+                # Compacted before viewer hashes were kept: the count stays an estimate
+                rollup.unique_viewers += unique_viewers
+            else:
+                hashes = list(unpack_hashes(rollup.viewer_hashes)) + list(viewer_hashes.get(link_id, ()))
+                rollup.viewer_hashes = pack_hashes(hashes)
+                rollup.unique_viewers = len(rollup.viewer_hashes) // 8
+            rollup.duration_total += duration_total or 0
+            rollup.duration_samples += duration_samples
+            compacted += views
+
+        name = ViewPartitionManager.partition_name(period_start)
+        if name in ViewPartitionManager.existing_partitions():
+            db.session.execute(text(f"ALTER TABLE {VIEWS_TABLE} DETACH PARTITION {name}"))
+            db.session.execute(text(f"DROP TABLE {name}"))
+        else:
+            DocumentView.query.filter(*in_period).delete(synchronize_session=False)
+
+        db.session.commit()
+        return compacted
+
+    @staticmethod
+    def apply_retention(keep_months=None):
+        """
+        Compact every month older than the retention window
+        Returns: dict of {period_start: sessions compacted}
+        """
+        if keep_months is None:
+            keep_months = current_app.config['VIEW_RETENTION_MONTHS']
+
+        cutoff = add_months(month_start(datetime.utcnow()), -keep_months)
+        oldest = db.session.query(func.min(DocumentView.started_at)).filter(
+            DocumentView.started_at < cutoff
+        ).scalar()
+
+        # Empty partitions older than the oldest row are dropped as well
+        periods = [month_start(oldest)] if oldest else []
+        for name in ViewPartitionManager.existing_partitions():
+            period = ViewPartitionManager.partition_period(name)
+            if period and period < cutoff:
+                periods.append(period)
+
+        results = {}
+        period = min(periods) if periods else cutoff
+        while period < cutoff:
+            results[period] = ViewPartitionManager.compact_month(period)
+            period = add_months(period, 1)
+
+        return results
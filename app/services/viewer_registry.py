@@ -0,0 +1,70 @@
+from datetime import datetime
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models.document import Document
+from app.models.link import ShareableLink
+from app.models.viewer import Viewer
+
+class ViewerRegistry:
+    """Service for the deduplicated viewer identities behind captured emails
+
+    Each owner has one Viewer row per normalized email. Every visit upserts
+    it with INSERT ... ON CONFLICT, so concurrent visits from the same person
+    update first_seen_at/last_seen_at/visit_count in place instead of adding
+    rows. Sessions and captured emails carry the viewer's integer id, which
+    the unique-viewer counts use instead of the free-text email.
+    """
+
+    @staticmethod
+    def normalize_email(email):
+        """
+        Canonical form of an email for matching viewers
+        Returns: trimmed, lowercased email, or None if empty
+        """
+        email = email.strip().lower() if isinstance(email, str) else ''
+        return email or None
+
+    @staticmethod
+    def upsert_statement(dialect_name, link_id, email, full_name=None, company=None, seen_at=None):
+        """
+        Build the upsert recording one visit through a link (also run by the ASGI tracking app)
+        The owner is resolved from the link in the same statement.
+        Returns: INSERT statement returning the viewer id (no row if the link does not exist)
+        """
+        insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+        seen_at = seen_at or datetime.utcnow()
+
+        owner = select(
+            Document.user_id,
+            literal(ViewerRegistry.normalize_email(email)),
+            literal(full_name, Viewer.full_name.type),
+            literal(company, Viewer.company.type),
+            literal(seen_at, Viewer.first_seen_at.type),
+            literal(seen_at, Viewer.last_seen_at.type),
+            literal(1),
+        ).join(ShareableLink, ShareableLink.document_id == Document.id).where(ShareableLink.id == link_id)
+
+        statement = insert(Viewer).from_select(
+            ['owner_id', 'email', 'full_name', 'company', 'first_seen_at', 'last_seen_at', 'visit_count'], owner
+        )
+        return statement.on_conflict_do_update(
+            index_elements=['owner_id', 'email'],
+            set_={
+                'last_seen_at': statement.excluded.last_seen_at,
+                'visit_count': Viewer.visit_count + 1,
+                'full_name': func.coalesce(statement.excluded.full_name, Viewer.full_name),
+                'company': func.coalesce(statement.excluded.company, Viewer.company),
+            }
+        ).returning(Viewer.id)
+
+    @staticmethod
+    def record_visit(link_id, email, full_name=None, company=None):
+        """
+        Upsert the viewer for a visit in the current transaction (the caller commits)
+        Returns: viewer id, or None without an email or link
+        """
+        if not ViewerRegistry.normalize_email(email):
+            return None
+        statement = ViewerRegistry.upsert_statement(db.engine.dialect.name, link_id, email, full_name, company)
+        return db.session.execute(statement).scalar()
@@ -0,0 +1,354 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import zlib
+from io import BytesIO
+from flask import current_app
+from app.services.metrics import Metrics
+
+XOBJECT_NAME = '/DoconeWatermark'
+FORM_SIZE = 1000  # The stamp is drawn in a FORM_SIZE square scaled onto each page
+COPY_CHUNK = 1024 * 1024
+CACHE_FORMAT = 2  # Part of cached file names, bumped when the stamped layout changes
+
+class Watermarker:
+    """Service for stamping the viewer's identity onto every page of a PDF
+
+    Stamped files are complete rewrites, never incremental updates: the
+    original bytes (and any earlier revisions they carry) are not part of
+    the output. Each page's content streams are merged into one stream that
+    ends by drawing a Form XObject holding the viewer's text. Everything but
+    that XObject is the same for every viewer, so it is built once per
+    document (the overlay) and cached on disk next to the stamped outputs.
+    Stamping for a new viewer is a chunked copy of the cached body plus a
+    few kilobytes, whatever the page count; the body is never held in memory.
+    """
+
+    _digests = {}
+    _digest_lock = threading.Lock()
+    _cache_bytes = None
+    _cache_lock = threading.Lock()
+
+    @staticmethod
+    def _cache_dir(*parts):
+        return os.path.join(current_app.config['WATERMARK_CACHE_DIR'], *parts)
+
+    @staticmethod
+    def digest(pdf_path):
+        """
+        SHA-256 of a file, memoized per (path, size, mtime)
+        Returns: hex digest
+        """
+        stat = os.stat(pdf_path)
+        key = (pdf_path, stat.st_size, stat.st_mtime_ns)
+        digest = Watermarker._digests.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            with Watermarker._digest_lock:
+                if len(Watermarker._digests) > 10000:
+                    Watermarker._digests.clear()
+                Watermarker._digests[key] = digest
+        return digest
+
+    @staticmethod
+    def viewer_text(email, fallback):
+        """Text stamped for a viewer: the captured email, else the fallback (e.g. the client IP)"""
+        return (email or '').strip().lower() or fallback
+
+    @staticmethod
+    def stamped_path(pdf_path, text):
+        """
+        Path of pdf_path stamped with text, building it (and the document overlay) on a cache miss
+        Returns: absolute file path (raises ValueError for PDFs that cannot be stamped)
+        """
+        digest = Watermarker.digest(pdf_path)
+        text_key = hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+        output_path = Watermarker._cache_dir('stamped', digest[:2], f'{digest}-{text_key}-v{CACHE_FORMAT}.pdf')
+
+        if os.path.exists(output_path):
+            Metrics.cache_lookup('watermark', True)
+            os.utime(output_path)  # Recency for eviction
+            return output_path
+
+        Metrics.cache_lookup('watermark', False)
+        with Metrics.timer('docone_watermark_seconds'):
+            overlay, body_path = Watermarker.overlay(pdf_path, digest)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tmp_path = f'{output_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            Watermarker.write_stamped(overlay, body_path, text, tmp_path)
+            os.replace(tmp_path, output_path)
+
+        Watermarker._account(os.path.getsize(output_path))
+        return output_path
+
+    @staticmethod
+    def overlay(pdf_path, digest):
+        """
+        Load the cached overlay of a document, building it on first use
+        Returns: (metadata dict, path of the body file)
+        """
+        meta_path = Watermarker._cache_dir('overlays', f'{digest}-v{CACHE_FORMAT}.json')
+        body_path = Watermarker._cache_dir('overlays', f'{digest}-v{CACHE_FORMAT}.bin')
+        try:
+            with open(meta_path) as f:
+                overlay = json.load(f)
+            # A body cut short (e.g. a full disk) is rebuilt rather than served
+            if os.path.getsize(body_path) == overlay.get('length'):
+                return overlay, body_path
+        except (OSError, ValueError):
+            pass
+
+        # The body goes straight to disk; the metadata is written last so a reader never sees it without its body
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(body_path + suffix, 'wb') as f:
+                overlay = Watermarker.build_overlay(pdf_path, f)
+        except BaseException:
+            if os.path.exists(body_path + suffix):
+                os.remove(body_path + suffix)
+            raise
+        os.replace(body_path + suffix, body_path)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(overlay, f)
+        os.replace(meta_path + suffix, meta_path)
+        return overlay, body_path
+
+    @staticmethod
+    def build_overlay(pdf_path, body):
+        """
+        Write the viewer-independent part of a stamped file to the binary
+        file object body, from the header up to the XObject: every object
+        reachable from the catalog, with each page's content streams merged
+        into one stream wrapped in q/Q that ends by drawing the watermark
+        XObject, plus the font and graphics state the XObject needs
+        Returns: metadata dict (offsets are relative to where body started)
+        """
+        from PyPDF2 import PdfReader
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+        reader = PdfReader(pdf_path)
+        if reader.is_encrypted:
+            raise ValueError('Encrypted PDFs cannot be watermarked')
+
+        next_number = int(reader.trailer['/Size'])
+        numbers = {}
+        for name in ('xobject', 'font', 'state'):
+            numbers[name] = next_number
+            next_number += 1
+
+        # object number -> (generation, PdfObject or serialized bytes)
+        replaced = {
+            numbers['font']: (0, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold '
+                                 b'/Encoding /WinAnsiEncoding >>'),
+            numbers['state']: (0, b'<< /Type /ExtGState /ca 0.18 /CA 0.18 >>'),
+        }
+
+        # A resource name no page uses yet (a PDF may already carry an earlier stamp)
+        used = set()
+        for page in reader.pages:
+            used.update((page.get('/Resources') or {}).get('/XObject') or {})
+        name = XOBJECT_NAME
+        suffix = 1
+        while name in used:
+            name = f'{XOBJECT_NAME}{suffix}'
+            suffix += 1
+
+        xobject_ref = IndirectObject(numbers['xobject'], 0, reader)
+        for page in reader.pages:
+            reference = page.indirect_ref
+            box = page.cropbox
+            left, bottom = float(box.left), float(box.bottom)
+            width, height = float(box.width), float(box.height)
+            scale = min(width, height) / FORM_SIZE
+            operators = (f'q {scale:.5f} 0 0 {scale:.5f} {left + (width - FORM_SIZE * scale) / 2:.2f} '
+                         f'{bottom + (height - FORM_SIZE * scale) / 2:.2f} cm {name} Do Q')
+
+            contents = page.raw_get('/Contents') if '/Contents' in page else None
+            contents = contents.get_object() if contents is not None else None
+            if contents is None:
+                streams = []
+            elif isinstance(contents, ArrayObject):
+                streams = [stream.get_object() for stream in contents]
+            else:
+                streams = [contents]
+            data = b'q\n' + b'\n'.join(stream.get_data() for stream in streams) + b'\nQ\n' + operators.encode()
+
+            # One stream per page, so the stamp cannot be dropped by editing the /Contents array
+            content_number = next_number
+            next_number += 1
+            replaced[content_number] = (0, Watermarker._stream(zlib.compress(data), ' /Filter /FlateDecode'))
+
+            resources = DictionaryObject(page.get('/Resources') or {})
+            xobjects = DictionaryObject(resources.get('/XObject') or {})
+            xobjects[NameObject(name)] = xobject_ref
+            resources[NameObject('/XObject')] = xobjects
+
+            stamped_page = DictionaryObject(page)
+            stamped_page[NameObject('/Contents')] = IndirectObject(content_number, 0, reader)
+            stamped_page[NameObject('/Resources')] = resources
+            replaced[reference.idnum] = (reference.generation, stamped_page)
+
+        # Only live objects are written: earlier revisions and the original page contents are dropped
+        objects = {number: entry for number, entry in replaced.items() if isinstance(entry[1], bytes)}
+        pending = [reader.trailer.raw_get(key) for key in ('/Root', '/Info') if key in reader.trailer]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, IndirectObject):
+                number = item.idnum
+                if number in objects or number == numbers['xobject']:
+                    continue
+                generation, item = replaced.get(number) or (item.generation, item.get_object())
+                if item is None:
+                    continue
+                objects[number] = (generation, item)
+            if isinstance(item, DictionaryObject):
+                pending.extend(item.values())
+            elif isinstance(item, ArrayObject):
+                pending.extend(item)
+
+        header = max(reader.pdf_header, '%PDF-1.4')  # The stamp's transparency needs 1.4
+        start = body.tell()
+        body.write(header.encode('latin-1') + b'\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number in sorted(objects):
+            generation, obj = objects[number]
+            offsets.append((number, generation, body.tell() - start))
+            body.write(f'{number} {generation} obj\n'.encode())
+            if isinstance(obj, bytes):
+                body.write(obj)
+            else:
+                obj.write_to_stream(body, None)
+            body.write(b'\nendobj\n')
+
+        trailer = ''
+        for key in ('/Root', '/Info', '/ID'):
+            if key in reader.trailer:
+                buffer = BytesIO()
+                reader.trailer.raw_get(key).write_to_stream(buffer, None)
+                trailer += f' {key} ' + buffer.getvalue().decode('latin-1')
+
+        overlay = {
+            'size': next_number,
+            'xobject': numbers['xobject'],
+            'font': numbers['font'],
+            'state': numbers['state'],
+            'offsets': offsets,
+            'trailer': trailer,
+            'pages': len(reader.pages),
+            'length': body.tell() - start,
+        }
+        return overlay
+
+    @staticmethod
+    def write_stamped(overlay, body_path, text, output_path):
+        """Write a complete PDF: the overlay body, this viewer's XObject and a single cross-reference table"""
+        with open(output_path, 'wb') as out:
+            with open(body_path, 'rb') as body:
+                shutil.copyfileobj(body, out, COPY_CHUNK)
+            entries = list(overlay['offsets'])
+            entries.append((overlay['xobject'], 0, out.tell()))
+            out.write(f"{overlay['xobject']} 0 obj\n".encode())
+            out.write(Watermarker._xobject(text, overlay['font'], overlay['state']))
+            out.write(b'\nendobj\n')
+
+            xref_offset = out.tell()
+            out.write(Watermarker._xref(entries, overlay['size']))
+            out.write(f"trailer\n<< /Size {overlay['size']}{overlay['trailer']} >>\n"
+                      f"startxref\n{xref_offset}\n%%EOF\n".encode('latin-1'))
+
+    @staticmethod
+    def _stream(data, entries=''):
+        return f'<<{entries} /Length {len(data)} >>\nstream\n'.encode() + data + b'\nendstream'
+
+    @staticmethod
+    def _xobject(text, font_number, state_number):
+        """Form XObject drawing text three times along the diagonal of the FORM_SIZE square"""
+        encoded = text.encode('cp1252', 'replace')
+        escaped = encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        diagonal = FORM_SIZE * math.sqrt(2) * 0.8
+        font_size = max(12.0, min(60.0, diagonal / (0.6 * max(len(encoded), 1))))
+        width = 0.6 * font_size * len(encoded)
+        c = s = math.sqrt(0.5)
+
+        lines = []
+        for shift in (-FORM_SIZE * 0.3, 0.0, FORM_SIZE * 0.3):
+            # Centre of the line, moved perpendicular to the diagonal
+            cx = FORM_SIZE / 2 - shift * s
+            cy = FORM_SIZE / 2 + shift * c
+            x = cx - width / 2 * c + font_size / 3 * s
+            y = cy - width / 2 * s - font_size / 3 * c
+            lines.append(f'{c:.4f} {s:.4f} {-s:.4f} {c:.4f} {x:.2f} {y:.2f} Tm '.encode() + b'(' + escaped + b') Tj')
+
+        content = (f'q /GS0 gs 0.35 g BT /F1 {font_size:.1f} Tf '.encode() + b' '.join(lines) + b' ET Q')
+        entries = (f' /Type /XObject /Subtype /Form /BBox [0 0 {FORM_SIZE} {FORM_SIZE}]'
+                   f' /Resources << /Font << /F1 {font_number} 0 R >> /ExtGState << /GS0 {state_number} 0 R >> >>')
+        return Watermarker._stream(content, entries)
+
+    @staticmethod
+    def _xref(entries, size):
+        """Cross-reference table for objects 0 to size - 1, numbers without an entry marked free"""
+        offsets = {number: (generation, offset) for number, generation, offset in entries}
+        out = [f'xref\n0 {size}\n'.encode()]
+        for number in range(size):
+            if number in offsets:
+                generation, offset = offsets[number]
+                out.append(f'{offset:010d} {generation:05d} n\r\n'.encode())
+            else:
+                out.append(b'0000000000 65535 f\r\n')
+        return b''.join(out)
+
+    @staticmethod
+    def _account(added_bytes):
+        """Track the size of stamped outputs and evict the least recently used above the limit"""
+        limit = current_app.config['WATERMARK_CACHE_MAX_BYTES']
+        with Watermarker._cache_lock:
+            if Watermarker._cache_bytes is None:
+                Watermarker._cache_bytes = sum(size for _, size, _ in Watermarker._stamped_files())
+            else:
+                Watermarker._cache_bytes += added_bytes
+            if Watermarker._cache_bytes <= limit:
+                return
+
+            # Other workers write to the same directory, so recount before evicting
+            files = sorted(Watermarker._stamped_files(), key=lambda item: item[2])
+            total = sum(size for _, size, _ in files)
+            target = limit * 0.9
+            for path, size, _ in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            Watermarker._cache_bytes = total
+
+    @staticmethod
+    def _stamped_files():
+        """
+        List stamped outputs
+        Returns: list of (path, size, mtime)
+        """
+        files = []
+        root = Watermarker._cache_dir('stamped')
+        if not os.path.isdir(root):
+            return files
+        for shard in os.scandir(root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
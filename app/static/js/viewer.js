@@ -13,12 +13,21 @@ let viewerData = null;
 let sessionId = null;
 let linkCode = null;
 let csrfToken = null;
+let startToken = null;  // Set when the session starts only after this script confirms the view
 let startTime = null;
 let pageStartTime = null;
 let pagesViewed = new Set();
 let currentPage = 1;
 let totalPages = 0;
 
+// Tracking protocol v2: page entries are queued and sent as deltas, each
+// batch with an increasing sequence number the server applies idempotently
+const TRACKING_PROTOCOL = 2;
+let pendingEvents = [];  // [page, ms since start] entries not sent yet
+let inFlight = null;     // Batch awaiting the server: {seq, events}
+let batchSeq = 0;
+let finalSent = false;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize viewer
     canvas = document.getElementById('pdfCanvas');
@@ -37,6 +46,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         totalPages = parseInt(dataEl.dataset.pageCount) || 0;
         csrfToken = dataEl.dataset.csrfToken;
+        startToken = dataEl.dataset.startToken || null;
 
         startTime = Date.now();
         pageStartTime = Date.now();
@@ -58,6 +68,11 @@ document.addEventListener('DOMContentLoaded', function() {
         // Track first page view
         trackPageView(pageNum);
 
+        // Link previews and scanners never get this far, so the view is only recorded now
+        if (!sessionId && startToken) {
+            startSession();
+        }
+
         // Start heartbeat for analytics
         startAnalyticsHeartbeat();
     }, function(reason) {
@@ -71,10 +86,21 @@ document.addEventListener('DOMContentLoaded', function() {
     // Track page visibility changes
     document.addEventListener('visibilitychange', handleVisibilityChange);
 
-    // Send final analytics on page unload
-    window.addEventListener('beforeunload', function() {
+    // Send final analytics when the page goes away. Not on beforeunload: clicking the download
+    // link fires it while the page stays open, and the closed session would drop later heartbeats.
+    // Hiding the tab already flushes a non-final batch (handleVisibilityChange).
+    window.addEventListener('pagehide', function() {
         sendAnalyticsUpdate(true);
     });
+
+    // A page restored from the back/forward cache resumes its session: sequence numbers keep
+    // increasing, so the server reopens it on the next batch
+    window.addEventListener('pageshow', function(event) {
+        if (event.persisted) {
+            finalSent = false;
+            pageStartTime = Date.now();
+        }
+    });
 });
 
 function renderPage(num) {
@@ -138,10 +164,37 @@ function onNextPage() {
 }
 
 function trackPageView(page) {
-    pagesViewed.add(page);
+    // Only first visits change server state, so revisits are not queued
+    if (!pagesViewed.has(page)) {
+        pagesViewed.add(page);
+        pendingEvents.push([page, Date.now() - startTime]);
+    }
     pageStartTime = Date.now();
 }
 
+function startSession() {
+    // The token opens the one session the page reserved; a repeated call gets that same session
+    fetch('/api/track/start', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken
+        },
+        body: JSON.stringify({token: startToken})
+    }).then(function(response) {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
+    }).then(function(data) {
+        // Page entries queued until now go out with the first heartbeat
+        sessionId = data.session_id;
+        startToken = null;
+    }).catch(function(err) {
+        console.error('View confirmation error:', err);
+    });
+}
+
 function startAnalyticsHeartbeat() {
     // Send update every 5 seconds
     setInterval(function() {
@@ -154,37 +207,72 @@ function startAnalyticsHeartbeat() {
 function sendAnalyticsUpdate(isFinal) {
     // Only send analytics if we have a valid session ID
     if (!sessionId || sessionId === 'None' || sessionId === 'null') {
-        console.warn('No valid session ID for analytics tracking');
+        if (!startToken) {
+            console.warn('No valid session ID for analytics tracking');
+        }
+        return;
+    }
+    if (finalSent) {
+        return;
+    }
+    // One heartbeat in flight at a time; new entries keep queueing meanwhile
+    if (inFlight && !isFinal) {
         return;
     }
 
-    const duration = Math.floor((Date.now() - startTime) / 1000);
-
-    const data = {
-        session_id: sessionId,
-        current_page: currentPage,
-        pages_viewed: Array.from(pagesViewed),
-        duration_seconds: duration,
-        is_final: isFinal
+    // The final beacon may overtake an unacknowledged batch, so it repeats its events
+    const events = (isFinal && inFlight) ? inFlight.events.concat(pendingEvents) : pendingEvents;
+    pendingEvents = [];
+    batchSeq += 1;
+
+    const batch = {
+        v: TRACKING_PROTOCOL,
+        sid: sessionId,
+        seq: batchSeq,
+        ev: events,
+        p: currentPage,
+        d: Math.floor((Date.now() - startTime) / 1000)
     };
 
+    if (isFinal) {
+        batch.f = 1;
+        finalSent = true;
+    }
+
     // Use sendBeacon for final update (more reliable on page unload)
     if (isFinal && navigator.sendBeacon) {
         const formData = new FormData();
         formData.append('csrf_token', csrfToken);
-        formData.append('data', JSON.stringify(data));
+        formData.append('data', JSON.stringify(batch));
         navigator.sendBeacon(`/api/track/view`, formData);
-    } else {
-        // Use fetch for regular updates
-        fetch('/api/track/view', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': csrfToken
-            },
-            body: JSON.stringify(data)
-        }).catch(err => console.error('Analytics error:', err));
+        return;
     }
+
+    const sent = {seq: batchSeq, events: events};
+    inFlight = sent;
+    fetch('/api/track/view', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken
+        },
+        body: JSON.stringify(batch),
+        keepalive: isFinal
+    }).then(function(response) {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        if (inFlight === sent) {
+            inFlight = null;
+        }
+    }).catch(function(err) {
+        // Requeue the entries; the next batch carries them with a new sequence number
+        if (inFlight === sent) {
+            pendingEvents = sent.events.concat(pendingEvents);
+            inFlight = null;
+        }
+        console.error('Analytics error:', err);
+    });
 }
 
 function handleVisibilityChange() {
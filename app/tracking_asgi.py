@@ -0,0 +1,429 @@
+"""Standalone ASGI app for the viewer tracking endpoints.
+
+Heartbeats are by far the most frequent requests DocOne serves, and each one
+is a tiny write. Under the Flask app every heartbeat holds a worker thread
+and a pooled connection for a full round trip to the database. This app
+serves the same /api/track/* URLs on an event loop instead: handlers only
+validate the payload and hand it to a BatchWriter, which coalesces
+heartbeats per session and writes them in one transaction every
+TRACKING_FLUSH_INTERVAL seconds through its own async connection pool.
+
+It shares the models, config classes and heartbeat SQL with the Flask app
+(AnalyticsTracker.heartbeat_statement), so both paths write identical rows.
+
+Run it next to gunicorn and route /api/track/ to it:
+    uvicorn asgi:app --workers 2 --port 8001
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from io import BytesIO
+from urllib.parse import parse_qs
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from werkzeug.formparser import FormDataParser
+from werkzeug.http import parse_options_header
+from app.config import config
+from app.models import DocumentView, ShareableLink
+from app.services.analytics_tracker import AnalyticsTracker
+from app.services.bot_filter import BotFilter
+from app.services.document_versions import DocumentVersionService
+from app.services.user_cache import REDIS_SCHEMES
+from app.services.viewer_registry import ViewerRegistry
+
+logger = logging.getLogger('docone.tracking')
+
+MAX_BODY_BYTES = 64 * 1024
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+def async_database_url(url):
+    """Swap the sync driver of DATABASE_URL for its asyncio counterpart"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver configured for {backend} databases')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+class BatchWriter:
+    """Coalesces heartbeats per session and flushes them in one transaction
+
+    A session that sends several heartbeats between flushes costs one UPDATE:
+    the newest sequence number and page win, page entries are unioned and
+    duration takes the maximum, which is exactly what applying them one by
+    one would have produced.
+    """
+
+    def __init__(self, engine, batch_max, flush_interval, max_pending, presence=None, presence_ttl=20):
+        self.engine = engine
+        self.batch_max = batch_max
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.presence = presence
+        self.presence_ttl = presence_ttl
+        self.stats = {'queued': 0, 'flushes': 0, 'written': 0, 'missing': 0, 'errors': 0}
+        self._pending = {}
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flush loop and write whatever is still queued"""
+        self._closing = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+        errors = self.stats['errors']
+        while self._pending and self.stats['errors'] == errors:
+            await self.flush()
+
+    def pending(self):
+        return len(self._pending)
+
+    def is_full(self):
+        return len(self._pending) >= self.max_pending
+
+    def add(self, batch):
+        """Queue a parsed heartbeat batch (see AnalyticsTracker.parse_heartbeat_batch)"""
+        self.stats['queued'] += 1
+        self._merge(batch)
+        if len(self._pending) >= self.batch_max:
+            self._wakeup.set()
+
+    def _merge(self, batch):
+        pending = self._pending.get(batch['session_id'])
+        if pending is None:
+            self._pending[batch['session_id']] = dict(batch, entered_pages=list(batch['entered_pages']))
+            return
+
+        if batch['seq'] > pending['seq']:
+            pending['seq'] = batch['seq']
+            if batch['current_page'] is not None:
+                pending['current_page'] = batch['current_page']
+        elif pending['current_page'] is None:
+            pending['current_page'] = batch['current_page']
+        pending['entered_pages'].extend(batch['entered_pages'])
+        if batch['duration_seconds'] is not None:
+            pending['duration_seconds'] = max(pending['duration_seconds'] or 0, batch['duration_seconds'])
+        pending['is_final'] = pending['is_final'] or batch['is_final']
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending and not self._closing:
+                await self.flush()
+                if len(self._pending) < self.batch_max:
+                    break
+
+    async def flush(self):
+        """Write up to batch_max queued sessions in one transaction"""
+        if not self._pending:
+            return
+
+        session_ids = sorted(self._pending)[:self.batch_max]  # Fixed lock order across writers
+        batches = [self._pending.pop(session_id) for session_id in session_ids]
+
+        try:
+            written = await self._write(batches)
+        except Exception:
+            logger.exception('Heartbeat flush of %d sessions failed', len(batches))
+            self.stats['errors'] += 1
+            for batch in batches:
+                if not self.is_full():
+                    self._merge(batch)  # Retried with the next flush
+            return
+
+        self.stats['flushes'] += 1
+        self.stats['written'] += len(written)
+        self.stats['missing'] += len(batches) - len(written)
+
+        if self.presence and written:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._update_presence, written)
+
+    async def _write(self, batches):
+        written = []
+        async with self.engine.begin() as conn:
+            # Sessions with new page entries need their page bitmap merged under a row lock
+            with_pages = [batch['session_id'] for batch in batches if batch['entered_pages']]
+            existing = {}
+            if with_pages:
+                statement = select(DocumentView.session_id, DocumentView.pages_bitmap).where(
+                    DocumentView.session_id.in_(with_pages)
+                ).order_by(DocumentView.session_id)
+                if conn.dialect.name != 'sqlite':
+                    statement = statement.with_for_update()
+                existing = dict((await conn.execute(statement)).all())
+
+            for batch in batches:
+                pages_bitmap = None
+                if batch['session_id'] in existing:
+                    pages_bitmap = AnalyticsTracker.merge_pages(existing[batch['session_id']], batch['entered_pages'])
+
+                current_page = batch['current_page']
+                highest_page = max(batch['entered_pages'] + ([current_page] if current_page else []), default=None)
+                statement = AnalyticsTracker.heartbeat_statement(
+                    batch['session_id'], batch['seq'], current_page=current_page,
+                    duration_seconds=batch['duration_seconds'], highest_page=highest_page,
+                    is_final=batch['is_final'], pages_bitmap=pages_bitmap
+                )
+                row = (await conn.execute(statement)).first()
+                if row is not None:
+                    written.append((row[0], row[1], batch))
+        return written
+
+    def _update_presence(self, written):
+        for link_id, viewer_email, batch in written:
+            if batch['is_final']:
+                self.presence.leave(link_id, batch['session_id'])
+            else:
+                self.presence.touch(link_id, batch['session_id'], viewer_email, batch['current_page'],
+                                    self.presence_ttl)
+
+class TrackingApp:
+    """ASGI app serving POST /api/track/view, POST /api/track/start and GET /api/track/health
+
+    There is no CSRF check here: the unguessable session id issued by the
+    viewer page is what authorizes a heartbeat, and /api/track/start only
+    opens a session with a start token the viewer page signed after the
+    link's gates passed (see AnalyticsTracker.start_token).
+    """
+
+    def __init__(self, config_name='default'):
+        settings = config[config_name]
+        self.config = {key: getattr(settings, key) for key in dir(settings) if key.isupper()}
+        self.engine = None
+        self.writer = None
+        self.routes = {
+            ('POST', '/api/track/view'): self.track_view,
+            ('POST', '/api/track/start'): self.track_start,
+            ('GET', '/api/track/health'): self.health,
+        }
+
+    async def startup(self):
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        database_url = self.config['SQLALCHEMY_DATABASE_URI']
+        if not database_url:
+            raise RuntimeError('DATABASE_URL is not set')
+
+        url = async_database_url(database_url)
+        options = {}
+        if url.get_backend_name() != 'sqlite':
+            options = {'pool_size': self.config['TRACKING_DB_POOL_SIZE'], 'max_overflow': 0,
+                       'pool_recycle': 3600, 'pool_pre_ping': True}
+        self.engine = create_async_engine(url, **options)
+
+        presence = None
+        presence_url = self.config.get('PRESENCE_URL')
+        if presence_url and presence_url.startswith(REDIS_SCHEMES):
+            from app.services.presence import RedisPresenceBackend
+            presence = RedisPresenceBackend(presence_url)
+        elif presence_url != 'database':
+            # 'database' presence reads the session rows written here; memory lives inside gunicorn workers
+            logger.warning("Live presence will not see heartbeats sent to the tracking app: "
+                           "set PRESENCE_URL to a Redis URL or to 'database'")
+
+        self.writer = BatchWriter(
+            self.engine,
+            batch_max=self.config['TRACKING_BATCH_MAX'],
+            flush_interval=self.config['TRACKING_FLUSH_INTERVAL'],
+            max_pending=self.config['TRACKING_MAX_PENDING'],
+            presence=presence,
+            presence_ttl=self.config['PRESENCE_TTL'],
+        )
+        self.writer.start()
+
+    async def shutdown(self):
+        if self.writer:
+            await self.writer.close()
+        if self.engine:
+            await self.engine.dispose()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            known_path = any(path == scope['path'] for _, path in self.routes)
+            await self._respond(send, 405 if known_path else 404, {'error': 'Not found'})
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            await self._respond(send, 413, {'error': 'Request too large'})
+            return
+
+        try:
+            status, payload = await handler(scope, body)
+        except Exception:
+            logger.exception('Error handling %s', scope['path'])
+            status, payload = 500, {'error': 'Internal error'}
+        await self._respond(send, status, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception('Tracking app failed to start')
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def _respond(send, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                        *headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def _header(scope, name):
+        for key, value in scope['headers']:
+            if key == name:
+                return value.decode('latin-1')
+        return ''
+
+    @staticmethod
+    def _parse_json(scope, body):
+        """
+        Decode a JSON body, or the 'data' field of a form post (sendBeacon sends multipart FormData)
+        Returns: dict (raises ValueError when the body is not an object)
+        """
+        mimetype, options = parse_options_header(TrackingApp._header(scope, b'content-type'))
+        if mimetype == 'multipart/form-data':
+            _, form, _ = FormDataParser().parse(BytesIO(body), mimetype, len(body), options)
+            raw = form.get('data', '{}')
+        elif mimetype == 'application/x-www-form-urlencoded':
+            raw = parse_qs(body.decode('utf-8', 'replace')).get('data', ['{}'])[0]
+        else:
+            raw = body
+        data = json.loads(raw or '{}')
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        return data
+
+    async def track_view(self, scope, body):
+        try:
+            data = self._parse_json(scope, body)
+        except ValueError:
+            return 400, {'error': 'Invalid JSON'}
+
+        if data.get('v') != 2:
+            return 400, {'error': 'Tracking protocol v2 required'}
+
+        try:
+            batch = AnalyticsTracker.parse_heartbeat_batch(data)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+
+        if self.writer.is_full():
+            # The client keeps the events queued and retries with its next batch
+            return 503, {'error': 'Busy'}
+
+        self.writer.add(batch)
+        return 202, {'status': 'queued', 'ack': batch['seq']}
+
+    async def track_start(self, scope, body):
+        try:
+            data = self._parse_json(scope, body)
+        except ValueError:
+            return 400, {'error': 'Invalid JSON'}
+
+        # The link, session id and email come from the signed token, never from the request body
+        try:
+            start = AnalyticsTracker.read_start_token(
+                data.get('token'), self.config['SECRET_KEY'], self.config['TRACKING_START_TOKEN_MAX_AGE']
+            )
+        except ValueError as e:
+            return 400, {'error': str(e)}
+
+        # A replayed token gets the session it already opened
+        session_id = start['session_id']
+        async with self.engine.connect() as conn:
+            if (await conn.execute(select(DocumentView.id).where(DocumentView.session_id == session_id))).first():
+                return 200, {'session_id': session_id}
+
+        from sqlalchemy.ext.asyncio import AsyncSession
+
+        link_id = start['link_id']
+        async with AsyncSession(self.engine) as orm_session:
+            link = (await orm_session.execute(
+                select(ShareableLink).options(joinedload(ShareableLink.document), joinedload(ShareableLink.bundle))
+                .where(ShareableLink.id == link_id)
+            )).scalar_one_or_none()
+            if not AnalyticsTracker.accepts_views(link):
+                return 403, {'error': 'Link unavailable'}
+
+        viewer_ip = scope['client'][0] if scope.get('client') else None
+        user_agent = self._header(scope, b'user-agent')
+        bot = BotFilter.classify(user_agent, viewer_ip, self.config)
+        if bot:
+            BotFilter.record(bot)
+            return 403, {'error': 'Automated clients are not tracked'}
+
+        # Written immediately rather than batched, so the session exists before its first heartbeat
+        try:
+            async with self.engine.begin() as conn:
+                viewer_id = None
+                if ViewerRegistry.normalize_email(start['viewer_email']):
+                    viewer_id = (await conn.execute(ViewerRegistry.upsert_statement(
+                        conn.dialect.name, link_id, start['viewer_email'], start['full_name'], start['company']
+                    ))).scalar()
+                await conn.execute(insert(DocumentView).values(
+                    link_id=link_id,
+                    viewer_email=start['viewer_email'],
+                    viewer_id=viewer_id,
+                    document_version=DocumentVersionService.link_version(link_id),
+                    viewer_ip=viewer_ip,
+                    viewer_user_agent=user_agent[:500],
+                    session_id=session_id,
+                ))
+                # Counts against max_views like a session opened when the page renders
+                await conn.execute(update(ShareableLink).where(ShareableLink.id == link_id).values(
+                    view_count=ShareableLink.view_count + 1, last_viewed_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            pass  # A concurrent replay opened it first; nothing of this attempt was written
+        return 200, {'session_id': session_id}
+
+    async def health(self, scope, body):
+        return 200, dict(self.writer.stats, pending=self.writer.pending())
@@ -0,0 +1,80 @@
+"""Idempotent, online DDL helpers for Alembic revisions
+
+Every helper checks the live schema first, so a revision can run against a
+database created by `flask docone init-db` (which already matches the models)
+as well as one that is behind. On PostgreSQL indexes are built and dropped
+CONCURRENTLY; a partitioned table gets the index ON ONLY the parent, then
+built concurrently on each partition and attached.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+def is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+def index_exists(name, table):
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # pg_class also sees indexes on partitioned tables, which the inspector does not
+        return bind.execute(
+            sa.text("SELECT 1 FROM pg_class WHERE relname = :name AND relkind IN ('i', 'I')"), {'name': name}
+        ).first() is not None
+    return name in {index['name'] for index in sa.inspect(bind).get_indexes(table)}
+
+def column_exists(table, column):
+    return column in {existing['name'] for existing in sa.inspect(op.get_bind()).get_columns(table)}
+
+def partitions(table):
+    """Partitions of `table`, or None if it is not partitioned"""
+    if not is_postgres():
+        return None
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT relkind FROM pg_class WHERE relname = :table"), {'table': table}).scalar() != 'p':
+        return None
+    return [row[0] for row in bind.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table ORDER BY child.relname"
+    ), {'table': table})]
+
+def add_column(table, column):
+    if not column_exists(table, column.name):
+        op.add_column(table, column)
+
+def create_index(name, table, columns, where=None, unique=False):
+    """Create an index (optionally partial) unless it exists, without blocking writes on PostgreSQL"""
+    if index_exists(name, table):
+        return
+
+    if not is_postgres():
+        op.create_index(name, table, columns, unique=unique, sqlite_where=sa.text(where) if where else None)
+        return
+
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    predicate = f' WHERE {where}' if where else ''
+    column_list = ', '.join(columns)
+    children = partitions(table)
+    if children is None:
+        with op.get_context().autocommit_block():
+            op.execute(f'CREATE {kind} CONCURRENTLY {name} ON {table} ({column_list}){predicate}')
+        return
+
+    # The parent index stays invalid until every partition has one attached
+    op.execute(f'CREATE {kind} {name} ON ONLY {table} ({column_list}){predicate}')
+    suffix = name[len(f'ix_{table}_'):] if name.startswith(f'ix_{table}_') else name
+    for partition in children:
+        partition_index = f'{partition}_{suffix}'
+        with op.get_context().autocommit_block():
+            op.execute(f'CREATE {kind} CONCURRENTLY IF NOT EXISTS {partition_index} '
+                       f'ON {partition} ({column_list}){predicate}')
+        op.execute(f'ALTER INDEX {name} ATTACH PARTITION {partition_index}')
+
+def drop_index(name, table):
+    if not index_exists(name, table):
+        return
+    if is_postgres() and partitions(table) is None:
+        with op.get_context().autocommit_block():
+            op.execute(f'DROP INDEX CONCURRENTLY {name}')
+    else:
+        op.drop_index(name, table_name=table)
@@ -1,8 +1,9 @@
 import re
-from email_validator import validate_email, EmailNotValidError
 
 def is_valid_email(email):
     """Validate email address format"""
+    from email_validator import validate_email, EmailNotValidError
+
     try:
         valid = validate_email(email)
         return True, valid.email
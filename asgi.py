@@ -0,0 +1,5 @@
+import os
+from app.tracking_asgi import TrackingApp
+
+# Tracking endpoints only (uvicorn asgi:app); everything else is served by run:app
+app = TrackingApp(os.environ.get('FLASK_ENV', 'development'))
@@ -0,0 +1,134 @@
+"""Streaming ZIP download of a data room bundle.
+
+Seeds --documents files of --mb-per-document MB each in one bundle, then
+downloads it through the real /b/<code>/download route:
+
+  - time to first byte on the first download (which computes the CRC-32 of
+    documents uploaded before bundles existed) and on later ones
+  - throughput of a full download
+  - peak resident memory (VmHWM) growth across the download, which should
+    stay flat however large the bundle is
+  - a download cut off halfway and resumed with Range/If-Range, checked
+    byte for byte against the full archive
+
+Usage:
+    python benchmarks/bench_bundles.py --documents 30 --mb-per-document 20
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+from common import setup_environment, create_bench_app, seed_owner, save_results
+
+BROWSER = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+def memory_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+def reset_peak():
+    """Reset VmHWM to the current RSS (Linux 4.0+); returns False where unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def seed_bundle(owner, documents, size):
+    from flask import current_app
+    from app import db
+    from app.models import Document
+    from app.services.bundles import BundleService
+
+    document_ids = []
+    for index in range(documents):
+        relative_path = os.path.join(str(owner.id), f'room-{index}.pdf')
+        full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            # Incompressible, like the streams inside a real PDF
+            for _ in range(size // (1024 * 1024)):
+                f.write(os.urandom(1024 * 1024))
+        document = Document(user_id=owner.id, title=f'Room document {index}', original_filename=f'room-{index}.pdf',
+                            file_type='pdf', file_path=relative_path, pdf_path=relative_path,
+                            file_size=os.path.getsize(full_path), page_count=1)
+        db.session.add(document)
+        db.session.commit()
+        document_ids.append(document.id)
+
+    bundle = BundleService.create_bundle(owner.id, 'Benchmark room', document_ids, require_email=False,
+                                         allow_download=True)
+    return bundle.link_code
+
+def download(client, url, headers=None, stop_after=None):
+    """Stream a response; returns (status, headers, sha256, bytes, first byte seconds, total seconds)"""
+    started = time.perf_counter()
+    response = client.get(url, headers=headers or {}, buffered=False)
+    sha, received, first_byte = hashlib.sha256(), 0, None
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        sha.update(chunk)
+        received += len(chunk)
+        if stop_after is not None and received >= stop_after:
+            break
+    response.close()
+    return response.status_code, response.headers, sha, received, first_byte, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=30)
+    parser.add_argument('--mb-per-document', type=int, default=20)
+    parser.add_argument('--output', default='bench_bundles.json')
+    args = parser.parse_args()
+
+    setup_environment()
+    app = create_bench_app()
+
+    with app.app_context():
+        owner = seed_owner()
+        link_code = seed_bundle(owner, args.documents, args.mb_per_document * 1024 * 1024)
+
+    client = app.test_client()
+    client.environ_base['HTTP_USER_AGENT'] = BROWSER
+    url = f'/b/{link_code}/download'
+    results = {'documents': args.documents, 'mb_per_document': args.mb_per_document}
+
+    # First download computes the missing CRCs
+    status, headers, _, size, first_byte, _ = download(client, url, stop_after=1)
+    assert status == 200, status
+    archive_size = int(headers['Content-Length'])
+    results['archive_mb'] = round(archive_size / 1024 ** 2, 1)
+    results['cold_first_byte_ms'] = round(first_byte * 1000, 1)
+
+    peak_tracked = reset_peak()
+    rss_before = memory_kb('VmRSS')
+    status, headers, full_sha, size, first_byte, seconds = download(client, url)
+    assert status == 200 and size == archive_size, (status, size)
+    results['warm_first_byte_ms'] = round(first_byte * 1000, 1)
+    results['throughput_mb_s'] = round(size / 1024 ** 2 / seconds, 1)
+    results['rss_before_kb'] = rss_before
+    results['peak_growth_kb'] = memory_kb('VmHWM') - rss_before if peak_tracked else None
+
+    # Cut off halfway, then resume from where the client stopped
+    _, _, resumed, received, _, _ = download(client, url, stop_after=archive_size // 2)
+    response = client.get(url, headers={'Range': f'bytes={received}-', 'If-Range': headers['ETag']}, buffered=False)
+    assert response.status_code == 206, response.status_code
+    for chunk in response.response:
+        resumed.update(chunk)
+    response.close()
+    results['resume_matches'] = resumed.hexdigest() == full_sha.hexdigest()
+
+    for name, value in results.items():
+        print(f'{name:>20}: {value}')
+    save_results(args.output, results)
+    return 0 if results['resume_matches'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
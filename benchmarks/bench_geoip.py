@@ -0,0 +1,161 @@
+"""GeoIP table build time, lookup throughput, resident memory and session enrichment.
+
+Writes a synthetic GeoLite2-style CSV (IPv4 blocks plus a locations file),
+compiles it with GeoIP.build and reports:
+  - build time and table size on disk
+  - lookups/s for uncached scalar lookups, cached scalar lookups over a
+    Zipf-skewed address stream (repeat viewers) and vectorized lookup_many
+  - resident memory (VmRSS) before and after opening the table and after
+    the lookups, next to the same ranges held as Python lists
+  - sessions/s for `enrich_pending` over a dataset from benchmarks/dataset.py
+
+Usage: python benchmarks/bench_geoip.py --blocks 1000000 --lookups 200000 --views 200000
+"""
+import argparse
+import csv
+import os
+import time
+
+from common import setup_environment, create_bench_app, save_results
+from dataset import seed_dataset
+
+COUNTRIES = ['US', 'GB', 'DE', 'FR', 'BR', 'IN', 'JP', 'CA', 'AU', 'NL', 'ES', 'IT', 'SE', 'PL', 'MX']
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def write_geolite_csv(workdir, blocks, locations, rng):
+    """Contiguous IPv4 blocks of random prefix length over 1.0.0.0 upwards"""
+    import ipaddress
+
+    locations_path = os.path.join(workdir, 'GeoLite2-City-Locations-en.csv')
+    with open(locations_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['geoname_id', 'locale_code', 'continent_code', 'country_iso_code', 'city_name'])
+        for geoname_id in range(locations):
+            writer.writerow([geoname_id + 1, 'en', 'XX', COUNTRIES[geoname_id % len(COUNTRIES)],
+                             f'City {geoname_id}'])
+
+    blocks_path = os.path.join(workdir, 'GeoLite2-City-Blocks-IPv4.csv')
+    address = int(ipaddress.IPv4Address('1.0.0.0'))
+    prefixes = rng.integers(22, 29, blocks).tolist()
+    geoname_ids = (rng.zipf(1.3, blocks) % locations + 1).tolist()
+    with open(blocks_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['network', 'geoname_id', 'registered_country_geoname_id'])
+        for prefix, geoname_id in zip(prefixes, geoname_ids):
+            size = 1 << (32 - prefix)
+            address = (address + size - 1) // size * size  # Align to the block size
+            writer.writerow([f'{ipaddress.IPv4Address(address)}/{prefix}', geoname_id, geoname_id])
+            address += size
+    return blocks_path, locations_path, address
+
+def rate(count, seconds):
+    return round(count / seconds) if seconds else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blocks', type=int, default=1000000)
+    parser.add_argument('--locations', type=int, default=50000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--distinct-ips', type=int, default=20000, help='Address pool for the cached run')
+    parser.add_argument('--views', type=int, default=200000, help='Sessions to enrich (0 to skip)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--naive', action='store_true', help='Also hold the ranges as Python lists for comparison')
+    parser.add_argument('--output', default='bench_geoip.json')
+    args = parser.parse_args()
+
+    import numpy as np
+
+    workdir = setup_environment(prefix='docone-bench-geoip-')
+    os.environ['GEOIP_DIR'] = os.path.join(workdir, 'geoip')
+    rng = np.random.default_rng(42)
+    app = create_bench_app()
+    results = {'args': vars(args)}
+
+    from app.services.geoip import GeoIP, _cached_lookup
+
+    with app.app_context():
+        started = time.perf_counter()
+        blocks_path, locations_path, address_end = write_geolite_csv(workdir, args.blocks, args.locations, rng)
+        csv_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        manifest = GeoIP.build([blocks_path], locations_path=locations_path)
+        build_seconds = time.perf_counter() - started
+        table_bytes = sum(entry.stat().st_size for entry in os.scandir(app.config['GEOIP_DIR']))
+        results['build'] = {'csv_seconds': round(csv_seconds, 2), 'build_seconds': round(build_seconds, 2),
+                            'ranges': manifest['ipv4_ranges'], 'table_mb': round(table_bytes / 2 ** 20, 1)}
+        print(f"Built {manifest['ipv4_ranges']} ranges in {build_seconds:.2f}s ({table_bytes / 2 ** 20:.1f} MB)")
+
+        first = int.from_bytes(bytes([1, 0, 0, 0]), 'big')
+        def addresses(values):
+            return ['.'.join(str(value >> shift & 255) for shift in (24, 16, 8, 0)) for value in values]
+
+        uniform = addresses(rng.integers(first, address_end, args.lookups).tolist())
+        pool = addresses(rng.integers(first, address_end, args.distinct_ips).tolist())
+        skewed = [pool[index % len(pool)] for index in (rng.zipf(1.2, args.lookups) - 1).tolist()]
+
+        rss_before = rss_kb()
+        table = GeoIP.table()
+        rss_opened = rss_kb()
+
+        lookups = {}
+        started = time.perf_counter()
+        for address in uniform:
+            _cached_lookup.__wrapped__(table, address)
+        lookups['scalar_uncached'] = rate(len(uniform), time.perf_counter() - started)
+
+        _cached_lookup.cache_clear()
+        started = time.perf_counter()
+        for address in skewed:
+            GeoIP.lookup(address)
+        lookups['scalar_cached_zipf'] = rate(len(skewed), time.perf_counter() - started)
+        info = _cached_lookup.cache_info()
+        lookups['cache_hit_ratio'] = round(info.hits / max(1, info.hits + info.misses), 3)
+
+        started = time.perf_counter()
+        located = table.lookup_many(uniform)
+        lookups['vectorized'] = rate(len(uniform), time.perf_counter() - started)
+        lookups['found_ratio'] = round(sum(1 for result in located if result) / len(located), 3)
+        results['lookups_per_second'] = lookups
+        rss_after = rss_kb()
+
+        memory = {'before_open_kb': rss_before, 'after_open_kb': rss_opened, 'after_lookups_kb': rss_after}
+        if args.naive:
+            # The same ranges as Python objects, as a bisect-over-lists implementation would keep them
+            started = time.perf_counter()
+            rss_naive = rss_kb()
+            naive_lists = [np.load(os.path.join(table.path, f'v4_{name}.npy')).tolist()
+                           for name in ('starts', 'ends', 'locations')]
+            memory['naive_lists_kb'] = rss_kb() - rss_naive
+            memory['naive_load_seconds'] = round(time.perf_counter() - started, 2)
+            del naive_lists
+        results['rss'] = memory
+        print(f"Lookups/s: {lookups}")
+        print(f"VmRSS: {rss_before} kB -> {rss_opened} kB after open -> {rss_after} kB after lookups"
+              + (f"; Python lists: +{memory['naive_lists_kb']} kB" if args.naive else ''))
+
+        if args.views:
+            from sqlalchemy import update
+            from app import db
+            from app.models import DocumentView
+
+            seed_dataset(users=50, documents_per_user=5, links_per_document=2, views=args.views)
+            db.session.execute(update(DocumentView).values(country=None, city=None))  # The seed sets a country
+            db.session.commit()
+            started = time.perf_counter()
+            counters = GeoIP.enrich_pending(batch_size=args.batch_size)
+            seconds = time.perf_counter() - started
+            results['enrich'] = dict(counters, seconds=round(seconds, 2),
+                                     sessions_per_second=rate(args.views, seconds))
+            print(f"Enriched {args.views} sessions in {seconds:.2f}s ({rate(args.views, seconds)}/s): {counters}")
+
+    save_results(args.output, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Page reach and completion analytics over page bitmaps vs JSON page lists.
+
+Seeds --sessions view sessions of one --pages page document. Each session
+reads from page 1 to a Beta-distributed depth, skipping about one page in
+ten, and sometimes jumps ahead to a later page. Then it times:
+
+  - PageCoverage.get_document_coverage: load the bitmaps from the database
+    and compute per-page reach, the drop-off funnel and completion rates
+  - the vectorized pass alone, over bitmaps already in memory
+  - the same statistics computed row by row in Python from JSON page lists,
+    which is what the pages_viewed column required
+
+and checks that both give the same counts. It also reports storage per
+session for bitmaps and JSON lists.
+
+Usage:
+    python benchmarks/bench_page_coverage.py --sessions 1000000 --pages 40
+"""
+import argparse
+import json
+import sys
+import time
+
+from common import setup_environment, create_bench_app, seed_owner, seed_document, save_results
+
+def timed(fn, repeat=3):
+    """Best-of-N wall time in seconds, with the last result"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def generate_bitmaps(rng, sessions, pages):
+    """Synthetic page bitmaps, as the tracking path stores them"""
+    import numpy as np
+
+    depth = np.clip(np.ceil(rng.beta(1.3, 1.6, sessions) * pages), 1, pages).astype(int)
+    viewed = np.arange(1, pages + 1) <= depth[:, None]
+    viewed &= rng.random((sessions, pages)) >= 0.1
+    viewed[:, 0] |= rng.random(sessions) >= 0.05  # Most sessions see the cover page
+    jumps = rng.random(sessions) < 0.05
+    viewed[np.flatnonzero(jumps), rng.integers(0, pages, int(jumps.sum()))] = True
+    packed = np.packbits(viewed, axis=1, bitorder='little')
+    return [row.tobytes().rstrip(b'\x00') for row in packed]
+
+def python_coverage(page_lists, pages):
+    """Reference: the statistics computed row by row from decoded JSON lists"""
+    viewed = [0] * pages
+    furthest = [0] * (pages + 1)
+    complete = 0
+    for text in page_lists:
+        seen = {page for page in json.loads(text) if page <= pages}
+        for page in seen:
+            viewed[page - 1] += 1
+        furthest[max(seen, default=0)] += 1
+        complete += len(seen) == pages
+    return viewed, furthest, complete
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_page_coverage.json')
+    args = parser.parse_args()
+
+    setup_environment()
+    app = create_bench_app()
+
+    import numpy as np
+    from app import db
+    from app.services.analytics_tracker import AnalyticsTracker
+    from app.services.page_coverage import PageCoverage
+    from dataset import BulkWriter
+
+    results = {'sessions': args.sessions, 'pages': args.pages}
+
+    with app.app_context():
+        owner = seed_owner()
+        document, link = seed_document(owner, pages=args.pages)
+
+        rng = np.random.default_rng(args.seed)
+        bitmaps = generate_bitmaps(rng, args.sessions, args.pages)
+
+        started = time.perf_counter()
+        writer = BulkWriter(db.engine)
+        try:
+            for offset in range(0, args.sessions, 100000):
+                chunk = bitmaps[offset:offset + 100000]
+                writer.write('document_views', ['link_id', 'session_id', 'started_at', 'document_version',
+                                                'last_seq', 'pages_bitmap'],
+                             [(link.id, f'cov-{offset + i:09x}', '2026-01-01 00:00:00', 1, 0, bitmap)
+                              for i, bitmap in enumerate(chunk)])
+        finally:
+            writer.close()
+        results['seed_seconds'] = round(time.perf_counter() - started, 1)
+
+        seconds, coverage = timed(lambda: PageCoverage.get_document_coverage(document))
+        results['query_and_compute_seconds'] = round(seconds, 3)
+
+        chunks = [bitmaps[i:i + 65536] for i in range(0, len(bitmaps), 65536)]
+        seconds, totals = timed(lambda: PageCoverage.analyze(chunks, args.pages))
+        results['compute_seconds'] = round(seconds, 3)
+
+        page_lists = [json.dumps(AnalyticsTracker.bitmap_pages(bitmap)) for bitmap in bitmaps]
+        seconds, reference = timed(lambda: python_coverage(page_lists, args.pages), repeat=1)
+        results['python_json_seconds'] = round(seconds, 3)
+        results['compute_speedup_vs_json'] = round(seconds / results['compute_seconds'], 1)
+
+        viewed, furthest, complete = reference
+        results['matches_reference'] = (
+            coverage['sessions'] == args.sessions
+            and totals['page_views'].tolist() == viewed
+            and totals['furthest'].tolist() == furthest
+            and totals['complete'] == complete
+            and [row['viewed'] for row in coverage['pages']] == viewed
+        )
+
+        results['bitmap_bytes_per_session'] = round(sum(len(bitmap) for bitmap in bitmaps) / args.sessions, 1)
+        results['json_bytes_per_session'] = round(sum(len(text) for text in page_lists) / args.sessions, 1)
+        results['completion_rate'] = round(coverage['completion_rate'], 4)
+        results['reached_end_rate'] = round(coverage['reached_end_rate'], 4)
+        results['avg_coverage'] = round(coverage['avg_coverage'], 4)
+
+    for name, value in results.items():
+        print(f'{name:>26}: {value}')
+    save_results(args.output, results)
+    return 0 if results['matches_reference'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Query plans and latency of the dashboard, link and stats queries before and after the index migration.
+
+Seeds a dataset with benchmarks/dataset.py, downgrades the schema to the pre-migration indexes,
+records EXPLAIN output and latencies, upgrades to head and records them again.
+
+Usage: python benchmarks/bench_query_plans.py --users 200 --views 500000
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from common import ROOT, setup_environment, create_bench_app, summarize, save_results
+from dataset import seed_dataset
+
+INDEX_REVISION = '3c9e5f7a1b2d'  # migrations/versions/3c9e5f7a1b2d_query_indexes.py
+# Later revisions' indexes on the same query shapes, dropped for the "before" run
+LATER_INDEXES = ['ix_document_views_link_viewer']  # migrations/versions/5e8a1c3f7b24_viewers.py
+
+def queries(user_id, document_id):
+    """The route and service query shapes, as (name, SELECT statement)"""
+    from sqlalchemy import func, select
+    from app.models import Document, ShareableLink, DocumentView
+
+    link_ids = select(ShareableLink.id).where(ShareableLink.document_id == document_id).scalar_subquery()
+    since = datetime.utcnow() - timedelta(days=30)
+    return [
+        ('dashboard', select(Document).where(
+            Document.user_id == user_id, Document.is_deleted == False
+        ).order_by(Document.created_at.desc())),
+        ('manage_links', select(ShareableLink).where(
+            ShareableLink.document_id == document_id, ShareableLink.deleted_at.is_(None)
+        ).order_by(ShareableLink.created_at.desc())),
+        ('stats_total_views', select(func.count(DocumentView.id)).where(DocumentView.link_id.in_(link_ids))),
+        ('stats_unique_viewers', select(func.count(func.distinct(DocumentView.viewer_id))).where(
+            DocumentView.link_id.in_(link_ids), DocumentView.viewer_id.isnot(None)
+        )),
+        ('stats_recent_views', select(DocumentView).where(
+            DocumentView.link_id.in_(link_ids), DocumentView.started_at >= since
+        ).order_by(DocumentView.started_at.desc())),
+    ]
+
+def explain(statement):
+    from sqlalchemy import text
+    from app import db
+
+    # Named parameters so the compiled SQL can be re-executed through text()
+    dialect = type(db.engine.dialect)(paramstyle='named')
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}'), compiled.params).all()
+        return [row[-1] for row in rows]
+    rows = db.session.execute(text(f'EXPLAIN {compiled}'), compiled.params).all()
+    return [row[0] for row in rows]
+
+def measure(user_id, document_id, repeat):
+    from app import db
+
+    results = {}
+    for name, statement in queries(user_id, document_id):
+        db.session.execute(statement).all()  # Warm the page cache
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.session.execute(statement).all()
+            samples.append(time.perf_counter() - start)
+        db.session.rollback()
+        results[name] = {'plan': explain(statement), 'latency': summarize(samples)}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--documents-per-user', type=int, default=20)
+    parser.add_argument('--links-per-document', type=int, default=3)
+    parser.add_argument('--views', type=int, default=500000)
+    parser.add_argument('--skew', type=float, default=1.2)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--output', default='bench_query_plans.json')
+    args = parser.parse_args()
+
+    setup_environment()
+
+    from flask_migrate import Migrate, stamp, downgrade, upgrade
+    from sqlalchemy import text
+    from app import db
+    from app.models import DocumentView
+
+    app = create_bench_app()
+    Migrate(app, db, directory=os.path.join(ROOT, 'migrations'))
+
+    with app.app_context():
+        dataset = seed_dataset(users=args.users, documents_per_user=args.documents_per_user,
+                               links_per_document=args.links_per_document, views=args.views, skew=args.skew)
+        print(f"Seeded {args.views} views in {dataset['total_seconds']}s")
+        user_id, document_id = dataset['heaviest_document_owner_id'], dataset['heaviest_document_id']
+
+        # create_all built the current schema; step back to the indexes that existed before the migration
+        later = [index for index in DocumentView.__table__.indexes if index.name in LATER_INDEXES]
+        for index in later:
+            index.drop(db.engine)
+        stamp(revision=INDEX_REVISION)
+        downgrade(revision='base')
+        db.session.execute(text('ANALYZE'))
+        before = measure(user_id, document_id, args.repeat)
+
+        upgrade(revision=INDEX_REVISION)
+        for index in later:
+            index.create(db.engine)
+        db.session.execute(text('ANALYZE'))
+        after = measure(user_id, document_id, args.repeat)
+
+    print(f"\n{'query':<22} {'before p50':>11} {'after p50':>11} {'speedup':>8}")
+    for name in before:
+        old, new = before[name]['latency']['p50_ms'], after[name]['latency']['p50_ms']
+        print(f'{name:<22} {old:>9.3f}ms {new:>9.3f}ms {old / new if new else 0:>7.1f}x')
+    for name in before:
+        print(f'\n{name}\n  before: ' + '\n          '.join(before[name]['plan']) +
+              '\n  after:  ' + '\n          '.join(after[name]['plan']))
+
+    save_results(args.output, {'args': vars(args), 'dataset': dataset, 'before': before, 'after': after})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Full-text search latency at a realistic per-user index size.
+
+Seeds one user with --pages extracted pages (spread over decks of
+--pages-per-document) plus the same amount of text for a second user, using
+a Zipf-distributed vocabulary so common terms match a large share of pages.
+It then times SearchIndex.search for common, rare, multi-term and prefix
+queries and exits with status 1 if any p95 is over --budget-ms.
+
+Usage:
+    python benchmarks/bench_search.py --pages 100000 --budget-ms 50
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from common import setup_environment, create_bench_app, seed_owner, summarize, save_results
+
+def make_vocabulary(size, rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+def seed_pages(owner, pages, pages_per_document, vocabulary, cum_weights, rng, words_per_page):
+    from sqlalchemy import insert
+    from app import db
+    from app.models import Document, DocumentPage
+
+    documents = []
+    for index in range(0, pages, pages_per_document):
+        documents.append({
+            'user_id': owner.id,
+            'title': f'Search deck {index // pages_per_document}',
+            'original_filename': 'deck.pdf',
+            'file_type': 'pdf',
+            'file_path': 'deck.pdf',
+            'pdf_path': 'deck.pdf',
+            'page_count': pages_per_document,
+        })
+    db.session.execute(insert(Document), documents)
+    document_ids = [row[0] for row in db.session.query(Document.id).filter_by(user_id=owner.id).order_by(Document.id)]
+
+    batch = []
+    for number in range(pages):
+        batch.append({
+            'document_id': document_ids[number // pages_per_document],
+            'user_id': owner.id,
+            'page_number': number % pages_per_document + 1,
+            'content': ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=words_per_page)),
+        })
+        if len(batch) == 5000:
+            db.session.execute(insert(DocumentPage), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(DocumentPage), batch)
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=100000, help='Indexed pages per user')
+    parser.add_argument('--pages-per-document', type=int, default=25)
+    parser.add_argument('--words-per-page', type=int, default=80)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200, help='Timed searches per query kind')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='Maximum allowed p95 per query kind')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--output', default='bench_search.json')
+    args = parser.parse_args()
+
+    setup_environment(args.database_url)
+    app = create_bench_app()
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    from app import db
+    from app.services.search_index import SearchIndex
+
+    with app.app_context():
+        started = time.perf_counter()
+        owner = seed_owner()
+        other = seed_owner('other@example.com')
+        for user in (owner, other):
+            seed_pages(user, args.pages, args.pages_per_document, vocabulary, cum_weights, rng, args.words_per_page)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(db.text("INSERT INTO document_pages_fts (document_pages_fts) VALUES ('optimize')"))
+            db.session.commit()
+        print(f'Seeded {2 * args.pages} pages in {time.perf_counter() - started:.1f} s')
+
+        common_words = vocabulary[:20]
+        mid_words = vocabulary[200:2000]
+        rare_words = vocabulary[-5000:]
+        kinds = {
+            'common term': lambda: rng.choice(common_words),
+            'mid term': lambda: rng.choice(mid_words),
+            'rare term': lambda: rng.choice(rare_words),
+            'two terms': lambda: f'{rng.choice(common_words)} {rng.choice(mid_words)}',
+            'prefix': lambda: rng.choice(mid_words)[:4] + '*',
+        }
+
+        results = {'pages_per_user': args.pages, 'budget_ms': args.budget_ms, 'queries': {}}
+        failed = False
+        print(f"{'query':12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'avg docs':>9}")
+        for kind, make_query in kinds.items():
+            samples = []
+            documents = 0
+            for _ in range(args.queries):
+                query = make_query()
+                start = time.perf_counter()
+                documents += len(SearchIndex.search(owner.id, query))
+                samples.append(time.perf_counter() - start)
+            stats = summarize(samples)
+            results['queries'][kind] = dict(stats, avg_documents=round(documents / args.queries, 1))
+            failed = failed or stats['p95_ms'] > args.budget_ms
+            print(f"{kind:12} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                  f"{documents / args.queries:>9.1f}")
+
+    save_results(args.output, results)
+    print(f'Results written to {args.output}')
+    if failed:
+        print(f'FAIL: a p95 exceeded {args.budget_ms} ms')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
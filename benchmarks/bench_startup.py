@@ -0,0 +1,106 @@
+"""Application boot time and import budget.
+
+Starts fresh interpreters that import the app and call create_app, then
+reports the median wall time and the slowest top-level imports. Exits with
+status 1 when the median exceeds --budget-ms or when a module that should be
+loaded lazily (PDF, conversion, numpy, Alembic) is imported during boot, so
+it can run as a CI check.
+
+Usage: python benchmarks/bench_startup.py --runs 7 --budget-ms 800
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, percentile, save_results
+
+# Modules that must stay out of a plain worker boot
+LAZY_MODULES = ('PyPDF2', 'numpy', 'alembic', 'flask_migrate', 'docx', 'pptx', 'docx2pdf', 'email_validator')
+
+BOOT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app('production')
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+"""
+
+def boot_once(env, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', BOOT_SCRIPT % (LAZY_MODULES,)]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def slowest_imports(importtime_output, limit):
+    """Top-level imports by cumulative microseconds from -X importtime"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented by two extra spaces per level
+        if not name.startswith('  '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=800.0, help='Maximum median boot time')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='docone-boot-')
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'boot.db')}")
+    env['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+
+    boot_once(env)  # Warm the filesystem and bytecode caches
+    samples = []
+    loaded = set()
+    for _ in range(args.runs):
+        result, _ = boot_once(env)
+        samples.append(result['seconds'] * 1000)
+        loaded.update(result['loaded'])
+
+    _, importtime_output = boot_once(env, importtime=True)
+    slowest = slowest_imports(importtime_output, 10)
+
+    median_ms = percentile(samples, 50)
+    results = {
+        'runs': args.runs,
+        'median_ms': round(median_ms, 1),
+        'min_ms': round(min(samples), 1),
+        'max_ms': round(max(samples), 1),
+        'budget_ms': args.budget_ms,
+        'lazy_modules_loaded': sorted(loaded),
+        'slowest_imports_ms': {name: round(us / 1000, 1) for us, name in slowest},
+    }
+    if args.output:
+        save_results(args.output, results)
+
+    print(f"boot: median {results['median_ms']} ms (min {results['min_ms']}, max {results['max_ms']}) "
+          f"over {args.runs} runs, budget {args.budget_ms} ms")
+    print('slowest imports:')
+    for name, ms in results['slowest_imports_ms'].items():
+        print(f'  {ms:8.1f} ms  {name}')
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f'median boot {median_ms:.1f} ms exceeds budget {args.budget_ms} ms')
+    if loaded:
+        failures.append(f"modules that should load lazily were imported at boot: {', '.join(sorted(loaded))}")
+
+    for message in failures:
+        print(f'FAIL {message}')
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
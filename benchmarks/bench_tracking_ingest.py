@@ -0,0 +1,216 @@
+"""Sustained heartbeat ingestion: Flask route vs the ASGI tracking app.
+
+Seeds --sessions viewing sessions, then starts each server as a single
+process (the Flask app on a threaded Werkzeug server with CSRF disabled,
+and `uvicorn asgi:app`) and drives it for --duration seconds with
+--concurrency keep-alive connections sending tracking protocol v2
+heartbeats. Every heartbeat advances one session's sequence number and
+every fourth one enters a new page. Reports requests/s, latency percentiles
+and requests per server CPU second (utime + stime of the server process,
+so client overhead on the same machine is excluded), then checks the rows
+the server wrote.
+
+Usage:
+    python benchmarks/bench_tracking_ingest.py --server both --duration 10 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from common import ROOT, setup_environment, create_bench_app, seed_owner, seed_document, summarize, save_results
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+def serve_flask(port):
+    """Server side of --server flask (runs in the child process)"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass  # Match uvicorn --no-access-log
+
+    app = create_app('production')
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SQLALCHEMY_ECHO'] = False
+    make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler).serve_forever()
+
+def start_server(kind, port):
+    env = dict(os.environ, FLASK_ENV='production', PYTHONPATH=ROOT)
+    if kind == 'flask':
+        command = [sys.executable, os.path.abspath(__file__), '--serve-flask', str(port)]
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                   '--log-level', 'warning', '--no-access-log']
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+async def post(connection, port, body):
+    """
+    Send one POST over a keep-alive connection, reconnecting if the server closed it
+    Returns: (status, connection)
+    """
+    request = (f'POST /api/track/view HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+               f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode() + body
+    for attempt in range(2):
+        if connection is None:
+            connection = await asyncio.open_connection('127.0.0.1', port)
+        reader, writer = connection
+        try:
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+        except (OSError, asyncio.IncompleteReadError):
+            writer.close()
+            connection = None
+            continue
+
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = dict(line.lower().split(': ', 1) for line in lines[1:] if ': ' in line)
+        await reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close' or lines[0].startswith('HTTP/1.0'):
+            writer.close()
+            connection = None
+        return status, connection
+    raise RuntimeError('Could not reach server')
+
+async def drive(port, session_ids, duration, concurrency, pages):
+    latencies = []
+    statuses = {}
+    shares = [session_ids[index::concurrency] for index in range(concurrency)]
+    deadline = time.monotonic() + duration
+
+    async def worker(sessions):
+        rng = random.Random(len(sessions))
+        state = {session_id: [0, 1, 0] for session_id in sessions}  # seq, page, duration
+        connection = None
+        while time.monotonic() < deadline:
+            session_id = rng.choice(sessions)
+            seq, page, elapsed = state[session_id]
+            seq += 1
+            events = []
+            if seq % 4 == 0 and page < pages:
+                page += 1
+                events = [[page, elapsed * 1000]]
+            elapsed += 5
+            state[session_id] = [seq, page, elapsed]
+            body = json.dumps({'v': 2, 'sid': session_id, 'seq': seq, 'ev': events, 'p': page, 'd': elapsed}).encode()
+
+            start = time.perf_counter()
+            status, connection = await post(connection, port, body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+        if connection:
+            connection[1].close()
+        return state
+
+    started = time.monotonic()
+    states = await asyncio.gather(*(worker(sessions) for sessions in shares if sessions))
+    elapsed = time.monotonic() - started
+    expected = {session_id: values for state in states for session_id, values in state.items()}
+    return latencies, statuses, elapsed, expected
+
+def verify(app, expected):
+    """
+    Compare the stored sessions with what the client sent last
+    Returns: number of sessions whose last_seq or max page does not match
+    """
+    from app.models.analytics import DocumentView
+
+    with app.app_context():
+        rows = DocumentView.query.with_entities(
+            DocumentView.session_id, DocumentView.last_seq, DocumentView.max_page_reached
+        ).filter(DocumentView.session_id.in_(list(expected))).all()
+        return sum(1 for session_id, last_seq, max_page in rows
+                   if expected[session_id][0] and (last_seq, max_page) != tuple(expected[session_id][:2]))
+
+def run(kind, port, app, session_ids, args):
+    server = start_server(kind, port)
+    try:
+        asyncio.run(wait_for_port(port))
+        time.sleep(0.5)
+        cpu_before = cpu_seconds(server.pid)
+        latencies, statuses, elapsed, expected = asyncio.run(
+            drive(port, session_ids, args.duration, args.concurrency, args.pages))
+        time.sleep(0.3)  # Let the ASGI writer flush its last batch
+        cpu_used = cpu_seconds(server.pid) - cpu_before
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    requests = len(latencies)
+    return dict(
+        summarize(latencies),
+        requests=requests,
+        requests_per_second=round(requests / elapsed, 1),
+        server_cpu_seconds=round(cpu_used, 2),
+        requests_per_cpu_second=round(requests / cpu_used, 1) if cpu_used else None,
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+        mismatched_sessions=verify(app, expected),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['flask', 'asgi', 'both'], default='both')
+    parser.add_argument('--sessions', type=int, default=2000, help='Concurrent viewing sessions')
+    parser.add_argument('--pages', type=int, default=40, help='Pages of the seeded deck')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per server')
+    parser.add_argument('--concurrency', type=int, default=64, help='Keep-alive client connections')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--output', default='bench_tracking_ingest.json')
+    parser.add_argument('--serve-flask', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_flask:
+        serve_flask(args.serve_flask)
+        return
+
+    setup_environment(args.database_url)
+    app = create_bench_app()
+    from app.services.analytics_tracker import AnalyticsTracker
+
+    kinds = ['flask', 'asgi'] if args.server == 'both' else [args.server]
+    results = {'sessions': args.sessions, 'concurrency': args.concurrency, 'duration': args.duration, 'servers': {}}
+    print(f"{'server':8} {'req/s':>9} {'req/cpu-s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mismatch':>9}  statuses")
+    for offset, kind in enumerate(kinds):
+        with app.app_context():
+            if offset == 0:
+                owner = seed_owner()
+                _, link = seed_document(owner, pages=args.pages)
+                link_id = link.id
+            # Fresh sessions per server so both start from the same state
+            session_ids = [AnalyticsTracker.start_viewing_session(link_id, f'viewer{index}@example.com', '127.0.0.1', 'bench')
+                           for index in range(args.sessions)]
+
+        stats = run(kind, args.port + offset, app, session_ids, args)
+        results['servers'][kind] = stats
+        print(f"{kind:8} {stats['requests_per_second']:>9.1f} {stats['requests_per_cpu_second'] or 0:>10.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+              f"{stats['mismatched_sessions']:>9}  {stats['statuses']}")
+
+    save_results(args.output, results)
+    print(f'Results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
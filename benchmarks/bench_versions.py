@@ -0,0 +1,127 @@
+"""Incremental text extraction for a new document version.
+
+Writes a --pages text PDF, indexes it as version 1, then uploads version 2
+with --changed pages edited (one of them moved to the front, so the
+following pages shift). It times SearchIndex.index_document for the
+initial index, the incremental index of version 2 and a full re-extraction
+of version 2, and checks the incremental result matches the full one.
+
+Usage:
+    python benchmarks/bench_versions.py --pages 200 --changed 1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from common import setup_environment, create_bench_app, seed_owner, save_results
+
+def write_text_pdf(path, texts):
+    """Write a PDF with one line of Helvetica text per page"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in texts:
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f'BT /F1 11 Tf 72 720 Td ({escaped}) Tj ET'.encode()
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+def store(owner, name, texts):
+    from flask import current_app
+    from app.services.bundle_archive import BundleArchive
+
+    relative_path = os.path.join(str(owner.id), name)
+    full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
+    write_text_pdf(full_path, texts)
+    return {'original_filename': name, 'file_type': 'pdf', 'file_path': relative_path, 'pdf_path': relative_path,
+            'file_size': os.path.getsize(full_path), 'page_count': len(texts),
+            'pdf_crc32': BundleArchive.file_crc32(full_path)}
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--changed', type=int, default=1, help='Pages edited in version 2')
+    parser.add_argument('--words-per-page', type=int, default=60)
+    parser.add_argument('--output', default='bench_versions.json')
+    args = parser.parse_args()
+
+    setup_environment()
+    app = create_bench_app()
+
+    from app import db
+    from app.models import Document, DocumentPage, DocumentVersion
+    from app.services.document_versions import FILE_FIELDS
+    from app.services.search_index import SearchIndex
+
+    rng = random.Random(7)
+    words = ['revenue', 'pipeline', 'margin', 'roadmap', 'hiring', 'churn', 'runway', 'market', 'pricing', 'growth']
+    texts = [f'Slide {number} ' + ' '.join(rng.choice(words) for _ in range(args.words_per_page))
+             for number in range(1, args.pages + 1)]
+
+    with app.app_context():
+        owner = seed_owner()
+        stored = store(owner, 'deck-v1.pdf', texts)
+        document = Document(user_id=owner.id, title='Versioned deck', version=1, **stored)
+        db.session.add(document)
+        db.session.flush()
+        db.session.add(DocumentVersion(document_id=document.id, version=1, **stored))
+        db.session.commit()
+        document_id = document.id
+
+        results = {'pages': args.pages, 'changed': args.changed}
+        results['initial_ms'] = timed(SearchIndex.index_document, document_id)
+
+        # Version 2: edit some pages and move the last edited one to the front
+        edited = list(texts)
+        for number in rng.sample(range(args.pages), min(args.changed, args.pages)):
+            edited[number] = f'Slide {number + 1} updated ' + ' '.join(rng.choice(words) for _ in range(args.words_per_page))
+        edited.insert(0, edited.pop(number))
+
+        stored = store(owner, 'deck-v2.pdf', edited)
+        document = db.session.get(Document, document_id)
+        for field in FILE_FIELDS:
+            setattr(document, field, stored[field])
+        document.version = 2
+        db.session.add(DocumentVersion(document_id=document_id, version=2, **stored))
+        db.session.commit()
+
+        results['incremental_ms'] = timed(SearchIndex.index_document, document_id)
+        incremental = dict(db.session.query(DocumentPage.page_number, DocumentPage.content).filter_by(
+            document_id=document_id).all())
+        results['full_ms'] = timed(SearchIndex.index_document, document_id, full=True)
+        full = dict(db.session.query(DocumentPage.page_number, DocumentPage.content).filter_by(
+            document_id=document_id).all())
+
+    results['speedup'] = round(results['full_ms'] / results['incremental_ms'], 1) if results['incremental_ms'] else None
+    results['matches_full'] = incremental == full
+    for name, value in results.items():
+        print(f'{name:>16}: {value}')
+    save_results(args.output, results)
+    return 0 if results['matches_full'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
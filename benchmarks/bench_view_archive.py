@@ -0,0 +1,111 @@
+"""Storage size and aggregate latency of the columnar view archive vs the live table.
+
+Usage: python benchmarks/bench_view_archive.py --views 200000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import setup_environment, create_bench_app, seed_owner
+
+def timed(fn, repeat=5):
+    """Best-of-N wall time in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--views', type=int, default=200000)
+    parser.add_argument('--documents', type=int, default=10)
+    parser.add_argument('--days', type=int, default=730, help='Spread of started_at values')
+    args = parser.parse_args()
+
+    workdir = setup_environment()
+    db_path = os.path.join(workdir, 'bench.db')
+
+    from sqlalchemy import func, insert
+    from app import db
+    from app.models import Document, ShareableLink, DocumentView
+    from app.services.view_archive import ViewArchive
+
+    app = create_bench_app()
+
+    with app.app_context():
+        user = seed_owner()
+
+        link_ids = []
+        for i in range(args.documents):
+            document = Document(user_id=user.id, title=f'Doc {i}', original_filename=f'doc{i}.pdf',
+                                file_type='pdf', file_path=f'doc{i}.pdf')
+            db.session.add(document)
+            db.session.flush()
+            link = ShareableLink(document_id=document.id, link_code=f'bench{i}')
+            db.session.add(link)
+            db.session.flush()
+            link_ids.append((document.id, link.id))
+        db.session.commit()
+
+        rng = random.Random(42)
+        now = datetime.utcnow()
+        batch = []
+        for i in range(args.views):
+            _, link_id = link_ids[i % len(link_ids)]
+            batch.append({
+                'link_id': link_id,
+                'session_id': f'bench-{i}',
+                'viewer_email': f'viewer{rng.randint(0, 5000)}@example.com',
+                'started_at': now - timedelta(seconds=rng.randint(0, args.days * 86400)),
+                'duration_seconds': rng.randint(0, 900),
+                'max_page_reached': rng.randint(1, 30),
+                'total_page_views': rng.randint(1, 30),
+            })
+            if len(batch) == 10000:
+                db.session.execute(insert(DocumentView), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(DocumentView), batch)
+        db.session.commit()
+
+        document_id, _ = link_ids[0]
+        doc_links = [link_id for doc, link_id in link_ids if doc == document_id]
+
+        def sql_aggregate():
+            in_doc = DocumentView.link_id.in_(doc_links)
+            DocumentView.query.filter(in_doc).count()
+            db.session.query(func.count(func.distinct(DocumentView.viewer_email))).filter(in_doc).scalar()
+            db.session.query(func.sum(DocumentView.duration_seconds), func.count(DocumentView.id)).filter(
+                in_doc, DocumentView.duration_seconds > 0).one()
+
+        db.session.execute(db.text('VACUUM'))
+        live_bytes = os.path.getsize(db_path)
+        live_ms = timed(sql_aggregate)
+
+        start = time.perf_counter()
+        archived = ViewArchive.archive_older_than(days=0)
+        archive_seconds = time.perf_counter() - start
+
+        archive_bytes = dir_size(ViewArchive.get_root())
+        archive_ms = timed(lambda: ViewArchive.aggregate(document_id))
+
+    print(f'views:                 {args.views}')
+    print(f'archived sessions:     {archived} in {archive_seconds:.1f}s')
+    print(f'live table (sqlite):   {live_bytes / 1024 / 1024:.1f} MiB (whole database file)')
+    print(f'archive (npz):         {archive_bytes / 1024 / 1024:.1f} MiB')
+    print(f'aggregate, live SQL:   {live_ms:.1f} ms per document')
+    print(f'aggregate, archive:    {archive_ms:.1f} ms per document')
+
+if __name__ == '__main__':
+    main()
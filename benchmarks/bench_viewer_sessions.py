@@ -0,0 +1,256 @@
+"""Scripted viewer sessions against the viewer and tracking hot paths.
+
+Each session opens a link, passes the email gate, loads the viewer page,
+fetches the PDF, sends N heartbeats and a final sendBeacon-style update.
+Heartbeats use tracking protocol v2 (batched page-entry deltas) unless
+--protocol 1 selects the legacy full-state payload. Per endpoint it reports
+p50/p95/p99 latency, SQL queries and request body bytes per request, plus
+overall throughput. Results are written as JSON. Pass --compare to
+fail (exit 1) when p95 latency or query counts regress against a previous
+run.
+
+Usage:
+    python benchmarks/bench_viewer_sessions.py --sessions 200 --heartbeats 10 --output run.json
+    python benchmarks/bench_viewer_sessions.py --compare baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from common import (setup_environment, create_bench_app, seed_owner, seed_document,
+                    QueryCounter, summarize, save_results, load_results)
+
+CSRF_INPUT = re.compile(r'name="csrf_token" value="([^"]+)"')
+CSRF_DATA = re.compile(r'data-csrf-token="([^"]+)"')
+SESSION_DATA = re.compile(r'data-session-id="([^"]*)"')
+
+class SessionDriver:
+    """Runs scripted viewer sessions and records per-endpoint samples"""
+
+    def __init__(self, app, counter, link_code, pages, heartbeats, protocol=2):
+        self.app = app
+        self.protocol = protocol
+        self.counter = counter
+        self.link_code = link_code
+        self.pages = pages
+        self.heartbeats = heartbeats
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.request_bytes = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _request(self, client, endpoint, method, url, expected, **kwargs):
+        if 'json' in kwargs:
+            body_bytes = len(json.dumps(kwargs['json']))
+        else:
+            body_bytes = sum(len(str(value)) for value in kwargs.get('data', {}).values())
+
+        self.counter.reset()
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            self.queries[endpoint].append(self.counter.count)
+            self.request_bytes[endpoint].append(body_bytes)
+            if response.status_code not in expected:
+                self.errors[endpoint] += 1
+        return response
+
+    def run_session(self, index):
+        client = self.app.test_client()
+        base = f'/v/{self.link_code}'
+
+        self._request(client, 'viewer.view (gate)', 'GET', base, (302,))
+
+        page = self._request(client, 'viewer.email_capture GET', 'GET', f'{base}/email', (200,))
+        token = CSRF_INPUT.search(page.get_data(as_text=True)).group(1)
+        self._request(client, 'viewer.email_capture POST', 'POST', f'{base}/email', (302,), data={
+            'csrf_token': token,
+            'email': f'viewer{index}@example.com',
+            'full_name': f'Viewer {index}',
+        })
+
+        viewer = self._request(client, 'viewer.view', 'GET', base, (200,)).get_data(as_text=True)
+        csrf_token = CSRF_DATA.search(viewer).group(1)
+        session_id = SESSION_DATA.search(viewer).group(1)
+
+        self._request(client, 'viewer.serve_pdf', 'GET', f'{base}/document.pdf', (200,))
+
+        if self.protocol == 1:
+            self._heartbeats_v1(client, csrf_token, session_id)
+        else:
+            self._heartbeats_v2(client, csrf_token, session_id)
+
+    def _heartbeats_v1(self, client, csrf_token, session_id):
+        pages_viewed = []
+        for beat in range(1, self.heartbeats + 1):
+            current_page = min(beat, self.pages)
+            if current_page not in pages_viewed:
+                pages_viewed.append(current_page)
+            self._request(client, 'analytics.track_view', 'POST', '/api/track/view', (200,),
+                          headers={'X-CSRFToken': csrf_token}, json={
+                              'session_id': session_id,
+                              'current_page': current_page,
+                              'pages_viewed': pages_viewed,
+                              'duration_seconds': beat * 5,
+                              'is_final': False,
+                          })
+
+        self._request(client, 'analytics.track_view (beacon)', 'POST', '/api/track/view', (200,), data={
+            'csrf_token': csrf_token,
+            'data': json.dumps({
+                'session_id': session_id,
+                'current_page': pages_viewed[-1] if pages_viewed else 1,
+                'pages_viewed': pages_viewed,
+                'duration_seconds': (self.heartbeats + 1) * 5,
+                'is_final': True,
+            }),
+        })
+
+    def _heartbeats_v2(self, client, csrf_token, session_id):
+        # Mirrors viewer.js: only first visits to a page are queued as events
+        seen = set()
+        current_page = 1
+        for beat in range(1, self.heartbeats + 1):
+            current_page = min(beat, self.pages)
+            events = []
+            if current_page not in seen:
+                seen.add(current_page)
+                events.append([current_page, beat * 5000])
+            self._request(client, 'analytics.track_view', 'POST', '/api/track/view', (200,),
+                          headers={'X-CSRFToken': csrf_token}, json={
+                              'v': 2, 'sid': session_id, 'seq': beat,
+                              'ev': events, 'p': current_page, 'd': beat * 5,
+                          })
+
+        self._request(client, 'analytics.track_view (beacon)', 'POST', '/api/track/view', (200,), data={
+            'csrf_token': csrf_token,
+            'data': json.dumps({
+                'v': 2, 'sid': session_id, 'seq': self.heartbeats + 1,
+                'ev': [], 'p': current_page, 'd': (self.heartbeats + 1) * 5, 'f': 1,
+            }),
+        })
+
+def compare(results, baseline, threshold):
+    """
+    Compare endpoint p95 latency and queries per request with a baseline run
+    Returns: list of regression messages
+    """
+    regressions = []
+    for endpoint, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if not previous:
+            continue
+
+        limit = previous['latency']['p95_ms'] * (1 + threshold)
+        if current['latency']['p95_ms'] > limit:
+            regressions.append(
+                f"{endpoint}: p95 {current['latency']['p95_ms']:.2f} ms > "
+                f"{previous['latency']['p95_ms']:.2f} ms baseline (+{threshold:.0%} allowed)"
+            )
+
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(
+                f"{endpoint}: {current['queries_per_request']:.2f} queries/request > "
+                f"{previous['queries_per_request']:.2f} baseline"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--heartbeats', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=20, help='Page count of the PDF fixture')
+    parser.add_argument('--concurrency', type=int, default=1, help='Viewer sessions run in parallel threads')
+    parser.add_argument('--protocol', type=int, choices=(1, 2), default=2, help='Heartbeat tracking protocol')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--output', default='bench_viewer_sessions.json')
+    parser.add_argument('--compare', help='Baseline JSON from a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p95 slowdown for --compare')
+    args = parser.parse_args()
+
+    setup_environment(args.database_url)
+    app = create_bench_app()
+
+    from app import db
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+        owner = seed_owner()
+        _, link = seed_document(owner, pages=args.pages, require_email=True)
+        link_code = link.link_code
+
+    driver = SessionDriver(app, counter, link_code, args.pages, args.heartbeats, args.protocol)
+
+    def worker(indexes):
+        for index in indexes:
+            driver.run_session(index)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(range(i, args.sessions, args.concurrency),))
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    total_requests = sum(len(samples) for samples in driver.latencies.values())
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'sessions': args.sessions,
+            'heartbeats': args.heartbeats,
+            'pages': args.pages,
+            'concurrency': args.concurrency,
+            'protocol': args.protocol,
+        },
+        'throughput': {
+            'wall_seconds': round(wall_seconds, 3),
+            'sessions_per_second': round(args.sessions / wall_seconds, 2),
+            'requests_per_second': round(total_requests / wall_seconds, 2),
+        },
+        'endpoints': {
+            endpoint: {
+                'latency': summarize(samples),
+                'queries_per_request': round(sum(driver.queries[endpoint]) / len(samples), 2),
+                'request_bytes': round(sum(driver.request_bytes[endpoint]) / len(samples), 1),
+                'errors': driver.errors[endpoint],
+            }
+            for endpoint, samples in driver.latencies.items()
+        },
+    }
+    save_results(args.output, results)
+
+    print(f"{'endpoint':32} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'bytes':>7} {'err':>4}")
+    for endpoint, stats in results['endpoints'].items():
+        latency = stats['latency']
+        print(f"{endpoint:32} {latency['count']:>6} {latency['p50_ms']:>8.2f} {latency['p95_ms']:>8.2f} "
+              f"{latency['p99_ms']:>8.2f} {stats['queries_per_request']:>6.2f} {stats['request_bytes']:>7.1f} "
+              f"{stats['errors']:>4}")
+    throughput = results['throughput']
+    print(f"\n{throughput['sessions_per_second']} sessions/s, {throughput['requests_per_second']} requests/s "
+          f"over {throughput['wall_seconds']} s; results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, load_results(args.compare), args.threshold)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
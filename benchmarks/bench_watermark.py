@@ -0,0 +1,125 @@
+"""Per-viewer watermark stamping time for a multi-page deck.
+
+Writes a --pages deck whose pages carry real text content, then times:
+building the per-document overlay (first viewer of a document), stamping
+for a new viewer once the overlay is cached, serving an already stamped
+copy, and, for reference, the naive approach of merging a stamp page into
+every page with PyPDF2 and rewriting the file. Exits with status 1 if the
+new-viewer p95 is over --budget-ms.
+
+Usage:
+    python benchmarks/bench_watermark.py --pages 100 --viewers 200 --budget-ms 50
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+
+from common import setup_environment, create_bench_app, summarize, save_results
+
+def write_deck(path, pages):
+    """A deck with a font resource and a few hundred bytes of text operators per page"""
+    from PyPDF2 import PdfWriter
+    from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+    for number in range(1, pages + 1):
+        writer.add_blank_page(width=792, height=612)
+        page = writer.pages[-1]  # add_blank_page returns a detached copy
+        lines = ' '.join(f'0 -18 Td (Slide {number} bullet point {line} with some body text) Tj' for line in range(20))
+        content = DecodedStreamObject()
+        content.set_data(f'BT /F1 14 Tf 72 560 Td {lines} ET 0 0 1 RG 72 40 648 4 re f'.encode())
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+        })
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+def naive_stamp(deck_path, stamp_path, output_path):
+    """Merge a one-page stamp into every page and rewrite the whole document"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    stamp = PdfReader(stamp_path).pages[0]
+    writer = PdfWriter()
+    for page in PdfReader(deck_path).pages:
+        page.merge_page(stamp)
+        writer.add_page(page)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--viewers', type=int, default=200, help='Distinct viewers stamped after the overlay exists')
+    parser.add_argument('--overlay-runs', type=int, default=10, help='Cold overlay builds to time')
+    parser.add_argument('--naive-runs', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='Maximum allowed new-viewer p95')
+    parser.add_argument('--output', default='bench_watermark.json')
+    args = parser.parse_args()
+
+    workdir = setup_environment()
+    os.environ['WATERMARK_CACHE_DIR'] = os.path.join(workdir, 'watermarks')
+    app = create_bench_app()
+
+    from app.services.watermark import Watermarker
+
+    deck_path = os.path.join(workdir, 'deck.pdf')
+    write_deck(deck_path, args.pages)
+    results = {'pages': args.pages, 'deck_bytes': os.path.getsize(deck_path), 'budget_ms': args.budget_ms}
+
+    with app.app_context():
+        cache_dir = app.config['WATERMARK_CACHE_DIR']
+
+        samples = []
+        for run in range(args.overlay_runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            Watermarker._cache_bytes = None
+            start = time.perf_counter()
+            Watermarker.stamped_path(deck_path, f'first-{run}@example.com')
+            samples.append(time.perf_counter() - start)
+        results['first_viewer'] = summarize(samples)
+
+        samples = []
+        for viewer in range(args.viewers):
+            start = time.perf_counter()
+            stamped = Watermarker.stamped_path(deck_path, f'viewer{viewer}@example.com')
+            samples.append(time.perf_counter() - start)
+        results['new_viewer'] = summarize(samples)
+        results['stamped_bytes'] = os.path.getsize(stamped)
+
+        samples = []
+        for viewer in range(args.viewers):
+            start = time.perf_counter()
+            Watermarker.stamped_path(deck_path, f'viewer{viewer}@example.com')
+            samples.append(time.perf_counter() - start)
+        results['cached_viewer'] = summarize(samples)
+
+        samples = []
+        naive_path = os.path.join(workdir, 'naive.pdf')
+        for _ in range(args.naive_runs):
+            start = time.perf_counter()
+            naive_stamp(deck_path, stamped, naive_path)
+            samples.append(time.perf_counter() - start)
+        results['naive_merge'] = summarize(samples)
+
+    print(f"{args.pages}-page deck, {results['deck_bytes']} bytes (stamped copy {results['stamped_bytes']} bytes)")
+    print(f"{'case':14} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for case in ('first_viewer', 'new_viewer', 'cached_viewer', 'naive_merge'):
+        stats = results[case]
+        print(f"{case:14} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+
+    save_results(args.output, results)
+    print(f'Results written to {args.output}')
+    if results['new_viewer']['p95_ms'] > args.budget_ms:
+        print(f'FAIL: new-viewer p95 exceeded {args.budget_ms} ms')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run the real application from create_app against a throwaway
+SQLite database and upload folder in a temporary directory. Call
+setup_environment() before importing anything from app, because
+app.config reads the environment at import time.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def setup_environment(database_url=None, prefix='docone-bench-'):
+    """Point DATABASE_URL, UPLOAD_FOLDER and ARCHIVE_FOLDER at a temp directory"""
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    os.environ['ARCHIVE_FOLDER'] = os.path.join(workdir, 'archive')
+    return workdir
+
+def create_bench_app():
+    """Build the production app with settings that work over plain HTTP and create its schema"""
+    from app import create_app, db
+
+    app = create_app('production')
+    app.config['SESSION_COOKIE_SECURE'] = False
+    app.config['SQLALCHEMY_ECHO'] = False
+    with app.app_context():
+        db.create_all()
+    return app
+
+def write_pdf(path, pages):
+    """Write a blank PDF fixture with the given number of pages"""
+    from PyPDF2 import PdfWriter
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+def seed_owner(email='bench@example.com'):
+    """Create the document owner used by a benchmark run"""
+    from app import db
+    from app.models import User
+
+    user = User(email=email)
+    user.set_password('bench-password-1')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def seed_document(user, pages=10, index=0, **link_options):
+    """
+    Create a PDF document with one shareable link
+    Returns: (document, link)
+    """
+    from flask import current_app
+    from app import db
+    from app.models import Document
+    from app.services.link_generator import LinkGeneratorService
+
+    relative_path = os.path.join(str(user.id), f'bench-{index}.pdf')
+    write_pdf(os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path), pages)
+
+    document = Document(
+        user_id=user.id,
+        title=f'Benchmark deck {index}',
+        original_filename=f'bench-{index}.pdf',
+        file_type='pdf',
+        file_path=relative_path,
+        pdf_path=relative_path,
+        file_size=os.path.getsize(os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)),
+        page_count=pages
+    )
+    db.session.add(document)
+    db.session.commit()
+
+    link = LinkGeneratorService.create_link(document.id, name=f'bench-{index}', **link_options)
+    return document, link
+
+class QueryCounter:
+    """Count SQL statements and their time per thread via engine events"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+        self._local.seconds = getattr(self._local, 'seconds', 0.0) + time.perf_counter() - self._local.started
+
+    def reset(self):
+        self._local.count = 0
+        self._local.seconds = 0.0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    @property
+    def seconds(self):
+        return getattr(self._local, 'seconds', 0.0)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def summarize(samples):
+    """
+    Reduce latency samples (seconds) to a stats dict in milliseconds
+    Returns: dict with count, mean, p50, p95, p99, max
+    """
+    millis = [s * 1000 for s in samples]
+    return {
+        'count': len(millis),
+        'mean_ms': round(sum(millis) / len(millis), 3) if millis else 0.0,
+        'p50_ms': round(percentile(millis, 50), 3),
+        'p95_ms': round(percentile(millis, 95), 3),
+        'p99_ms': round(percentile(millis, 99), 3),
+        'max_ms': round(max(millis), 3) if millis else 0.0,
+    }
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,413 @@
+"""Synthetic large-scale dataset for performance testing.
+
+Bulk-loads users, documents, shareable links, view sessions and captured
+emails with production-like skew:
+- views per link follow a power law (Pareto weights, --skew), so a few links
+  carry most of the traffic
+- session durations are log-normal around a median of about 90 seconds, and
+  about 3% of sessions lost their final beacon and are still open
+- page paths read from page 1 to a Beta-distributed depth of the deck, with
+  occasional revisits
+- viewer emails come from a Zipf-distributed pool, so repeat viewers exist;
+  each owner's distinct emails become viewers rows that sessions and captured
+  emails point at
+- documents point at blank PDF fixtures of varied page counts (one file per
+  distinct page count, shared between documents)
+
+View rows are generated in NumPy chunks and written through the raw DBAPI
+connection: COPY on PostgreSQL (psycopg2), executemany elsewhere. Secondary
+indexes on document_views and captured_emails are dropped during the load and
+rebuilt afterwards. Other benchmarks call seed_dataset() inside an app context;
+run this file to seed a database on its own:
+
+    python benchmarks/dataset.py --views 10000000
+    python benchmarks/dataset.py --views 2000000 --database-url postgresql://localhost/docone_bench
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+from common import setup_environment, create_bench_app, seed_owner, write_pdf, save_results
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:120.0) Gecko/20100101 Firefox/120.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36',
+]
+COUNTRIES = ['US', 'GB', 'DE', 'FR', 'BR', 'IN', 'CA', 'NL', 'ES', 'AU']
+COUNTRY_WEIGHTS = [0.38, 0.12, 0.09, 0.07, 0.07, 0.07, 0.06, 0.05, 0.05, 0.04]
+
+VIEW_COLUMNS = [
+    'link_id', 'viewer_email', 'viewer_ip', 'viewer_user_agent', 'session_id', 'started_at', 'ended_at',
+    'duration_seconds', 'pages_bitmap', 'max_page_reached', 'total_page_views', 'current_page', 'last_seq', 'country',
+    'last_heartbeat_at', 'viewer_id',
+]
+EMAIL_COLUMNS = ['link_id', 'email', 'captured_at', 'ip_address', 'user_agent', 'viewed_document', 'viewer_id']
+VIEWER_COLUMNS = ['id', 'owner_id', 'email', 'first_seen_at', 'last_seen_at', 'visit_count']
+
+def timestamps(epoch_seconds):
+    """Format epoch seconds the way SQLAlchemy stores DateTime values on SQLite"""
+    import numpy as np
+
+    values = np.datetime_as_string(np.asarray(epoch_seconds * 1e6, dtype='int64').astype('datetime64[us]'), unit='us')
+    return np.char.replace(values, 'T', ' ').tolist()
+
+class BulkWriter:
+    """Append rows to a table over one raw DBAPI connection, with COPY where the driver has it"""
+
+    def __init__(self, engine):
+        self.connection = engine.raw_connection()
+        self.dialect = engine.dialect.name
+        self.placeholder = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+        cursor = self.connection.cursor()
+        self.copy = hasattr(cursor, 'copy_expert')
+        if self.dialect == 'sqlite':
+            cursor.execute('PRAGMA synchronous = OFF')
+        cursor.close()
+
+    def write(self, table, columns, rows):
+        cursor = self.connection.cursor()
+        if self.copy:
+            buffer = io.StringIO()
+            # bytea columns go in as hex text
+            csv.writer(buffer).writerows(
+                [f'\\x{value.hex()}' if isinstance(value, bytes) else value for value in row] for row in rows
+            )
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ', '.join([self.placeholder] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        cursor.close()
+        self.connection.commit()
+
+    def execute(self, statement, rows):
+        cursor = self.connection.cursor()
+        cursor.executemany(statement.replace('?', self.placeholder), rows)
+        cursor.close()
+        self.connection.commit()
+
+    def close(self):
+        if self.dialect == 'sqlite':
+            cursor = self.connection.cursor()
+            cursor.execute('PRAGMA synchronous = FULL')
+            cursor.close()
+        self.connection.close()
+
+def write_fixtures(page_counts):
+    """
+    Write one blank PDF per distinct page count under UPLOAD_FOLDER/fixtures
+    Returns: dict of page count -> (relative path, size in bytes)
+    """
+    from flask import current_app
+
+    fixtures = {}
+    for pages in sorted(set(page_counts)):
+        relative_path = os.path.join('fixtures', f'deck-{pages}.pdf')
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
+        if not os.path.exists(path):
+            write_pdf(path, pages)
+        fixtures[pages] = (relative_path, os.path.getsize(path))
+    return fixtures
+
+def seed_accounts(rng, users, documents_per_user, links_per_document, days, deleted_fraction):
+    """
+    Insert users, documents (as their version 1) and links
+    Returns: dict of NumPy arrays describing the links (id, document_index, owner_id, created_at, page_count,
+             require_email)
+    """
+    import numpy as np
+    from sqlalchemy import insert
+    from app import db
+    from app.models import User, Document, DocumentVersion, ShareableLink
+
+    now = datetime.utcnow()
+    owner = seed_owner()
+    db.session.execute(insert(User), [
+        {'email': f'owner{i}@example.com', 'password_hash': owner.password_hash,
+         'created_at': now - timedelta(days=days + 30)}
+        for i in range(1, users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+
+    document_count = len(user_ids) * documents_per_user
+    page_counts = np.clip(np.rint(rng.lognormal(np.log(12), 0.7, document_count)), 1, 200).astype(int)
+    fixtures = write_fixtures(page_counts.tolist())
+    document_ages = rng.uniform(0, days * 86400, document_count)
+    document_deleted = rng.random(document_count) < deleted_fraction
+
+    documents = []
+    for i, (pages, age, deleted) in enumerate(zip(page_counts.tolist(), document_ages.tolist(), document_deleted.tolist())):
+        created_at = now - timedelta(seconds=age)
+        path, size = fixtures[pages]
+        documents.append({
+            'user_id': user_ids[i // documents_per_user], 'title': f'Deck {i}', 'original_filename': f'deck-{i}.pdf',
+            'file_type': 'pdf', 'file_path': path, 'pdf_path': path, 'file_size': size, 'page_count': pages,
+            'created_at': created_at, 'updated_at': created_at, 'is_deleted': deleted, 'deleted_at': now if deleted else None,
+        })
+    db.session.execute(insert(Document), documents)
+    document_ids = np.array([row[0] for row in db.session.query(Document.id).order_by(Document.id)])
+    db.session.execute(insert(DocumentVersion), [
+        {'document_id': int(document_id), 'version': 1, 'original_filename': row['original_filename'],
+         'file_type': row['file_type'], 'file_path': row['file_path'], 'pdf_path': row['pdf_path'],
+         'file_size': row['file_size'], 'page_count': row['page_count'], 'created_at': row['created_at']}
+        for document_id, row in zip(document_ids.tolist(), documents)
+    ])
+
+    link_document = np.repeat(np.arange(document_count), links_per_document)
+    link_count = len(link_document)
+    # Links are created after their document, within the rest of the window
+    link_ages = document_ages[link_document] * rng.random(link_count)
+    require_email = rng.random(link_count) < 0.8
+    link_deleted = rng.random(link_count) < deleted_fraction
+
+    links = []
+    for i, (doc, age, email, deleted) in enumerate(zip(link_document.tolist(), link_ages.tolist(),
+                                                        require_email.tolist(), link_deleted.tolist())):
+        links.append({
+            'document_id': int(document_ids[doc]), 'link_code': f'seed-{i:08d}', 'name': f'Link {i}',
+            'require_email': email, 'created_at': now - timedelta(seconds=age),
+            'deleted_at': now if deleted else None, 'is_active': not (deleted or document_deleted[doc]),
+        })
+    db.session.execute(insert(ShareableLink), links)
+    db.session.commit()
+
+    return {
+        'id': np.array([row[0] for row in db.session.query(ShareableLink.id).order_by(ShareableLink.id)]),
+        'document_ids': document_ids,
+        'document_index': link_document,
+        'owner_id': np.array(user_ids)[link_document // documents_per_user],
+        'created_at': (now - datetime(1970, 1, 1)).total_seconds() - link_ages,
+        'page_count': page_counts[link_document],
+        'require_email': require_email,
+        'users': len(user_ids),
+        'documents': document_count,
+        'now': (now - datetime(1970, 1, 1)).total_seconds(),  # naive UTC, like the timestamps() output
+    }
+
+def view_chunk(rng, links, link_index, offset, viewer_pool, ips, path_cache, viewers):
+    """
+    Generate view rows for the given link positions
+    viewers maps (owner id, email pool index) to viewer ids and is extended with new viewers
+    Returns: (rows, started_at epoch seconds, email pool indexes or -1, viewer ids or 0, rows for new viewers)
+    """
+    import numpy as np
+    from app.services.analytics_tracker import AnalyticsTracker
+
+    size = len(link_index)
+    created = links['created_at'][link_index]
+    started = created + rng.random(size) * (links['now'] - created)
+    duration = np.clip(rng.lognormal(np.log(90), 1.1, size), 1, 3600).astype(int)
+    pages = links['page_count'][link_index]
+    max_page = np.clip(np.ceil(rng.beta(1.3, 1.6, size) * pages), 1, pages).astype(int)
+    page_views = max_page + rng.poisson(0.3 * max_page)
+    current_page = np.maximum(1, max_page - rng.poisson(0.5, size))
+    current_page = np.minimum(current_page, max_page)
+
+    has_email = links['require_email'][link_index]
+    email_index = np.where(has_email, (rng.zipf(1.6, size) - 1) % viewer_pool, -1)
+    ip_index = np.where(email_index >= 0, email_index, rng.integers(0, viewer_pool, size)) % len(ips)
+    agent_index = rng.integers(0, len(USER_AGENTS), size)
+    country_index = rng.choice(len(COUNTRIES), size, p=COUNTRY_WEIGHTS)
+
+    last_heartbeat = timestamps(started + duration)
+    # About 3% of final beacons are lost, leaving the session open
+    lost_beacon = rng.random(size) < 0.03
+    ended = [None if lost else heartbeat for lost, heartbeat in zip(lost_beacon.tolist(), last_heartbeat)]
+
+    viewer_ids = np.zeros(size, dtype=np.int64)
+    new_viewers = []
+    started_text = timestamps(started)
+    owners = links['owner_id'][link_index].tolist()
+    for position in np.flatnonzero(email_index >= 0).tolist():
+        key = (owners[position], int(email_index[position]))
+        viewer_id = viewers.get(key)
+        if viewer_id is None:
+            # Seen dates and visit counts are filled in once all sessions are generated
+            viewer_id = viewers[key] = len(viewers) + 1
+            new_viewers.append((viewer_id, key[0], f'viewer{key[1]}@example{key[1] % 97}.com',
+                                started_text[position], started_text[position], 0))
+        viewer_ids[position] = viewer_id
+
+    for depth in np.unique(max_page).tolist():
+        if depth not in path_cache:
+            path_cache[depth] = AnalyticsTracker.page_bitmap(range(1, depth + 1))
+
+    rows = list(zip(
+        links['id'][link_index].tolist(),
+        [f'viewer{index}@example{index % 97}.com' if index >= 0 else None for index in email_index.tolist()],
+        [ips[index] for index in ip_index.tolist()],
+        [USER_AGENTS[index] for index in agent_index.tolist()],
+        [f'seed-{offset + i:012x}' for i in range(size)],
+        started_text,
+        ended,
+        duration.tolist(),
+        [path_cache[depth] for depth in max_page.tolist()],
+        max_page.tolist(),
+        page_views.tolist(),
+        current_page.tolist(),
+        (duration // 15 + 1).tolist(),  # One heartbeat every 15 seconds
+        [COUNTRIES[index] for index in country_index.tolist()],
+        last_heartbeat,
+        [viewer_id or None for viewer_id in viewer_ids.tolist()],
+    ))
+    return rows, started, email_index, viewer_ids, new_viewers
+
+def seed_dataset(users=100, documents_per_user=10, links_per_document=3, views=1000000, skew=1.2, days=365,
+                 deleted_fraction=0.05, chunk_size=100000, seed=42, report=None):
+    """
+    Bulk-load a synthetic dataset into the app's database (call inside an app context)
+    Returns: dict with row counts, timings and the heaviest document and its owner
+    """
+    import numpy as np
+    from app import db
+    from app.models import DocumentView, CapturedEmail, Document, Viewer
+
+    started_at = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    links = seed_accounts(rng, users, documents_per_user, links_per_document, days, deleted_fraction)
+    accounts_seconds = time.perf_counter() - started_at
+
+    # Power-law traffic: Pareto weights per link
+    weights = rng.pareto(skew, len(links['id'])) + 1
+    probabilities = weights / weights.sum()
+    viewer_pool = max(1000, views // 20)
+    ips = [f'{a}.{b}.{c}.{d}' for a, b, c, d in rng.integers(1, 255, (min(viewer_pool, 65536), 4)).tolist()]
+    path_cache = {}
+
+    view_counts = np.zeros(len(links['id']), dtype=np.int64)
+    last_viewed = np.zeros(len(links['id']))
+    captured = set()
+    emails = 0
+    viewers = {}
+    viewer_first = np.zeros(0)
+    viewer_last = np.zeros(0)
+    viewer_visits = np.zeros(0, dtype=np.int64)
+
+    indexes = [index for table in (DocumentView.__table__, CapturedEmail.__table__, Viewer.__table__)
+               for index in table.indexes if not index.unique]
+    for index in indexes:
+        index.drop(db.engine)
+
+    writer = BulkWriter(db.engine)
+    views_started = time.perf_counter()
+    try:
+        for offset in range(0, views, chunk_size):
+            size = min(chunk_size, views - offset)
+            link_index = rng.choice(len(links['id']), size, p=probabilities)
+            rows, started, email_index, viewer_ids, new_viewers = view_chunk(
+                rng, links, link_index, offset, viewer_pool, ips, path_cache, viewers
+            )
+            if new_viewers:
+                writer.write('viewers', VIEWER_COLUMNS, new_viewers)
+            writer.write('document_views', VIEW_COLUMNS, rows)
+
+            np.add.at(view_counts, link_index, 1)
+            np.maximum.at(last_viewed, link_index, started)
+
+            grow = len(viewers) - len(viewer_visits)
+            viewer_first = np.concatenate([viewer_first, np.full(grow, np.inf)])
+            viewer_last = np.concatenate([viewer_last, np.zeros(grow)])
+            viewer_visits = np.concatenate([viewer_visits, np.zeros(grow, dtype=np.int64)])
+            seen = viewer_ids > 0
+            positions = viewer_ids[seen] - 1
+            np.add.at(viewer_visits, positions, 1)
+            np.minimum.at(viewer_first, positions, started[seen])
+            np.maximum.at(viewer_last, positions, started[seen])
+
+            # One captured email per (link, viewer), at that viewer's first session in the chunk order
+            email_rows = []
+            for position in np.flatnonzero(email_index >= 0).tolist():
+                key = (int(link_index[position]), int(email_index[position]))
+                if key not in captured:
+                    captured.add(key)
+                    row = rows[position]
+                    email_rows.append((row[0], row[1], row[5], row[2], row[3], True, row[-1]))
+            if email_rows:
+                writer.write('captured_emails', EMAIL_COLUMNS, email_rows)
+                emails += len(email_rows)
+
+            if report:
+                done = offset + size
+                report(f'{done}/{views} views ({done / (time.perf_counter() - views_started):,.0f}/s)')
+
+        viewed = np.flatnonzero(view_counts)
+        writer.execute(
+            'UPDATE shareable_links SET view_count = ?, last_viewed_at = ? WHERE id = ?',
+            list(zip(view_counts[viewed].tolist(), timestamps(last_viewed[viewed]), links['id'][viewed].tolist()))
+        )
+        if viewers:
+            writer.execute(
+                'UPDATE viewers SET first_seen_at = ?, last_seen_at = ?, visit_count = ? WHERE id = ?',
+                list(zip(timestamps(viewer_first), timestamps(viewer_last), viewer_visits.tolist(),
+                         range(1, len(viewers) + 1)))
+            )
+            if writer.dialect == 'postgresql':
+                writer.execute("SELECT setval(pg_get_serial_sequence('viewers', 'id'), ?)", [(len(viewers),)])
+    finally:
+        writer.close()
+    views_seconds = time.perf_counter() - views_started
+
+    index_started = time.perf_counter()
+    for index in indexes:
+        index.create(db.engine)
+    index_seconds = time.perf_counter() - index_started
+
+    document_views = np.bincount(links['document_index'], weights=view_counts)
+    heaviest = int(links['document_ids'][document_views.argmax()])
+    owner_id = db.session.query(Document.user_id).filter_by(id=heaviest).scalar()
+    db.session.expire_all()
+
+    return {
+        'users': links['users'],
+        'documents': links['documents'],
+        'links': len(links['id']),
+        'views': views,
+        'captured_emails': emails,
+        'viewers': len(viewers),
+        'top_link_share': round(float(view_counts.max() / max(views, 1)), 4),
+        'heaviest_document_id': heaviest,
+        'heaviest_document_owner_id': owner_id,
+        'accounts_seconds': round(accounts_seconds, 2),
+        'views_seconds': round(views_seconds, 2),
+        'index_seconds': round(index_seconds, 2),
+        'views_per_second': round(views / views_seconds) if views_seconds else 0,
+        'total_seconds': round(time.perf_counter() - started_at, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--documents-per-user', type=int, default=10)
+    parser.add_argument('--links-per-document', type=int, default=3)
+    parser.add_argument('--views', type=int, default=1000000)
+    parser.add_argument('--skew', type=float, default=1.2, help='Pareto shape of views per link; lower is more skewed')
+    parser.add_argument('--days', type=int, default=365, help='How far back documents, links and views go')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--output', help='Write the summary as JSON')
+    args = parser.parse_args()
+
+    workdir = setup_environment(args.database_url, prefix='docone-dataset-')
+    app = create_bench_app()
+    with app.app_context():
+        summary = seed_dataset(users=args.users, documents_per_user=args.documents_per_user,
+                               links_per_document=args.links_per_document, views=args.views, skew=args.skew,
+                               days=args.days, chunk_size=args.chunk_size, seed=args.seed,
+                               report=lambda line: print(f'\r{line}', end='', flush=True))
+    print()
+    for key, value in summary.items():
+        print(f'{key:<28} {value}')
+    print(f"\nDATABASE_URL={os.environ['DATABASE_URL']}")
+    print(f"UPLOAD_FOLDER={os.environ['UPLOAD_FOLDER']}")
+    if args.output:
+        save_results(args.output, {'args': vars(args), 'summary': summary, 'workdir': workdir})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Initial schema: users, documents, links, view sessions, rollups and captured emails
+
+Revision ID: 0b7d3e5a9c21
+Revises:
+Create Date: 2026-10-19 16:01:57.412086
+
+The schema as create_app's create_all left it before migrations existed.
+Tables that are already there (created by create_all on boot) are skipped,
+so `flask db upgrade` brings such a database forward from this revision.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7d3e5a9c21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return {
+        'users': lambda: op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('email', sa.String(120), nullable=False),
+            sa.Column('password_hash', sa.String(255), nullable=False),
+            sa.Column('full_name', sa.String(100)),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime()),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+        ),
+        'documents': lambda: op.create_table(
+            'documents',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('title', sa.String(255), nullable=False),
+            sa.Column('original_filename', sa.String(255), nullable=False),
+            sa.Column('file_type', sa.String(10), nullable=False),
+            sa.Column('file_path', sa.String(500), nullable=False),
+            sa.Column('pdf_path', sa.String(500)),
+            sa.Column('file_size', sa.BigInteger()),
+            sa.Column('page_count', sa.Integer()),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime()),
+            sa.Column('is_deleted', sa.Boolean(), nullable=False),
+            sa.Column('deleted_at', sa.DateTime()),
+        ),
+        'shareable_links': lambda: op.create_table(
+            'shareable_links',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id'), nullable=False),
+            sa.Column('link_code', sa.String(32), nullable=False),
+            sa.Column('name', sa.String(100)),
+            sa.Column('password_hash', sa.String(255)),
+            sa.Column('require_email', sa.Boolean(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+            sa.Column('expires_at', sa.DateTime()),
+            sa.Column('max_views', sa.Integer()),
+            sa.Column('view_count', sa.Integer(), nullable=False),
+            sa.Column('custom_message', sa.Text()),
+            sa.Column('allow_download', sa.Boolean(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('last_viewed_at', sa.DateTime()),
+        ),
+        'document_views': lambda: op.create_table(
+            'document_views',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('link_id', sa.Integer(), sa.ForeignKey('shareable_links.id'), nullable=False),
+            sa.Column('viewer_email', sa.String(120)),
+            sa.Column('viewer_ip', sa.String(45)),
+            sa.Column('viewer_user_agent', sa.String(500)),
+            sa.Column('session_id', sa.String(64), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=False),
+            sa.Column('ended_at', sa.DateTime()),
+            sa.Column('duration_seconds', sa.Integer()),
+            sa.Column('pages_viewed', sa.JSON()),
+            sa.Column('max_page_reached', sa.Integer()),
+            sa.Column('total_page_views', sa.Integer()),
+            sa.Column('current_page', sa.Integer()),
+            sa.Column('country', sa.String(2)),
+            sa.Column('city', sa.String(100)),
+        ),
+        'document_view_rollups': lambda: op.create_table(
+            'document_view_rollups',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('link_id', sa.Integer(), sa.ForeignKey('shareable_links.id'), nullable=False),
+            sa.Column('period_start', sa.DateTime(), nullable=False),
+            sa.Column('view_count', sa.Integer(), nullable=False),
+            sa.Column('unique_viewers', sa.Integer(), nullable=False),
+            sa.Column('duration_total', sa.BigInteger(), nullable=False),
+            sa.Column('duration_samples', sa.Integer(), nullable=False),
+            sa.UniqueConstraint('link_id', 'period_start', name='uq_document_view_rollups_link_period'),
+        ),
+        'captured_emails': lambda: op.create_table(
+            'captured_emails',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('link_id', sa.Integer(), sa.ForeignKey('shareable_links.id'), nullable=False),
+            sa.Column('email', sa.String(120), nullable=False),
+            sa.Column('captured_at', sa.DateTime(), nullable=False),
+            sa.Column('full_name', sa.String(100)),
+            sa.Column('company', sa.String(100)),
+            sa.Column('ip_address', sa.String(45)),
+            sa.Column('user_agent', sa.String(500)),
+            sa.Column('viewed_document', sa.Boolean(), nullable=False),
+        ),
+    }
+
+
+# index name, table, columns, unique (as create_all names them)
+INDEXES = [
+    ('ix_users_email', 'users', ['email'], True),
+    ('ix_documents_user_id', 'documents', ['user_id'], False),
+    ('ix_documents_created_at', 'documents', ['created_at'], False),
+    ('ix_shareable_links_document_id', 'shareable_links', ['document_id'], False),
+    ('ix_shareable_links_link_code', 'shareable_links', ['link_code'], True),
+    ('ix_document_views_link_id', 'document_views', ['link_id'], False),
+    ('ix_document_views_viewer_email', 'document_views', ['viewer_email'], False),
+    ('ix_document_views_session_id', 'document_views', ['session_id'], True),
+    ('ix_document_views_started_at', 'document_views', ['started_at'], False),
+    ('ix_document_view_rollups_link_id', 'document_view_rollups', ['link_id'], False),
+    ('ix_captured_emails_link_id', 'captured_emails', ['link_id'], False),
+    ('ix_captured_emails_email', 'captured_emails', ['email'], False),
+]
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    created = set()
+    for table, create in _tables().items():
+        if table not in existing:
+            create()
+            created.add(table)
+
+    for name, table, columns, unique in INDEXES:
+        if table in created:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for table in reversed(list(_tables())):
+        op.drop_table(table)
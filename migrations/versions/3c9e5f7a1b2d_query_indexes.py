@@ -0,0 +1,50 @@
+"""Composite and partial indexes for the dashboard, link and stats queries
+
+Revision ID: 3c9e5f7a1b2d
+Revises: d5a1c8e4f297
+Create Date: 2026-10-19 10:12:44.318207
+
+On PostgreSQL indexes are built CONCURRENTLY so the tables stay writable.
+A partitioned document_views gets each index ON ONLY the parent first, then
+built concurrently per partition and attached.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e5f7a1b2d'
+down_revision = 'd5a1c8e4f297'
+branch_labels = None
+depends_on = None
+
+
+# name, table, columns, partial-index predicate
+INDEXES = [
+    ('ix_documents_user_deleted_created', 'documents', ['user_id', 'is_deleted', 'created_at'], None),
+    ('ix_shareable_links_document_created', 'shareable_links', ['document_id', 'created_at'], 'deleted_at IS NULL'),
+    ('ix_document_views_link_started', 'document_views', ['link_id', 'started_at'], None),
+    ('ix_document_views_link_email', 'document_views', ['link_id', 'viewer_email', 'started_at'],
+     'viewer_email IS NOT NULL'),
+]
+
+# Single-column indexes that are a prefix of one of the above
+REDUNDANT_INDEXES = [
+    ('ix_documents_user_id', 'documents', ['user_id']),
+    ('ix_document_views_link_id', 'document_views', ['link_id']),
+]
+
+def upgrade():
+    for name, table, columns, where in INDEXES:
+        create_index(name, table, columns, where)
+    for name, table, _columns in REDUNDANT_INDEXES:
+        drop_index(name, table)
+
+
+def downgrade():
+    for name, table, columns in REDUNDANT_INDEXES:
+        create_index(name, table, columns)
+    for name, table, _columns, _where in INDEXES:
+        drop_index(name, table)
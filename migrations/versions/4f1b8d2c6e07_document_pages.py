@@ -0,0 +1,50 @@
+"""Per-page document text and its full-text search index
+
+Revision ID: 4f1b8d2c6e07
+Revises: 0b7d3e5a9c21
+Create Date: 2026-10-19 16:44:21.630915
+
+Creates document_pages with the dialect's search index (a generated
+tsvector column with a GIN index on PostgreSQL, an FTS5 table and sync
+triggers on SQLite) and documents.text_indexed_at. Existing documents are
+left unindexed; `flask docone search index` extracts their text.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.document_page import SEARCH_INDEX_DDL
+from app.utils.migrations import add_column
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1b8d2c6e07'
+down_revision = '0b7d3e5a9c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('documents', sa.Column('text_indexed_at', sa.DateTime()))
+
+    if 'document_pages' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'document_pages',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('page_number', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.UniqueConstraint('document_id', 'page_number', name='uq_document_pages_document_page'),
+    )
+    op.create_index('ix_document_pages_user_id', 'document_pages', ['user_id'])
+    for statement in SEARCH_INDEX_DDL.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS document_pages_fts')
+    op.drop_table('document_pages')
+    with op.batch_alter_table('documents') as batch:
+        batch.drop_column('text_indexed_at')
@@ -0,0 +1,145 @@
+"""Deduplicated viewers per owner, referenced by sessions and captured emails
+
+Revision ID: 5e8a1c3f7b24
+Revises: c47e1f9a3d58
+Create Date: 2026-10-19 18:40:13.207561
+
+Existing captured emails and sessions are backfilled in id batches, each in
+its own transaction, so the tables stay writable during the upgrade. Every
+captured email counts as one visit; emails only seen on sessions (the
+/api/track/start path) get a viewer without visits. Rows written while the
+backfill runs already carry viewer_id and are skipped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column, create_index, drop_index, is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a1c3f7b24'
+down_revision = 'c47e1f9a3d58'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 20000
+
+# The normalization ViewerRegistry.normalize_email applies
+NORMALIZED = 'lower(trim({}))'
+
+VIEWER_CAPTURES = """
+    INSERT INTO viewers (owner_id, email, first_seen_at, last_seen_at, visit_count)
+    SELECT documents.user_id, {email}, min(captured_emails.captured_at), max(captured_emails.captured_at), count(*)
+    FROM captured_emails
+    JOIN shareable_links ON shareable_links.id = captured_emails.link_id
+    JOIN documents ON documents.id = shareable_links.document_id
+    WHERE captured_emails.id >= :low AND captured_emails.id < :high AND captured_emails.viewer_id IS NULL
+    GROUP BY documents.user_id, {email}
+    ON CONFLICT (owner_id, email) DO UPDATE SET
+        first_seen_at = {least}(viewers.first_seen_at, excluded.first_seen_at),
+        last_seen_at = {greatest}(viewers.last_seen_at, excluded.last_seen_at),
+        visit_count = viewers.visit_count + excluded.visit_count
+"""
+
+VIEWER_SESSIONS = """
+    INSERT INTO viewers (owner_id, email, first_seen_at, last_seen_at, visit_count)
+    SELECT documents.user_id, {email}, min(document_views.started_at), max(document_views.started_at), 0
+    FROM document_views
+    JOIN shareable_links ON shareable_links.id = document_views.link_id
+    JOIN documents ON documents.id = shareable_links.document_id
+    WHERE document_views.id >= :low AND document_views.id < :high
+        AND document_views.viewer_id IS NULL AND {email} <> ''
+    GROUP BY documents.user_id, {email}
+    ON CONFLICT (owner_id, email) DO NOTHING
+"""
+
+# table, email column
+LINKED_TABLES = [('captured_emails', 'email'), ('document_views', 'viewer_email')]
+
+LINK_VIEWERS = """
+    UPDATE {table} SET viewer_id = (
+        SELECT viewers.id FROM viewers
+        JOIN documents ON documents.user_id = viewers.owner_id
+        JOIN shareable_links ON shareable_links.document_id = documents.id
+        WHERE shareable_links.id = {table}.link_id AND viewers.email = {email}
+    )
+    WHERE {table}.id >= :low AND {table}.id < :high AND {table}.viewer_id IS NULL AND {table}.{column} IS NOT NULL
+"""
+
+
+def _batches(table):
+    """Half-open id ranges covering the table"""
+    low, high = op.get_bind().execute(sa.text(f'SELECT min(id), max(id) FROM {table}')).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, BATCH_SIZE):
+        yield {'low': start, 'high': start + BATCH_SIZE}
+
+
+def _create_viewers():
+    if 'viewers' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'viewers',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('email', sa.String(120), nullable=False),
+        sa.Column('full_name', sa.String(100)),
+        sa.Column('company', sa.String(100)),
+        sa.Column('first_seen_at', sa.DateTime(), nullable=False),
+        sa.Column('last_seen_at', sa.DateTime(), nullable=False),
+        sa.Column('visit_count', sa.Integer(), nullable=False),
+        sa.UniqueConstraint('owner_id', 'email', name='uq_viewers_owner_email'),
+    )
+
+
+def _viewer_id():
+    # SQLite cannot add a constraint to an existing table, and does not enforce foreign keys here anyway
+    if not is_postgres():
+        return sa.Column('viewer_id', sa.Integer())
+    return sa.Column('viewer_id', sa.Integer(), sa.ForeignKey('viewers.id', ondelete='SET NULL'))
+
+
+def _backfill():
+    least, greatest = ('least', 'greatest') if is_postgres() else ('min', 'max')
+    steps = [
+        ('captured_emails', VIEWER_CAPTURES.format(email=NORMALIZED.format('captured_emails.email'),
+                                                   least=least, greatest=greatest)),
+        ('document_views', VIEWER_SESSIONS.format(email=NORMALIZED.format('document_views.viewer_email'))),
+    ]
+    steps += [
+        (table, LINK_VIEWERS.format(table=table, column=column, email=NORMALIZED.format(f'{table}.{column}')))
+        for table, column in LINKED_TABLES
+    ]
+
+    bind = op.get_bind()
+    for table, statement in steps:
+        for batch in _batches(table):
+            with op.get_context().autocommit_block():
+                bind.execute(sa.text(statement), batch)
+
+
+def upgrade():
+    _create_viewers()
+    add_column('captured_emails', _viewer_id())
+    add_column('document_views', _viewer_id())
+
+    _backfill()
+
+    create_index('ix_captured_emails_viewer_id', 'captured_emails', ['viewer_id'])
+    create_index('ix_document_views_link_viewer', 'document_views', ['link_id', 'viewer_id', 'started_at'],
+                 where='viewer_id IS NOT NULL')
+    drop_index('ix_document_views_link_email', 'document_views')
+
+
+def downgrade():
+    create_index('ix_document_views_link_email', 'document_views', ['link_id', 'viewer_email', 'started_at'],
+                 where='viewer_email IS NOT NULL')
+    drop_index('ix_document_views_link_viewer', 'document_views')
+    drop_index('ix_captured_emails_viewer_id', 'captured_emails')
+    with op.batch_alter_table('document_views') as batch:
+        batch.drop_column('viewer_id')
+    with op.batch_alter_table('captured_emails') as batch:
+        batch.drop_column('viewer_id')
+    op.drop_table('viewers')
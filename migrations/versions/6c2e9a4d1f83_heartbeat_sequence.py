@@ -0,0 +1,28 @@
+"""Sequence number of the last applied heartbeat batch
+
+Revision ID: 6c2e9a4d1f83
+Revises: 4f1b8d2c6e07
+Create Date: 2026-10-19 17:31:09.554207
+
+Existing sessions start at 0, so any batch from a page still open is newer.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2e9a4d1f83'
+down_revision = '4f1b8d2c6e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('document_views', sa.Column('last_seq', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('document_views') as batch:
+        batch.drop_column('last_seq')
@@ -0,0 +1,30 @@
+"""Track the last heartbeat of view sessions and index open sessions
+
+Revision ID: 8d2a4b6c0e13
+Revises: 3c9e5f7a1b2d
+Create Date: 2026-10-19 14:05:31.902144
+
+Sessions open before this revision have no last_heartbeat_at; the idle
+sweep falls back to started_at for them.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column, create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2a4b6c0e13'
+down_revision = '3c9e5f7a1b2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('document_views', sa.Column('last_heartbeat_at', sa.DateTime()))
+    create_index('ix_document_views_open', 'document_views', ['started_at'], where='ended_at IS NULL')
+
+
+def downgrade():
+    drop_index('ix_document_views_open', 'document_views')
+    op.drop_column('document_views', 'last_heartbeat_at')
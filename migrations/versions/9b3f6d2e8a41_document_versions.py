@@ -0,0 +1,80 @@
+"""Document versions, and the version each view session opened
+
+Revision ID: 9b3f6d2e8a41
+Revises: 5e8a1c3f7b24
+Create Date: 2026-10-19 19:55:41.083126
+
+Every existing document becomes version 1 of itself, backfilled in id
+batches, each in its own transaction. The new integer columns carry a
+constant server default, which PostgreSQL adds without rewriting the table,
+so existing sessions read as version 1 immediately.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3f6d2e8a41'
+down_revision = '5e8a1c3f7b24'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 20000
+
+FIRST_VERSIONS = """
+    INSERT INTO document_versions (document_id, version, original_filename, file_type, file_path, pdf_path,
+                                   file_size, page_count, created_at)
+    SELECT id, 1, original_filename, file_type, file_path, pdf_path, file_size, page_count, created_at
+    FROM documents
+    WHERE id >= :low AND id < :high
+        AND NOT EXISTS (SELECT 1 FROM document_versions WHERE document_versions.document_id = documents.id)
+"""
+
+
+def _create_document_versions():
+    if 'document_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'document_versions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('original_filename', sa.String(255), nullable=False),
+        sa.Column('file_type', sa.String(10), nullable=False),
+        sa.Column('file_path', sa.String(500), nullable=False),
+        sa.Column('pdf_path', sa.String(500)),
+        sa.Column('file_size', sa.BigInteger()),
+        sa.Column('page_count', sa.Integer()),
+        sa.Column('page_hashes', sa.JSON()),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('document_id', 'version', name='uq_document_versions_document_version'),
+    )
+
+
+def _backfill():
+    bind = op.get_bind()
+    low, high = bind.execute(sa.text('SELECT min(id), max(id) FROM documents')).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, BATCH_SIZE):
+        with op.get_context().autocommit_block():
+            bind.execute(sa.text(FIRST_VERSIONS), {'low': start, 'high': start + BATCH_SIZE})
+
+
+def upgrade():
+    _create_document_versions()
+    add_column('documents', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    add_column('document_views', sa.Column('document_version', sa.Integer(), server_default='1', nullable=False))
+
+    _backfill()
+
+
+def downgrade():
+    with op.batch_alter_table('document_views') as batch:
+        batch.drop_column('document_version')
+    with op.batch_alter_table('documents') as batch:
+        batch.drop_column('version')
+    op.drop_table('document_versions')
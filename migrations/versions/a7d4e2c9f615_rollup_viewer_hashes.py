@@ -0,0 +1,29 @@
+"""Distinct viewer hashes on monthly rollups
+
+Revision ID: a7d4e2c9f615
+Revises: f3c8b1d6a527
+Create Date: 2026-10-20 09:12:44.208913
+
+Rollups compacted before this revision keep a NULL viewer_hashes; their
+unique_viewers stay per-month counts and are reported as an estimate.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e2c9f615'
+down_revision = 'f3c8b1d6a527'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('document_view_rollups', sa.Column('viewer_hashes', sa.LargeBinary()))
+
+
+def downgrade():
+    with op.batch_alter_table('document_view_rollups') as batch:
+        batch.drop_column('viewer_hashes')
@@ -0,0 +1,28 @@
+"""Watermark flag on shareable links
+
+Revision ID: b18e6f3a9d52
+Revises: 6c2e9a4d1f83
+Create Date: 2026-10-19 17:58:40.219634
+
+Existing links stay unstamped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column
+
+
+# revision identifiers, used by Alembic.
+revision = 'b18e6f3a9d52'
+down_revision = '6c2e9a4d1f83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('shareable_links', sa.Column('watermark', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('shareable_links') as batch:
+        batch.drop_column('watermark')
@@ -0,0 +1,29 @@
+"""Index view sessions waiting for GeoIP enrichment
+
+Revision ID: c47e1f9a3d58
+Revises: 8d2a4b6c0e13
+Create Date: 2026-10-19 17:22:09.554310
+
+Every existing session has country NULL, so right after this revision the
+index covers the whole history; the first `flask docone geoip enrich`
+shrinks it to new sessions only.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e1f9a3d58'
+down_revision = '8d2a4b6c0e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_document_views_geo_pending', 'document_views', ['id'], where='country IS NULL')
+
+
+def downgrade():
+    drop_index('ix_document_views_geo_pending', 'document_views')
@@ -0,0 +1,61 @@
+"""Soft-deleted links and ON DELETE CASCADE foreign keys
+
+Revision ID: d5a1c8e4f297
+Revises: b18e6f3a9d52
+Create Date: 2026-10-19 18:12:27.640915
+
+shareable_links.deleted_at marks a link whose purge is pending. On
+PostgreSQL the foreign keys from links, pages, views, rollups and captured
+emails are recreated with ON DELETE CASCADE (NOT VALID, then validated, so
+the tables stay writable); SQLite does not enforce them, so it is skipped
+there. `downgrade` drops deleted_at and leaves the cascades in place.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column, is_postgres, partitions
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a1c8e4f297'
+down_revision = 'b18e6f3a9d52'
+branch_labels = None
+depends_on = None
+
+
+# table, column, referenced table
+CASCADE_FOREIGN_KEYS = [
+    ('shareable_links', 'document_id', 'documents'),
+    ('document_pages', 'document_id', 'documents'),
+    ('document_views', 'link_id', 'shareable_links'),
+    ('document_view_rollups', 'link_id', 'shareable_links'),
+    ('captured_emails', 'link_id', 'shareable_links'),
+]
+
+
+def _cascade_foreign_keys():
+    """Recreate foreign keys with ON DELETE CASCADE (SQLite does not enforce them, so only PostgreSQL)"""
+    if not is_postgres():
+        return
+    inspector = sa.inspect(op.get_bind())
+    for table, column, referred in CASCADE_FOREIGN_KEYS:
+        for fk in inspector.get_foreign_keys(table):
+            if fk['constrained_columns'] != [column] or (fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE':
+                continue
+            op.drop_constraint(fk['name'], table, type_='foreignkey')
+            # NOT VALID skips the full-table check under the ALTER's lock; partitioned tables do not allow it
+            partitioned = partitions(table) is not None
+            op.create_foreign_key(fk['name'], table, referred, [column], ['id'], ondelete='CASCADE',
+                                  postgresql_not_valid=not partitioned)
+            if not partitioned:
+                op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {fk["name"]}')
+
+
+def upgrade():
+    add_column('shareable_links', sa.Column('deleted_at', sa.DateTime()))
+    _cascade_foreign_keys()
+
+
+def downgrade():
+    with op.batch_alter_table('shareable_links') as batch:
+        batch.drop_column('deleted_at')
@@ -0,0 +1,73 @@
+"""Data room bundles, and PDF checksums for streaming them as ZIPs
+
+Revision ID: e2a7c5b9d146
+Revises: 9b3f6d2e8a41
+Create Date: 2026-10-19 21:12:37.640219
+
+pdf_crc32 starts empty for existing documents; the first download of a
+bundle computes it for each of its documents and stores it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import add_column, create_index, drop_index, is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c5b9d146'
+down_revision = '9b3f6d2e8a41'
+branch_labels = None
+depends_on = None
+
+
+def _create_bundles():
+    if 'bundles' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'bundles',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('link_code', sa.String(32), nullable=False),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('password_hash', sa.String(255)),
+        sa.Column('require_email', sa.Boolean(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('expires_at', sa.DateTime()),
+        sa.Column('max_views', sa.Integer()),
+        sa.Column('view_count', sa.Integer(), nullable=False),
+        sa.Column('download_count', sa.Integer(), nullable=False),
+        sa.Column('custom_message', sa.Text()),
+        sa.Column('allow_download', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_viewed_at', sa.DateTime()),
+        sa.Column('deleted_at', sa.DateTime()),
+    )
+    op.create_index('ix_bundles_link_code', 'bundles', ['link_code'], unique=True)
+    op.create_index('ix_bundles_user_id', 'bundles', ['user_id'])
+
+
+def _bundle_id():
+    # SQLite cannot add a constraint to an existing table, and does not enforce foreign keys here anyway
+    if not is_postgres():
+        return sa.Column('bundle_id', sa.Integer())
+    return sa.Column('bundle_id', sa.Integer(), sa.ForeignKey('bundles.id', ondelete='CASCADE'))
+
+
+def upgrade():
+    _create_bundles()
+    add_column('shareable_links', _bundle_id())
+    add_column('documents', sa.Column('pdf_crc32', sa.BigInteger()))
+    add_column('document_versions', sa.Column('pdf_crc32', sa.BigInteger()))
+
+    create_index('ix_shareable_links_bundle_id', 'shareable_links', ['bundle_id'])
+
+
+def downgrade():
+    drop_index('ix_shareable_links_bundle_id', 'shareable_links')
+    with op.batch_alter_table('document_versions') as batch:
+        batch.drop_column('pdf_crc32')
+    with op.batch_alter_table('documents') as batch:
+        batch.drop_column('pdf_crc32')
+    with op.batch_alter_table('shareable_links') as batch:
+        batch.drop_column('bundle_id')
+    op.drop_table('bundles')
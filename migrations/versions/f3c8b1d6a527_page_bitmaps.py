@@ -0,0 +1,71 @@
+"""Page bitmaps replace the JSON pages_viewed list of view sessions
+
+Revision ID: f3c8b1d6a527
+Revises: e2a7c5b9d146
+Create Date: 2026-10-19 22:40:18.315902
+
+Existing lists are encoded into pages_bitmap in id batches, each in its own
+transaction, before pages_viewed is dropped. A downgrade rebuilds the lists
+from the bitmaps in page order; the order pages were first entered is lost.
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.analytics_tracker import AnalyticsTracker
+from app.utils.migrations import add_column, column_exists
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8b1d6a527'
+down_revision = 'e2a7c5b9d146'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 20000
+
+
+def _convert(source, target, encode):
+    """Rewrite `source` into `target` for every session that has one, in id batches"""
+    bind = op.get_bind()
+    low, high = bind.execute(sa.text('SELECT min(id), max(id) FROM document_views')).one()
+    if low is None:
+        return
+
+    views = sa.table('document_views', sa.column('id', sa.Integer()), sa.column('pages_viewed', sa.JSON()),
+                     sa.column('pages_bitmap', sa.LargeBinary()))
+    select = sa.select(views.c.id, views.c[source]).where(
+        views.c.id >= sa.bindparam('low'), views.c.id < sa.bindparam('high'), views.c[source].isnot(None)
+    )
+    update = views.update().where(views.c.id == sa.bindparam('view_id')).values({target: sa.bindparam('value')})
+
+    for start in range(low, high + 1, BATCH_SIZE):
+        with op.get_context().autocommit_block():
+            rows = bind.execute(select, {'low': start, 'high': start + BATCH_SIZE}).all()
+            values = [{'view_id': view_id, 'value': encode(value)} for view_id, value in rows]
+            if values:
+                bind.execute(update, values)
+
+
+def _bitmap(pages_viewed):
+    if isinstance(pages_viewed, str):
+        pages_viewed = json.loads(pages_viewed)
+    return AnalyticsTracker.page_bitmap(pages_viewed or [])
+
+
+def upgrade():
+    add_column('document_views', sa.Column('pages_bitmap', sa.LargeBinary()))
+
+    if column_exists('document_views', 'pages_viewed'):
+        _convert('pages_viewed', 'pages_bitmap', _bitmap)
+        with op.batch_alter_table('document_views') as batch:
+            batch.drop_column('pages_viewed')
+
+
+def downgrade():
+    add_column('document_views', sa.Column('pages_viewed', sa.JSON()))
+    _convert('pages_bitmap', 'pages_viewed', AnalyticsTracker.bitmap_pages)
+    with op.batch_alter_table('document_views') as batch:
+        batch.drop_column('pages_bitmap')
@@ -1,9 +1,18 @@
 import os
 from app import create_app
 
-# Create Flask app with configuration from environment
+# Configuration comes from the environment
 config_name = os.environ.get('FLASK_ENV', 'development')
-app = create_app(config_name)
+_app = None
+
+def __getattr__(name):
+    """Build the app on first access (gunicorn "run:app", flask --app run) instead of at import"""
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app(config_name)
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app(config_name).run(host='0.0.0.0', port=5000, debug=True)
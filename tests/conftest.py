@@ -0,0 +1,56 @@
+import pytest
+
+from app import create_app, db as _db
+
+
+# Not named `app`: pytest-flask would hold a request context open for the whole test, and
+# test client requests would then share its g (including Flask-Login's cached user)
+@pytest.fixture
+def flask_app(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['ARCHIVE_FOLDER'] = str(tmp_path / 'archive')
+
+    with app.app_context():
+        _db.create_all()
+    yield app
+    with app.app_context():
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def owner_id(flask_app):
+    from app.models import User
+
+    with flask_app.app_context():
+        user = User(email='owner@example.com', full_name='Owner')
+        user.set_password('owner-password-1')
+        _db.session.add(user)
+        _db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def logged_in(client, owner_id):
+    response = client.post('/auth/login', data={'email': 'owner@example.com', 'password': 'owner-password-1'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def link_id(flask_app, owner_id):
+    from app.models import Document
+    from app.services.link_generator import LinkGeneratorService
+
+    with flask_app.app_context():
+        document = Document(user_id=owner_id, title='Deck', original_filename='deck.pdf', file_type='pdf',
+                            file_path='deck.pdf', file_size=1, page_count=3)
+        _db.session.add(document)
+        _db.session.commit()
+        return LinkGeneratorService.create_link(document.id).id
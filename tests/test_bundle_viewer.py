@@ -0,0 +1,31 @@
+from app import db
+from app.models import Document
+from app.models.email_capture import CapturedEmail
+from app.models.viewer import Viewer
+from app.services.bundles import BundleService
+
+
+def test_bundle_email_gate_records_the_viewer(flask_app, client, owner_id):
+    with flask_app.app_context():
+        document_ids = []
+        for title in ('Deck', 'Terms'):
+            document = Document(user_id=owner_id, title=title, original_filename=f'{title}.pdf', file_type='pdf',
+                                file_path=f'{title}.pdf', file_size=1, page_count=1)
+            db.session.add(document)
+            db.session.commit()
+            document_ids.append(document.id)
+        bundle = BundleService.create_bundle(owner_id, 'Data room', document_ids)
+        link_code = bundle.link_code
+        link_ids = {link.id for link in bundle.items}
+
+    response = client.post(f'/b/{link_code}/email', data={'email': ' Alice@Example.com', 'full_name': 'Alice'},
+                           headers={'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0'})
+    assert response.status_code == 302
+
+    with flask_app.app_context():
+        captured = CapturedEmail.query.all()
+        viewer = Viewer.query.one()
+        assert {row.link_id for row in captured} == link_ids
+        assert {row.viewer_id for row in captured} == {viewer.id}
+        assert (viewer.owner_id, viewer.email, viewer.full_name, viewer.visit_count) == \
+            (owner_id, 'alice@example.com', 'Alice', 1)
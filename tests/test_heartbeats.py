@@ -0,0 +1,28 @@
+from app import db
+from app.models.analytics import DocumentView
+from app.services.analytics_tracker import AnalyticsTracker
+
+
+def ended_at(session_id):
+    db.session.expire_all()
+    return DocumentView.query.filter_by(session_id=session_id).one().ended_at
+
+
+def test_newer_batch_after_the_final_one_reopens_the_session(flask_app, link_id):
+    with flask_app.app_context():
+        db.session.add(DocumentView(link_id=link_id, session_id='restored'))
+        db.session.commit()
+
+        AnalyticsTracker.apply_heartbeat('restored', 1, entered_pages=[1], duration_seconds=5)
+        AnalyticsTracker.apply_heartbeat('restored', 2, duration_seconds=8, is_final=True)
+        assert ended_at('restored') is not None
+
+        # A retried batch from before the final beacon leaves it closed
+        AnalyticsTracker.apply_heartbeat('restored', 1, entered_pages=[1], duration_seconds=5)
+        assert ended_at('restored') is not None
+
+        # The page came back from the back/forward cache
+        AnalyticsTracker.apply_heartbeat('restored', 3, entered_pages=[2], duration_seconds=20)
+        assert ended_at('restored') is None
+        AnalyticsTracker.apply_heartbeat('restored', 4, duration_seconds=25, is_final=True)
+        assert ended_at('restored') is not None
@@ -0,0 +1,32 @@
+import pytest
+
+from app.services.maintenance import MaintenanceRunner
+
+
+@pytest.fixture
+def orphan(flask_app, tmp_path):
+    flask_app.config['MAINTENANCE_DIR'] = str(tmp_path / 'maintenance')
+    folder = tmp_path / 'uploads' / '1'
+    folder.mkdir(parents=True)
+    (folder / 'stray.pdf').write_bytes(b'%PDF-1.4')
+    return tmp_path / 'maintenance'
+
+
+def run_orphan_files(flask_app, **options):
+    with flask_app.app_context():
+        return MaintenanceRunner.run('orphan-files', workers=0, sleep=0, **options)
+
+
+def test_orphan_files_dry_run_writes_no_report(flask_app, orphan):
+    result = run_orphan_files(flask_app, dry_run=True)
+
+    assert result['counters']['orphans'] == 1
+    assert not (orphan / 'orphan-files.tsv').exists()
+
+
+def test_orphan_files_dry_run_writes_an_explicit_report(flask_app, orphan, tmp_path):
+    report_file = tmp_path / 'orphans.tsv'
+    run_orphan_files(flask_app, dry_run=True, report_file=str(report_file))
+
+    assert report_file.read_text().splitlines()[1].startswith('1/stray.pdf\t8\t')
+    assert not (orphan / 'orphan-files.tsv').exists()
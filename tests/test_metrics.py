@@ -0,0 +1,49 @@
+import json
+import os
+
+from app.services import metrics
+from app.services.metrics import Metrics, registry
+
+
+def test_metrics_fail_closed_without_a_token(flask_app, client):
+    flask_app.config['METRICS_REQUIRE_TOKEN'] = True
+    assert client.get('/metrics').status_code == 403
+
+    flask_app.config['METRICS_TOKEN'] = 'scrape-token'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'}).status_code == 200
+
+
+def test_exited_workers_keep_their_counters(flask_app, tmp_path):
+    flask_app.config['METRICS_DIR'] = str(tmp_path)
+    snapshot = {
+        'series': [['docone_bot_hits_total', [['reason', 'user_agent']], 3]],
+        'gauges': [['docone_queue_depth', [['queue', 'purge']], 7]],
+    }
+    live = tmp_path / f'metrics-{os.getppid()}.json'
+    dead = tmp_path / 'metrics-4194305.json'  # Above the default pid_max, so never running
+    for path in (live, dead):
+        path.write_text(json.dumps(snapshot))
+
+    key = ('docone_bot_hits_total', (('reason', 'user_agent'),))
+    with flask_app.app_context():
+        for _ in range(2):
+            series, gauges = Metrics.collect()
+            # The dead worker's counter stays in the total; only its gauge expires
+            assert series[key] == 6
+            assert gauges[('docone_queue_depth', (('queue', 'purge'),))] == 7
+
+    assert live.exists()
+    assert not dead.exists()
+    assert json.loads((tmp_path / 'metrics-retired.json').read_text())['series'] == snapshot['series']
+
+
+def test_worker_retires_its_snapshot_at_exit(flask_app, tmp_path):
+    path = tmp_path / f'metrics-{os.getpid()}.json'
+    registry.inc('docone_bundle_downloads_total', (('kind', 'full'),))
+
+    metrics._retire_own_snapshot(str(path), os.getpid())
+
+    assert not path.exists()
+    retired = json.loads((tmp_path / 'metrics-retired.json').read_text())['series']
+    assert ['docone_bundle_downloads_total', [['kind', 'full']], 1] in retired
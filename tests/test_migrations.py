@@ -0,0 +1,35 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+
+from app import create_app, db
+from app.config import TestingConfig
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def migrated_app(tmp_path, monkeypatch):
+    """An app on an empty SQLite file, upgraded through every revision"""
+    from flask_migrate import Migrate, upgrade
+
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'migrated.db'}")
+    app = create_app('testing')
+    Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_upgrade_from_empty_database_matches_models(migrated_app):
+    inspector = sa.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        assert table.name in tables, f'no revision creates {table.name}'
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        missing = {column.name for column in table.columns} - columns
+        assert not missing, f'no revision adds {table.name}.{", ".join(sorted(missing))}'
@@ -0,0 +1,72 @@
+import pytest
+
+from app.services import presence
+from app.services.presence import DatabasePresenceBackend, MemoryPresenceBackend, PresenceTracker
+
+
+def test_several_workers_fall_back_to_database_presence(flask_app):
+    flask_app.config['WEB_CONCURRENCY'] = 4
+    PresenceTracker.init_app(flask_app)
+    assert isinstance(flask_app.extensions['presence'], DatabasePresenceBackend)
+
+    flask_app.config['WEB_CONCURRENCY'] = 1
+    PresenceTracker.init_app(flask_app)
+    assert isinstance(flask_app.extensions['presence'], MemoryPresenceBackend)
+
+
+@pytest.mark.parametrize('argv, cmd_args', [
+    (['gunicorn', '-w', '4', 'run:app'], ''),
+    (['gunicorn', '--workers=4', 'run:app'], ''),
+    (['gunicorn', 'run:app'], '-w4 --bind 0.0.0.0:8000'),
+])
+def test_gunicorn_worker_count_is_read_from_its_arguments(flask_app, monkeypatch, argv, cmd_args):
+    monkeypatch.setattr(presence.sys, 'argv', argv)
+    monkeypatch.setenv('GUNICORN_CMD_ARGS', cmd_args)
+    assert PresenceTracker.worker_count(flask_app) == 1
+
+    monkeypatch.setenv('SERVER_SOFTWARE', 'gunicorn/23.0.0')
+    assert PresenceTracker.worker_count(flask_app) == 4
+
+
+def test_redis_backend_for_plain_and_tls_urls(flask_app, monkeypatch):
+    created = []
+    monkeypatch.setattr(presence, 'RedisPresenceBackend', lambda url: created.append(url) or object())
+    flask_app.config['WEB_CONCURRENCY'] = 4
+
+    for url in ('redis://cache:6379/1', 'rediss://cache:6380/1'):
+        flask_app.config['PRESENCE_URL'] = url
+        PresenceTracker.init_app(flask_app)
+
+    assert created == ['redis://cache:6379/1', 'rediss://cache:6380/1']
+
+
+def test_database_backend_reads_open_sessions_with_recent_heartbeats(flask_app, link_id):
+    from datetime import datetime, timedelta
+
+    from app import db
+    from app.models.analytics import DocumentView
+
+    flask_app.config['PRESENCE_URL'] = 'database'
+    flask_app.config['WEB_CONCURRENCY'] = 4
+    PresenceTracker.init_app(flask_app)
+
+    with flask_app.app_context():
+        now = datetime.utcnow()
+        db.session.add_all([
+            DocumentView(link_id=link_id, session_id='reading', viewer_email='alice@example.com', current_page=3,
+                         last_heartbeat_at=now),
+            DocumentView(link_id=link_id, session_id='idle', last_heartbeat_at=now - timedelta(minutes=5)),
+            DocumentView(link_id=link_id, session_id='closed', last_heartbeat_at=now, ended_at=now),
+        ])
+        db.session.commit()
+
+        snapshot = PresenceTracker.snapshot([link_id])
+        version = PresenceTracker.version([link_id])
+        assert snapshot['count'] == 1
+        assert snapshot['viewers'][0]['email'] == 'alice@example.com'
+        assert snapshot['viewers'][0]['page'] == 3
+
+        # A page turn changes the version streams compare
+        DocumentView.query.filter_by(session_id='reading').update({'current_page': 4})
+        db.session.commit()
+        assert PresenceTracker.version([link_id]) != version
@@ -0,0 +1,27 @@
+import logging
+
+from sqlalchemy import select
+
+from app import db
+from app.models import User
+from app.services.profiler import RequestProfiler
+
+
+def test_slow_queries_are_logged_with_a_plan_and_without_values(flask_app, owner_id, monkeypatch, caplog):
+    monkeypatch.setattr(RequestProfiler, '_settings', None)
+    # Alembic's fileConfig (tests/test_migrations.py) disables loggers that exist when it runs
+    monkeypatch.setattr(logging.getLogger('docone.profiling'), 'disabled', False)
+    flask_app.config.update(PROFILING_ENABLED=True, PROFILING_SLOW_QUERY_MS=0)
+
+    with flask_app.app_context():
+        RequestProfiler.settings()
+        with caplog.at_level(logging.WARNING, logger='docone.profiling'):
+            user = db.session.execute(select(User).where(User.email == 'owner@example.com')).scalar_one()
+        # The request's transaction is still usable
+        user.full_name = 'Renamed'
+        db.session.commit()
+
+    message = next(record.getMessage() for record in caplog.records if 'FROM users' in record.getMessage())
+    assert 'owner@example.com' not in message
+    assert "Parameters: ['str'" in message
+    assert 'EXPLAIN failed' not in message
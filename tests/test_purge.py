@@ -0,0 +1,52 @@
+import os
+from datetime import datetime
+
+from app import db
+from app.models import Document
+from app.models.analytics import DocumentView
+from app.models.link import ShareableLink
+from app.services.link_generator import LinkGeneratorService
+from app.services.purge import DocumentPurger
+from app.services.view_archive import ViewArchive
+
+
+def add_view(link_id, started_at):
+    db.session.add(DocumentView(link_id=link_id, session_id=f'{link_id}-{started_at:%Y%m%d}', started_at=started_at))
+    db.session.commit()
+
+
+def test_purged_link_leaves_no_archived_views(flask_app, link_id):
+    with flask_app.app_context():
+        link = db.session.get(ShareableLink, link_id)
+        document_id = link.document_id
+        other_id = LinkGeneratorService.create_link(document_id).id
+        for started_at in (datetime(2025, 1, 10), datetime(2025, 2, 10)):
+            add_view(link_id, started_at)
+        add_view(other_id, datetime(2025, 2, 11))
+        assert ViewArchive.archive_older_than(days=30) == 3
+
+        link.deleted_at = datetime.utcnow()
+        db.session.commit()
+        counters = DocumentPurger.purge_link(link_id)
+
+        assert counters['archived_views'] == 2
+        assert ViewArchive.aggregate(document_id, link_id=link_id)['view_count'] == 0
+        assert ViewArchive.aggregate(document_id, link_id=other_id)['view_count'] == 1
+        # The month that only held the purged link's session is gone
+        assert not os.path.exists(ViewArchive.get_path(document_id, datetime(2025, 1, 1)))
+
+
+def test_purged_document_leaves_no_archive_files(flask_app, link_id):
+    with flask_app.app_context():
+        document_id = db.session.get(ShareableLink, link_id).document_id
+        add_view(link_id, datetime(2025, 1, 10))
+        assert ViewArchive.archive_older_than(days=30) == 1
+
+        document = db.session.get(Document, document_id)
+        document.is_deleted = True
+        document.deleted_at = datetime.utcnow()
+        db.session.commit()
+        counters = DocumentPurger.purge_document(document_id)
+
+        assert counters['archive_files'] == 1
+        assert not os.path.exists(os.path.join(ViewArchive.get_root(), str(document_id)))
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pytest
+from flask import session
+from flask_login import login_user
+from sqlalchemy import insert, select, update
+
+from app import create_app, db
+from app.config import TestingConfig
+from app.models import User
+from app.services import replica_router
+from app.services.replica_router import (PRIMARY_UNTIL_SESSION_KEY, REPLICA_BIND, ReplicaRouter, _remember_user_write,
+                                         replica_reads)
+
+
+def commit_write():
+    db.session().info['has_writes'] = True
+    _remember_user_write(db.session())
+
+
+def test_write_window_moves_only_when_it_runs_low(flask_app, owner_id, monkeypatch):
+    max_lag = flask_app.config['REPLICA_MAX_LAG_SECONDS']
+    clock = [1000.0]
+    monkeypatch.setattr(replica_router.time, 'time', lambda: clock[0])
+
+    with flask_app.test_request_context():
+        login_user(db.session.get(User, owner_id))
+
+        commit_write()
+        assert session[PRIMARY_UNTIL_SESSION_KEY] == 1000.0 + 2 * max_lag
+
+        # Later writes inside the window leave the cookie alone
+        session.modified = False
+        clock[0] += max_lag / 2
+        commit_write()
+        assert not session.modified
+
+        clock[0] += max_lag
+        commit_write()
+        assert session[PRIMARY_UNTIL_SESSION_KEY] == clock[0] + 2 * max_lag
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """An app whose primary and replica are two SQLite files holding different rows"""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_BINDS', {REPLICA_BIND: f"sqlite:///{tmp_path / 'replica.db'}"})
+    app = create_app('testing')
+    with app.app_context():
+        for engine, email in ((db.engines[None], 'primary@example.com'), (db.engines[REPLICA_BIND], 'replica@example.com')):
+            db.metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(insert(User).values(email=email, password_hash='x', is_active=True,
+                                                 created_at=datetime.utcnow()))
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registered metadata for the bind on the shared db; later apps have no such bind
+    db.metadatas.pop(REPLICA_BIND, None)
+
+
+def emails():
+    return set(db.session.execute(select(User.email)).scalars())
+
+
+def test_read_only_reads_go_to_the_replica(replica_app):
+    with replica_app.app_context():
+        assert emails() == {'primary@example.com'}
+        with replica_reads():
+            assert emails() == {'replica@example.com'}
+
+            # Writes inside a read-only block still land on the primary
+            db.session.add(User(email='new@example.com', password_hash='x'))
+            db.session.commit()
+        assert emails() == {'primary@example.com', 'new@example.com'}
+
+
+def test_statement_writes_keep_later_reads_on_the_primary(replica_app):
+    with replica_app.app_context():
+        db.session.execute(update(User).values(full_name='Renamed'))
+        with replica_reads():
+            assert emails() == {'primary@example.com'}
+        db.session.commit()
+
+        with replica_reads():
+            assert emails() == {'replica@example.com'}
+
+
+def test_lagging_replica_falls_back_to_the_primary(replica_app, monkeypatch):
+    monkeypatch.setattr(ReplicaRouter, 'replica_lag', staticmethod(lambda engine: float('inf')))
+    with replica_app.app_context():
+        with replica_reads():
+            assert emails() == {'primary@example.com'}
@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_boot_stays_within_import_budget():
+    # Lazily loaded modules (PDF, conversion, numpy, Alembic) must stay out of a worker boot;
+    # STARTUP_BUDGET_MS loosens the time budget on slow CI machines
+    budget_ms = os.environ.get('STARTUP_BUDGET_MS', '800')
+    result = subprocess.run(
+        [sys.executable, os.path.join('benchmarks', 'bench_startup.py'), '--runs', '5', '--budget-ms', budget_ms],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from app import create_app, db
+from app.config import TestingConfig
+from app.models import ShareableLink
+from app.models.analytics import DocumentView
+from app.services.analytics_tracker import AnalyticsTracker
+from app.services.link_generator import LinkGeneratorService
+
+BROWSER = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0) AppleWebKit/605.1.15 Safari/605.1.15'}
+
+
+def start_token(flask_app, link_id, email='alice@example.com'):
+    return AnalyticsTracker.start_token(link_id, AnalyticsTracker.new_session_id(), flask_app.config['SECRET_KEY'],
+                                        email)
+
+
+def test_start_needs_a_signed_token(flask_app, client, link_id):
+    response = client.post('/api/track/start', json={'link_id': link_id, 'viewer_email': 'x@example.com'},
+                           headers=BROWSER)
+    assert response.status_code == 400
+
+    forged = AnalyticsTracker.start_token(link_id, 'session', 'another-secret', 'x@example.com')
+    assert client.post('/api/track/start', json={'token': forged}, headers=BROWSER).status_code == 400
+
+    with flask_app.app_context():
+        assert DocumentView.query.count() == 0
+
+
+def test_start_takes_the_email_from_the_token(flask_app, client, link_id):
+    response = client.post('/api/track/start', json={'token': start_token(flask_app, link_id),
+                                                     'viewer_email': 'mallory@example.com'}, headers=BROWSER)
+    assert response.status_code == 200
+
+    with flask_app.app_context():
+        view = DocumentView.query.filter_by(session_id=response.get_json()['session_id']).one()
+        assert view.viewer_email == 'alice@example.com'
+
+
+def test_start_token_opens_one_session(flask_app, client, link_id):
+    token = start_token(flask_app, link_id)
+    responses = [client.post('/api/track/start', json={'token': token}, headers=BROWSER) for _ in range(3)]
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.get_json()['session_id'] for response in responses}) == 1
+    with flask_app.app_context():
+        assert DocumentView.query.count() == 1
+        assert db.session.get(ShareableLink, link_id).view_count == 1
+
+
+def test_start_refuses_inactive_and_deleted_links(flask_app, client, link_id):
+    with flask_app.app_context():
+        LinkGeneratorService.deactivate_link(link_id)
+    token = start_token(flask_app, link_id)
+    assert client.post('/api/track/start', json={'token': token}, headers=BROWSER).status_code == 403
+
+    with flask_app.app_context():
+        link = db.session.get(ShareableLink, link_id)
+        link.is_active = True
+        link.document.is_deleted = True
+        db.session.commit()
+    assert client.post('/api/track/start', json={'token': token}, headers=BROWSER).status_code == 403
+
+
+def test_viewer_page_reserves_the_session_its_script_opens(flask_app, client, link_id):
+    flask_app.config['BOT_JS_CONFIRMATION'] = True
+    with flask_app.app_context():
+        link = db.session.get(ShareableLink, link_id)
+        link.require_email = False
+        db.session.commit()
+        link_code = link.link_code
+
+    page = client.get(f'/v/{link_code}', headers=BROWSER).get_data(as_text=True)
+    token = re.search(r'data-start-token="([^"]+)"', page).group(1)
+    # A reload before the script ran reserves the same session
+    reloaded = client.get(f'/v/{link_code}', headers=BROWSER).get_data(as_text=True)
+    session_ids = {client.post('/api/track/start', json={'token': found}, headers=BROWSER).get_json()['session_id']
+                   for found in (token, re.search(r'data-start-token="([^"]+)"', reloaded).group(1))}
+    assert len(session_ids) == 1
+
+    # Once opened, the page carries the session and no token
+    page = client.get(f'/v/{link_code}', headers=BROWSER).get_data(as_text=True)
+    assert f'data-session-id="{session_ids.pop()}"' in page
+    assert 'data-start-token=""' in page
+    with flask_app.app_context():
+        assert DocumentView.query.count() == 1
+
+
+@pytest.fixture
+def tracking_app(tmp_path, monkeypatch):
+    """The ASGI tracking app and a Flask app on the same SQLite file"""
+    from app.tracking_asgi import TrackingApp
+
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'tracking.db'}")
+    flask_app = create_app('testing')
+    flask_app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    with flask_app.app_context():
+        db.create_all()
+
+    tracking = TrackingApp('testing')
+    yield flask_app, tracking
+    with flask_app.app_context():
+        db.engine.dispose()
+
+
+def call_start(tracking, body):
+    async def run():
+        await tracking.startup()
+        try:
+            scope = {'headers': [(b'content-type', b'application/json'),
+                                 (b'user-agent', BROWSER['User-Agent'].encode())],
+                     'client': ('203.0.113.9', 5000)}
+            return await tracking.track_start(scope, json.dumps(body).encode())
+        finally:
+            await tracking.shutdown()
+    return asyncio.run(run())
+
+
+def test_asgi_start_checks_the_token_and_the_link(tracking_app):
+    flask_app, tracking = tracking_app
+    with flask_app.app_context():
+        from app.models import Document, User
+
+        user = User(email='asgi@example.com')
+        user.set_password('owner-password-1')
+        db.session.add(user)
+        db.session.commit()
+        document = Document(user_id=user.id, title='Deck', original_filename='deck.pdf', file_type='pdf',
+                            file_path='deck.pdf', file_size=1, page_count=3)
+        db.session.add(document)
+        db.session.commit()
+        link_id = LinkGeneratorService.create_link(document.id).id
+
+    status, _ = call_start(tracking, {'link_id': link_id, 'viewer_email': 'x@example.com'})
+    assert status == 400
+
+    token = start_token(flask_app, link_id)
+    status, payload = call_start(tracking, {'token': token})
+    assert status == 200
+    assert call_start(tracking, {'token': token}) == (200, payload)
+    with flask_app.app_context():
+        view = DocumentView.query.filter_by(session_id=payload['session_id']).one()
+        assert view.viewer_email == 'alice@example.com'
+        assert DocumentView.query.count() == 1
+        assert db.session.get(ShareableLink, link_id).view_count == 1
+
+        LinkGeneratorService.deactivate_link(link_id)
+    status, _ = call_start(tracking, {'token': start_token(flask_app, link_id)})
+    assert status == 403
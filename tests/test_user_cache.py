@@ -0,0 +1,47 @@
+from sqlalchemy import update
+
+from app import db
+from app.models import User
+from app.services import user_cache
+from app.services.user_cache import UserCache
+
+
+def assert_logged_out(response):
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
+
+
+def test_deactivation_invalidates_cached_user(flask_app, logged_in, owner_id):
+    assert logged_in.get('/dashboard').status_code == 200
+
+    with flask_app.app_context():
+        db.session.get(User, owner_id).is_active = False
+        db.session.commit()
+
+    assert_logged_out(logged_in.get('/dashboard'))
+
+
+def test_deactivation_takes_effect_within_ttl(flask_app, logged_in, owner_id, monkeypatch):
+    assert logged_in.get('/dashboard').status_code == 200
+
+    # A write that bypasses the ORM (another service, a manual UPDATE) cannot invalidate the snapshot
+    with flask_app.app_context():
+        db.session.execute(update(User).where(User.id == owner_id).values(is_active=False))
+        db.session.commit()
+    assert logged_in.get('/dashboard').status_code == 200
+
+    now = user_cache.time.monotonic()
+    monkeypatch.setattr(user_cache.time, 'monotonic', lambda: now + flask_app.config['USER_CACHE_TTL'] + 1)
+
+    assert_logged_out(logged_in.get('/dashboard'))
+
+
+def test_redis_backend_for_plain_and_tls_urls(flask_app, monkeypatch):
+    created = []
+    monkeypatch.setattr(user_cache, 'RedisUserCacheBackend', lambda url: created.append(url) or object())
+
+    for url in ('redis://cache:6379/0', 'rediss://cache:6380/0'):
+        flask_app.config['USER_CACHE_URL'] = url
+        UserCache.init_app(flask_app)
+
+    assert created == ['redis://cache:6379/0', 'rediss://cache:6380/0']
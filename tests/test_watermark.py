@@ -0,0 +1,64 @@
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, NameObject
+
+from app.services.watermark import Watermarker
+
+
+def write_deck(path, pages):
+    writer = PdfWriter()
+    for number in range(1, pages + 1):
+        writer.add_blank_page(width=792, height=612)
+        page = writer.pages[-1]  # add_blank_page returns a detached copy
+        content = DecodedStreamObject()
+        content.set_data(f'BT 72 560 Td (Slide {number}) Tj ET'.encode())
+        page[NameObject('/Contents')] = writer._add_object(content)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def test_stamped_copy_is_a_complete_rewrite(flask_app, tmp_path):
+    deck_path = str(tmp_path / 'deck.pdf')
+    write_deck(deck_path, 3)
+    with open(deck_path, 'rb') as f:
+        original = f.read()
+    flask_app.config['WATERMARK_CACHE_DIR'] = str(tmp_path / 'watermarks')
+
+    with flask_app.app_context():
+        stamped_path = Watermarker.stamped_path(deck_path, 'viewer@example.com')
+        # Built from the cached overlay this time
+        second_path = Watermarker.stamped_path(deck_path, 'other@example.com')
+
+    for path, text in ((stamped_path, b'viewer@example.com'), (second_path, b'other@example.com')):
+        with open(path, 'rb') as f:
+            stamped = f.read()
+        assert not stamped.startswith(original[:len(original) // 2])
+        assert b'/Prev' not in stamped
+        assert stamped.count(b'startxref') == 1
+
+        reader = PdfReader(path)
+        assert len(reader.pages) == 3
+        for number, page in enumerate(reader.pages, start=1):
+            assert not isinstance(page.raw_get('/Contents').get_object(), list)
+            data = page['/Contents'].get_data()
+            assert f'(Slide {number}) Tj'.encode() in data
+            assert data.endswith(b'/DoconeWatermark Do Q')
+            xobject = page['/Resources']['/XObject']['/DoconeWatermark']
+            assert b'(' + text + b') Tj' in xobject.get_data()
+
+
+def test_truncated_overlay_body_is_rebuilt(flask_app, tmp_path):
+    deck_path = str(tmp_path / 'deck.pdf')
+    write_deck(deck_path, 2)
+    flask_app.config['WATERMARK_CACHE_DIR'] = str(tmp_path / 'watermarks')
+
+    with flask_app.app_context():
+        digest = Watermarker.digest(deck_path)
+        overlay, body_path = Watermarker.overlay(deck_path, digest)
+        with open(body_path, 'r+b') as f:
+            f.truncate(overlay['length'] // 2)
+
+        stamped_path = Watermarker.stamped_path(deck_path, 'viewer@example.com')
+
+    with open(body_path, 'rb') as f:
+        assert len(f.read()) == overlay['length']
+    assert len(PdfReader(stamped_path).pages) == 2